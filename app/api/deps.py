@@ -1,6 +1,6 @@
 # AD-OCV1/app/api/deps.py
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer # Đảm bảo đã import
 from sqlalchemy.orm import Session
 from app.db.session import get_db
@@ -14,13 +14,19 @@ def get_db_dep() -> Session:
     return next(get_db())
 
 def get_current_user(
+    request: Request,
     # SỬA 2: Thêm Depends(oauth2_scheme) để FastAPI tự động lấy token từ header và kích hoạt Security
     token: str = Depends(oauth2_scheme), 
     db: Session = Depends(get_db),
 ):
     """
     Lấy user hiện tại từ JWT.
+    Nếu AuthMiddleware đã xác thực token này thì dùng lại user trong request.state.
     """
+    user = getattr(request.state, "current_user", None)
+    if user is not None:
+        return user
+
     payload = decode_access_token(token)
     if not payload or "sub" not in payload:
         raise HTTPException(
@@ -5,13 +5,15 @@ from typing import Any
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 
 # --- Import Core Components ---
 from app.api import deps
 from app.db.session import get_db
 from app.crud.user_crud import user_crud
-from app.core.security import verify_password, create_access_token
+from app.core.security import averify_password, create_access_token
+from app.core.process_pool import PoolSaturated
 from app.core.config import settings
 from app.utils.response import response_success
 from app.db import schemas
@@ -29,16 +31,17 @@ router = APIRouter()
     summary="User login (OAuth2 Form)",
     tags=["auth"]
 )
-def login_for_access_token(
+async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(), 
     db: Session = Depends(get_db)
 ) -> Any:
     """
     Xác thực người dùng bằng username và password (form data).
     Trả về JWT Access Token chuẩn OAuth2.
+    Argon2 chạy trong password_pool; pool đầy -> 503 ngay thay vì xếp hàng.
     """
-    # 1. Tìm kiếm user
-    user = user_crud.get_by_username(db, form_data.username)
+    # 1. Tìm kiếm user (query DB trong threadpool, không chặn event loop)
+    user = await run_in_threadpool(user_crud.get_by_username, db, form_data.username)
     
     # 2. Kiểm tra điều kiện (Tồn tại, Mật khẩu, Active)
     if not user or user.is_active != 1:
@@ -47,12 +50,24 @@ def login_for_access_token(
             detail="Invalid credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    if not verify_password(form_data.password, user.password_hash):
+    try:
+        is_valid, new_hash = await averify_password(form_data.password, user.password_hash)
+    except PoolSaturated:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many login attempts in progress, please retry",
+            headers={"Retry-After": "1"},
+        )
+    if not is_valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, 
             detail="Invalid credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+    # Hash cũ dùng tham số argon2 khác cấu hình hiện tại -> lưu hash mới
+    if new_hash:
+        await run_in_threadpool(user_crud.update_password_hash, db, user, new_hash)
         
     # 3. Tạo Access Token
     # Lưu ý: Đảm bảo file app/core/security.py đã được cập nhật để nhận expires_delta
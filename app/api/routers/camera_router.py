@@ -1,12 +1,16 @@
 # app/api/routers/camera_router.py
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from app.db import schemas
+from app.crud.base import get_table_versions
 from app.db.session import get_db
 from app.services.camera_service import CameraService
-from app.utils.response import response_success
+from app.utils.response import response_json, response_success
+from app.utils.etag import is_not_modified, make_etag, not_modified, with_etag
+from app.utils.projection import parse_fields
+from app.utils.serializers import dump_camera, dump_cameras
 
 router = APIRouter(prefix="/cameras", tags=["cameras"])
 
@@ -21,29 +25,43 @@ class CameraListResponse(BaseModel):
 def create_camera(cam_in: schemas.CameraCreate, db: Session = Depends(get_db)):
     svc = CameraService(db)
     cam = svc.create_camera(cam_in)
-    return response_success(data=cam)
+    return response_json(data=dump_camera(cam))
 
 
 @router.get("/{cam_id}")
-def get_camera(cam_id: int, db: Session = Depends(get_db)):
+def get_camera(cam_id: int, request: Request, db: Session = Depends(get_db)):
+    etag = make_etag(request, get_table_versions(db, ["cameras"]))
+    if is_not_modified(request, etag):
+        return not_modified(etag)
     svc = CameraService(db)
     cam = svc.get_camera(cam_id)
     if not cam:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Camera not found"
         )
-    return response_success(data=cam)
+    return with_etag(response_json(data=dump_camera(cam)), etag)
 
 
 @router.get("", response_model=CameraListResponse, summary="Get all cameras")
 def get_all_cameras(
+    request: Request,
     db: Session = Depends(get_db),
     skip: int = 0,
-    limit: int = 100
+    limit: int = 100,
+    fields: Optional[str] = Query(
+        None, description="Chỉ trả về các cột này, cách nhau bằng dấu phẩy (vd: id,name,status)"
+    ),
 ):
+    etag = make_etag(request, get_table_versions(db, ["cameras"]))
+    if is_not_modified(request, etag):
+        return not_modified(etag)
     svc = CameraService(db)
-    cameras = svc.get_all_cameras(skip=skip, limit=limit)
-    return response_success(data=cameras)
+    field_list = parse_fields(fields)
+    try:
+        cameras = svc.get_all_cameras(skip=skip, limit=limit, fields=field_list)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return with_etag(response_json(data=cameras if field_list else dump_cameras(cameras)), etag)
 
 
 @router.patch("/{cam_id}")
@@ -54,21 +72,21 @@ def update_camera(cam_id: int, cam_in: schemas.CameraUpdate, db: Session = Depen
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Camera not found"
         )
-    return response_success(data=cam)
+    return response_json(data=dump_camera(cam))
 
 
 @router.post("/{cam_id}/connect")
 def connect_camera(cam_id: int, db: Session = Depends(get_db)):
     svc = CameraService(db)
     cam = svc.connect_camera(cam_id)
-    return response_success(data=cam)
+    return response_json(data=dump_camera(cam))
 
 
 @router.post("/{cam_id}/disconnect")
 def disconnect_camera(cam_id: int, db: Session = Depends(get_db)):
     svc = CameraService(db)
     cam = svc.disconnect_camera(cam_id)
-    return response_success(data=cam)
+    return response_json(data=dump_camera(cam))
 
 
 # --- BỔ SUNG DELETE ---
@@ -80,7 +98,7 @@ def delete_camera(cam_id: int, db: Session = Depends(get_db)):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Camera not found"
         )
-    return response_success(data=cam)
+    return response_json(data=dump_camera(cam))
 
 
 @router.delete("", summary="Delete all cameras")
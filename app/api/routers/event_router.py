@@ -0,0 +1,65 @@
+# app/api/routers/event_router.py
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, Header, Query, Request
+from fastapi.responses import StreamingResponse
+
+from app.core.config import settings
+from app.core.event_bus import event_bus, format_sse, watch_change_counters
+from app.db.session import SessionLocal
+
+router = APIRouter(prefix="/events", tags=["events"])
+
+
+async def _event_stream(request: Request, last_event_id: Optional[str]):
+    sub, backlog, reset = event_bus.subscribe(last_event_id)
+    try:
+        # Gợi ý thời gian kết nối lại cho EventSource
+        yield b"retry: 3000\n\n"
+        if reset:
+            # Token không còn trong buffer (server restart / worker khác / quá cũ)
+            yield b"event: reset\ndata: {}\n\n"
+        for item in backlog:
+            yield format_sse(item)
+
+        while True:
+            try:
+                item = await asyncio.wait_for(
+                    sub.queue.get(), timeout=settings.EVENTS_KEEPALIVE_SECONDS
+                )
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield b": keepalive\n\n"
+                continue
+            if item is None:
+                # Client đọc không kịp: ngắt, client kết nối lại với Last-Event-ID
+                yield b"event: overflow\ndata: {}\n\n"
+                break
+            yield format_sse(item)
+    finally:
+        event_bus.unsubscribe(sub)
+
+
+@router.get("")
+async def stream_events(
+    request: Request,
+    last_event_id: Optional[str] = Query(
+        None, description="Resume token (id của sự kiện cuối đã nhận); EventSource tự gửi header Last-Event-ID"
+    ),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+):
+    """
+    Server-Sent Events: thông báo thay đổi đơn hàng / camera để client không phải polling.
+    - order.created / order.started / order.closed / order.deleted
+      (thao tác hàng loạt / purge: 1 sự kiện cho cả lô với {"ids": [...]})
+    - camera.connected / camera.disconnected
+    - orders.changed / cameras.changed: dữ liệu đổi ở worker khác (tải lại danh sách)
+    - reset: không resume được từ token -> tải lại toàn bộ
+    """
+    watch_change_counters(SessionLocal)
+    return StreamingResponse(
+        _event_stream(request, last_event_id_header or last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
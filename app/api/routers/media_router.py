@@ -0,0 +1,163 @@
+# app/api/routers/media_router.py
+from fastapi import APIRouter, HTTPException, Path, Request
+from fastapi.responses import RedirectResponse
+from starlette.concurrency import run_in_threadpool
+
+from app.core.process_pool import PoolSaturated
+
+from app.db import schemas
+from app.services import media_service, thumbnail_service, upload_service
+from app.utils.range_response import RangeFileResponse
+from app.utils.response import response_json, response_success
+from app.utils.serializers import dump_order
+
+router = APIRouter(prefix="/orders", tags=["media"])
+
+
+async def _upload(order_id: int, kind: str, request: Request):
+    if await run_in_threadpool(media_service.get_order, order_id) is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+    content_length = request.headers.get("content-length")
+    limit = media_service.upload_limit(kind)
+    if content_length and content_length.isdigit() and int(content_length) > limit:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds {limit} bytes")
+    try:
+        order, size = await media_service.save_upload(
+            order_id, kind, request.headers.get("content-type"), request.stream()
+        )
+    except media_service.MediaError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    if order is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+    if kind == "avatar":
+        await run_in_threadpool(thumbnail_service.prewarm, order.path_avatar)
+    return response_json(data={"order": dump_order(order), "size": size})
+
+
+async def _serve(order_id: int, kind: str, request: Request):
+    order = await run_in_threadpool(media_service.get_order, order_id, True)
+    if order is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+    found = await run_in_threadpool(media_service.media_file, order, kind)
+    if found is None:
+        raise HTTPException(status_code=404, detail=f"Order has no {kind}")
+    path, media_type, st = found
+    return RangeFileResponse(request, path, media_type=media_type, stat_result=st)
+
+
+@router.put("/{order_id}/video")
+async def upload_order_video(order_id: int, request: Request):
+    """
+    Upload video đóng gói: body là nội dung file (Content-Type video/mp4, video/webm...),
+    gửi thẳng hoặc Transfer-Encoding: chunked. Server ghi dần xuống đĩa, không đệm cả body.
+    """
+    return await _upload(order_id, "video", request)
+
+
+@router.put("/{order_id}/avatar")
+async def upload_order_avatar(order_id: int, request: Request):
+    """Upload ảnh avatar (Content-Type image/jpeg, image/png, image/webp)."""
+    return await _upload(order_id, "avatar", request)
+
+
+@router.api_route("/{order_id}/video", methods=["GET", "HEAD"])
+async def get_order_video(order_id: int, request: Request):
+    """Tải / xem video; hỗ trợ Range (206) để tua mà không tải cả file."""
+    return await _serve(order_id, "video", request)
+
+
+@router.api_route("/{order_id}/avatar", methods=["GET", "HEAD"])
+async def get_order_avatar(order_id: int, request: Request):
+    return await _serve(order_id, "avatar", request)
+
+
+@router.get("/{order_id}/avatar/{size}")
+async def get_order_avatar_thumb(order_id: int, size: str = Path(..., pattern="^(list|detail)$")):
+    """
+    Ảnh thu nhỏ của avatar (list: lưới đơn, detail: trang chi tiết).
+    Chuyển hướng (307) tới /thumbs/<key>.jpg: URL đó không bao giờ đổi nội dung nên
+    trình duyệt cache vĩnh viễn; avatar đổi -> key mới.
+    """
+    order = await run_in_threadpool(media_service.get_order, order_id, True)
+    if order is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+    found = await run_in_threadpool(media_service.media_file, order, "avatar")
+    if found is None:
+        raise HTTPException(status_code=404, detail="Order has no avatar")
+    if not thumbnail_service.available():
+        # Không có Pillow -> trả ảnh gốc
+        return RedirectResponse(f"/orders/{order_id}/avatar", status_code=307)
+    path, _, st = found
+    try:
+        key = await thumbnail_service.get_thumbnail(path, st, size)
+    except PoolSaturated:
+        raise HTTPException(
+            status_code=503, detail="Thumbnail queue is full, please retry", headers={"Retry-After": "1"}
+        )
+    except thumbnail_service.ThumbnailError:
+        raise HTTPException(status_code=415, detail="Avatar is not a readable image")
+    return RedirectResponse(f"/thumbs/{key}.jpg", status_code=307)
+
+
+# --- Upload video nhiều phần (resumable), xem app/services/upload_service.py ---
+
+def _upload_state(state: dict, code: int = 200):
+    response = response_json(data=state, code=code, status_code=code)
+    response.headers["Upload-Offset"] = str(state["offset"])
+    return response
+
+
+@router.post("/{order_id}/video/uploads")
+async def create_video_upload(order_id: int, body: schemas.VideoUploadCreate):
+    """
+    Tạo phiên upload: {"size": tổng byte, "content_type": "video/mp4"} -> upload_id.
+    Sau đó PUT từng phần với Content-Range: bytes <start>-<end>/<size> (thứ tự tùy ý,
+    có thể song song), GET để biết offset / các khoảng đã nhận, cuối cùng POST .../complete.
+    """
+    try:
+        state = await run_in_threadpool(upload_service.create_upload, order_id, body.size, body.content_type)
+    except media_service.MediaError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    if state is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return _upload_state(state, code=201)
+
+
+@router.api_route("/{order_id}/video/uploads/{upload_id}", methods=["GET", "HEAD"])
+async def get_video_upload(order_id: int, upload_id: str):
+    try:
+        state = await run_in_threadpool(upload_service.get_upload, order_id, upload_id)
+    except media_service.MediaError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return _upload_state(state)
+
+
+@router.put("/{order_id}/video/uploads/{upload_id}")
+async def put_video_upload_chunk(order_id: int, upload_id: str, request: Request):
+    try:
+        state = await upload_service.write_chunk(
+            order_id, upload_id, request.headers.get("content-range"), request.stream()
+        )
+    except media_service.MediaError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return _upload_state(state)
+
+
+@router.post("/{order_id}/video/uploads/{upload_id}/complete")
+async def complete_video_upload(order_id: int, upload_id: str):
+    try:
+        order = await run_in_threadpool(upload_service.complete_upload, order_id, upload_id)
+    except media_service.MediaError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    if order is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return response_json(data={"order": dump_order(order)})
+
+
+@router.delete("/{order_id}/video/uploads/{upload_id}")
+async def abort_video_upload(order_id: int, upload_id: str):
+    try:
+        await run_in_threadpool(upload_service.abort_upload, order_id, upload_id)
+    except media_service.MediaError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return response_success(mes="Upload aborted")
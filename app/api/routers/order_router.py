@@ -1,25 +1,55 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+import csv
+import io
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import Optional
-from datetime import datetime
+from datetime import date, datetime
 
 from app.db import schemas
-from app.db.session import get_db
+from app.core.config import settings
+from app.db.session import SessionLocal, get_db
+from app.crud.base import get_table_versions
 from app.crud.order_crud import order_crud
-from app.utils.response import response_success
+from app.services.order_purge_service import get_purge_job, start_purge_job
+from app.utils.etag import is_not_modified, make_etag, not_modified, with_etag
+from app.utils.projection import parse_fields
+from app.utils.response import response_json, response_success
+from app.utils.serializers import dump_order, dump_order_rows, dump_orders
+from app.utils.time_utils import to_vn
 
 router = APIRouter(prefix="/orders", tags=["orders"])
 
 
+def _meta_filters(request: Request) -> dict:
+    """Tham số meta.<key>=giá trị (khóa khai báo trong models.ORDER_METADATA_KEYS); sai -> 400."""
+    params = {
+        name[len("meta."):]: value
+        for name, value in request.query_params.items()
+        if name.startswith("meta.")
+    }
+    try:
+        return order_crud.parse_meta_filters(params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.get("")
 def get_orders(
+    request: Request,
     db: Session = Depends(get_db),
-    skip: int = 0,
-    limit: int = 100,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=settings.MAX_PAGE_SIZE),
     code: Optional[str] = Query(
         None, description="Tìm kiếm theo mã (hỗ trợ nhiều mã cách nhau bằng dấu phẩy)"
     ),
+    code_match: str = Query(
+        "contains",
+        pattern="^(contains|exact)$",
+        description="contains: tìm chuỗi con (FTS trigram), exact: mã chính xác",
+    ),
     status: Optional[str] = Query(
         None, description="Lọc theo trạng thái: packing, closed, error..."
     ),
@@ -30,30 +60,170 @@ def get_orders(
     end_date: Optional[datetime] = None,
     sort_by: str = "created_at",
     sort_dir: str = "desc",
+    cursor: Optional[str] = Query(
+        None,
+        description="Phân trang keyset: để trống cho trang đầu, sau đó gửi next_cursor của trang trước",
+    ),
+    count: Optional[str] = Query(
+        None,
+        pattern="^(exact|estimate|none)$",
+        description=(
+            "exact: đếm tổng chính xác, estimate: tổng ước lượng (rẻ, cho infinite scroll), "
+            "none: bỏ qua đếm. Mặc định: exact khi dùng skip, none khi dùng cursor"
+        ),
+    ),
+    fields: Optional[str] = Query(
+        None,
+        description=(
+            "Chỉ trả về các cột này, cách nhau bằng dấu phẩy (vd: id,code,status,created_at); "
+            "thêm parent để kèm đơn cha. Mặc định: đầy đủ cột + parent"
+        ),
+    ),
 ):
     """
     Lấy danh sách đơn hàng với bộ lọc nâng cao và múi giờ VN.
+    Lọc theo order_metadata: meta.<key>=giá trị (nhiều giá trị cách nhau bằng dấu phẩy),
+    vd. ?meta.carrier=GHN&meta.sku_count=2 (khóa: carrier, sku_count, station).
+    Gửi lại ETag trong If-None-Match: dữ liệu chưa đổi -> 304 (không chạy truy vấn).
+    """
+    etag = make_etag(request, get_table_versions(db, ["orders"]))
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    count = count or ("exact" if cursor is None else "none")
+    field_list = parse_fields(fields)
+    meta = _meta_filters(request)
+    try:
+        page = order_crud.filter_orders_page(
+            db=db,
+            skip=skip,
+            limit=limit,
+            code=code,
+            status=status,
+            date_preset=date_preset,
+            start_date=start_date,
+            end_date=end_date,
+            sort_by=sort_by,
+            sort_dir=sort_dir,
+            cursor=cursor,
+            count=count,
+            code_match=code_match,
+            fields=field_list,
+            meta=meta,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return with_etag(response_json(
+        data={
+            "items": dump_order_rows(page.items) if field_list else dump_orders(page.items, with_parent=True),
+            "total": page.total,
+            "total_estimated": page.total_estimated,
+            "page": (skip // limit) + 1 if cursor is None else None,
+            "limit": limit,
+            "next_cursor": page.next_cursor,
+        }
+    ), etag)
+
+
+def _export_value(value):
+    # Thời điểm lưu epoch UTC -> giờ VN như các API khác
+    return to_vn(value).isoformat() if isinstance(value, datetime) else value
+
+
+def _export_stream(fmt: str, filters: dict):
+    """
+    Generator cho StreamingResponse: mỗi lô Row -> 1 chunk NDJSON/CSV.
+    Session mở riêng trong generator vì session của Depends(get_db) đã đóng
+    trước khi response bắt đầu được stream.
+    """
+    columns = order_crud.export_columns()
+    db = SessionLocal()
+    try:
+        if fmt == "csv":
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            writer.writerow(columns)
+            yield buf.getvalue()
+        for batch in order_crud.iter_export_batches(db, **filters):
+            if fmt == "csv":
+                buf.seek(0)
+                buf.truncate()
+                writer.writerows([[_export_value(v) for v in row] for row in batch])
+                yield buf.getvalue()
+            else:
+                yield "".join(
+                    json.dumps(
+                        {k: _export_value(v) for k, v in zip(columns, row)}, ensure_ascii=False
+                    ) + "\n"
+                    for row in batch
+                )
+    finally:
+        db.close()
+
+
+@router.get("/stats")
+def get_order_stats(
+    db: Session = Depends(get_db),
+    date_preset: Optional[str] = Query(
+        "today",
+        pattern="^(today|yesterday|last7days|last15days|custom)$",
+        description="Khoảng thời gian; custom: dùng start_day/end_day",
+    ),
+    start_day: Optional[date] = None,
+    end_day: Optional[date] = None,
+    camera_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+):
+    """
+    Thống kê số đơn theo trạng thái và theo ngày (giờ VN) cho dashboard.
+    Đọc từ bảng rollup order_daily_stats, không quét bảng orders.
+    """
+    try:
+        start_day, end_day = order_crud.stats_range(
+            None if date_preset == "custom" else date_preset, start_day, end_day
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    stats = order_crud.daily_stats(db, start_day, end_day, camera_id=camera_id, user_id=user_id)
+    return response_success(data=jsonable_encoder(stats))
+
+
+@router.get("/export")
+def export_orders(
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    code: Optional[str] = Query(
+        None, description="Tìm kiếm theo mã (hỗ trợ nhiều mã cách nhau bằng dấu phẩy)"
+    ),
+    code_match: str = Query("contains", pattern="^(contains|exact)$"),
+    status: Optional[str] = None,
+    date_preset: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    sort_by: str = "created_at",
+    sort_dir: str = "desc",
+):
+    """
+    Export toàn bộ đơn hàng khớp bộ lọc (cùng bộ lọc với GET /orders, kể cả meta.<key>) dạng NDJSON hoặc CSV.
+    Dữ liệu được stream theo lô, không giới hạn bởi MAX_PAGE_SIZE.
     """
-    orders, total = order_crud.filter_orders(
-        db=db,
-        skip=skip,
-        limit=limit,
+    filters = dict(
         code=code,
+        code_match=code_match,
         status=status,
         date_preset=date_preset,
         start_date=start_date,
         end_date=end_date,
         sort_by=sort_by,
         sort_dir=sort_dir,
+        meta=_meta_filters(request),
     )
-
-    return response_success(
-        data={
-            "items": jsonable_encoder(orders),
-            "total": total,
-            "page": (skip // limit) + 1,
-            "limit": limit,
-        }
+    media_type = "text/csv; charset=utf-8" if format == "csv" else "application/x-ndjson"
+    filename = f"orders-{datetime.now():%Y%m%d-%H%M%S}.{format}"
+    return StreamingResponse(
+        _export_stream(format, filters),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
 
 
@@ -62,9 +232,46 @@ def create_order(obj_in: schemas.OrderCreate, db: Session = Depends(get_db)):
     """
     Tạo đơn hàng mới với giờ Việt Nam tự động.
     """
-    # Sử dụng hàm create_with_vn_time đã viết trong CRUD
-    new_order = order_crud.create_with_vn_time(db, obj_in=obj_in)
-    return response_success(data=jsonable_encoder(new_order))
+    # created_at mặc định là thời điểm hiện tại (epoch UTC, xem models.UTCEpoch)
+    new_order = order_crud.create(db, obj_in=obj_in)
+    return response_json(data=dump_order(new_order))
+
+
+def _check_bulk_size(items: list):
+    if len(items) > settings.BULK_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413, detail=f"Too many items (max {settings.BULK_MAX_ITEMS})"
+        )
+
+
+@router.post("/bulk", response_model=dict)
+def bulk_create_orders(obj_in: schemas.OrderBulkCreate, db: Session = Depends(get_db)):
+    """
+    Tạo nhiều đơn hàng trong 1 transaction (trạm đóng gói replay sau khi mất mạng).
+    Kết quả trả về theo thứ tự từng phần tử gửi lên.
+    """
+    _check_bulk_size(obj_in.items)
+    results = order_crud.bulk_create(db, obj_in.items)
+    return response_success(data={
+        "items": results,
+        "succeeded": sum(r["ok"] for r in results),
+        "failed": sum(not r["ok"] for r in results),
+    })
+
+
+@router.post("/bulk/transitions", response_model=dict)
+def bulk_transition_orders(obj_in: schemas.OrderBulkTransition, db: Session = Depends(get_db)):
+    """
+    Áp dụng nhiều thao tác start/close trong 1 transaction.
+    Kết quả trả về theo thứ tự từng phần tử gửi lên.
+    """
+    _check_bulk_size(obj_in.items)
+    results = order_crud.bulk_transition(db, obj_in.items)
+    return response_success(data={
+        "items": results,
+        "succeeded": sum(r["ok"] for r in results),
+        "failed": sum(not r["ok"] for r in results),
+    })
 
 
 @router.post("/{order_id}/start")
@@ -75,7 +282,7 @@ def start_processing_order(order_id: int, db: Session = Depends(get_db)):
     order = order_crud.start_order(db, order_id=order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
-    return response_success(data=jsonable_encoder(order))
+    return response_json(data=dump_order(order))
 
 
 @router.post("/{order_id}/close")
@@ -86,49 +293,65 @@ def close_order(order_id: int, status: str = "closed", db: Session = Depends(get
     order = order_crud.close_order(db, order_id=order_id, status=status)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
-    return response_success(data=jsonable_encoder(order))
+    return response_json(data=dump_order(order))
+
+
+@router.get("/{order_id}/family")
+def get_order_family(order_id: int, db: Session = Depends(get_db)):
+    """
+    Lấy toàn bộ gia phả (cha, con, cháu... mọi độ sâu) của một đơn hàng, gồm cả đơn đã lưu trữ.
+    - items: danh sách phẳng theo id
+    - tree: cây lồng nhau bắt đầu từ đơn gốc (children)
+    """
+    family = order_crud.get_family(db, order_id=order_id)
+    if not family:
+        raise HTTPException(status_code=404, detail="Order not found")
+
+    items = dump_orders(family)
+    nodes = {item["id"]: {**item, "children": []} for item in items}
+    roots = []
+    for node in nodes.values():
+        parent = nodes.get(node["parent_id"])
+        (parent["children"] if parent else roots).append(node)
+
+    return response_json(data={
+        "root_id": family[0].root_id,
+        "items": items,
+        "tree": roots[0] if len(roots) == 1 else roots,
+    })
 
 
 @router.get("/{order_id}")
-def get_order_detail(order_id: int, db: Session = Depends(get_db)):
+def get_order_detail(order_id: int, request: Request, db: Session = Depends(get_db)):
     """
-    Lấy chi tiết một đơn hàng.
+    Lấy chi tiết một đơn hàng (hỗ trợ If-None-Match -> 304).
+    Đơn đã lưu trữ (archive) vẫn xem được (chỉ đọc).
     """
-    order = order_crud.get(db, id=order_id)
+    etag = make_etag(request, get_table_versions(db, ["orders"]))
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    order = order_crud.get_with_archive(db, id=order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
-    return response_success(data=jsonable_encoder(order))
+    return with_etag(response_json(data=dump_order(order)), etag)
 
 
-@router.get("")
-def list_orders(
-    db: Session = Depends(get_db),
-    skip: int = 0,
-    limit: int = 100,
-    code: str = Query(None),
-    status: str = Query(None),
-    date_preset: str = Query(None),
-    sort_by: str = "created_at",
-    sort_dir: str = "desc",
-):
-    # Trả về Flat List (Cha và Con nằm chung danh sách)
-    items, total = order_crud.filter_orders(
-        db,
-        skip=skip,
-        limit=limit,
-        code=code,
-        status=status,
-        date_preset=date_preset,
-        sort_by=sort_by,
-        sort_dir=sort_dir,
-    )
-    return response_success(data={"items": jsonable_encoder(items), "total": total})
+@router.delete("/all", status_code=status.HTTP_202_ACCEPTED)
+def clear_all_data():
+    """
+    Xóa sạch đơn hàng và file vật lý (chạy nền theo lô).
+    Trả về job ngay; theo dõi tiến độ qua GET /orders/purge-jobs/{job_id}.
+    Nếu đang có job chạy thì trả về job đó.
+    """
+    job, created = start_purge_job()
+    mes = "Đã bắt đầu xóa dữ liệu" if created else "Đang có job xóa dữ liệu chạy"
+    return response_success(data=jsonable_encoder(job), mes=mes, code=202)
 
 
-@router.delete("/all")
-def clear_all_data(db: Session = Depends(get_db)):
-    """Xóa sạch đơn hàng và file vật lý"""
-    count = order_crud.remove_all(db)
-    return response_success(
-        message=f"Đã xóa {count} đơn hàng và dọn dẹp file thành công."
-    )
+@router.get("/purge-jobs/{job_id}")
+def get_purge_job_status(job_id: int, db: Session = Depends(get_db)):
+    """Tiến độ job xóa dữ liệu."""
+    job = get_purge_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Purge job not found")
+    return response_success(data=jsonable_encoder(schemas.PurgeJobOut.model_validate(job)))
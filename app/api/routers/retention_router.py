@@ -0,0 +1,20 @@
+# app/api/routers/retention_router.py
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from app.db.session import get_db
+from app.services import retention_service
+from app.utils.response import response_json
+
+router = APIRouter(prefix="/media", tags=["media"])
+
+
+@router.get("/usage")
+def get_media_usage(refresh: bool = False, db: Session = Depends(get_db)):
+    """
+    Dung lượng media của các đơn (theo order_media_index) + quota / tuổi tối đa đang áp dụng.
+    refresh=true: cập nhật index trước khi tính (chỉ stat file của đơn mới / đổi đường dẫn).
+    """
+    if refresh:
+        retention_service.sync_index(db)
+    return response_json(data=retention_service.get_usage(db))
@@ -1,10 +1,12 @@
 # app/api/routers/setting_router.py
-from fastapi import APIRouter, Depends, Body
+from fastapi import APIRouter, Depends, Body, Request
 from sqlalchemy.orm import Session
 from typing import Dict, Any
 from app.db.session import get_db
+from app.crud.base import get_table_versions
 from app.crud.setting_crud import setting_crud
-from app.utils.response import response_success
+from app.utils.etag import is_not_modified, make_etag, not_modified, with_etag
+from app.utils.response import response_json, response_success
 
 router = APIRouter(prefix="/settings", tags=["settings"])
 
@@ -23,12 +25,15 @@ def sync_settings(
 
     return response_success(
         data=results, 
-        message="Settings synced successfully"
+        mes="Settings synced successfully"
     )
 
 @router.get("")
-def get_all_settings(db: Session = Depends(get_db)):
+def get_all_settings(request: Request, db: Session = Depends(get_db)):
+    etag = make_etag(request, get_table_versions(db, ["settings"]))
+    if is_not_modified(request, etag):
+        return not_modified(etag)
     settings = setting_crud.get_multi(db)
     # Chuyển list object thành dict đơn giản
     data = {s.key: s.value for s in settings}
-    return response_success(data=data)
\ No newline at end of file
+    return with_etag(response_json(data=data), etag)
\ No newline at end of file
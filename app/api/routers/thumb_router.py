@@ -0,0 +1,25 @@
+# app/api/routers/thumb_router.py
+from fastapi import APIRouter, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+
+from app.services import thumbnail_service
+from app.utils.range_response import RangeFileResponse
+
+router = APIRouter(prefix="/thumbs", tags=["media"])
+
+_IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+@router.api_route("/{name}", methods=["GET", "HEAD"])
+async def get_thumb(name: str, request: Request):
+    """File ảnh thu nhỏ theo key (xem GET /orders/{id}/avatar/{size}); nội dung không bao giờ đổi."""
+    key, _, ext = name.partition(".")
+    if ext != "jpg" or not thumbnail_service.is_valid_key(key):
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
+    path = await run_in_threadpool(thumbnail_service.thumb_cache.lookup, key)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
+    try:
+        return RangeFileResponse(request, path, media_type="image/jpeg", headers={"cache-control": _IMMUTABLE})
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
@@ -1,34 +1,75 @@
 # Middleware xử lý xác thực, parse token 
 # app/core/auth_middleware.py
-from fastapi import Request
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.concurrency import run_in_threadpool
+from starlette.types import ASGIApp, Receive, Scope, Send
 from app.core.security import decode_access_token
+from app.core.principal_cache import cached_principal, get_principal
+from app.crud.base import get_table_version
 from app.crud.user_crud import user_crud
-from app.db.session import SessionLocal
+from app.db.session import SessionLocal, engine
 
-class AuthMiddleware(BaseHTTPMiddleware):
+
+def _load_user(username: str):
+    db = SessionLocal()
+    try:
+        return user_crud.get_by_username(db, username)
+    finally:
+        db.close()
+
+
+def _users_version() -> int:
+    # Chỉ 1 lần đọc theo khóa chính của change_counters, không mở Session ORM
+    with engine.connect() as conn:
+        return get_table_version(conn, "users")
+
+
+def _bearer_token(scope: Scope):
+    for name, value in scope.get("headers", []):
+        if name == b"authorization":
+            auth_header = value.decode("latin-1")
+            if auth_header.startswith("Bearer "):
+                return auth_header.split(" ")[1]
+            return None
+    return None
+
+
+class AuthMiddleware:
     """
-    Middleware để parse Bearer token từ header Authorization.
-    Nếu token hợp lệ -> gắn current_user vào request.state.
+    Middleware ASGI thuần để parse Bearer token từ header Authorization.
+    Nếu token hợp lệ -> gắn current_user vào scope["state"] (request.state),
+    deps.get_current_user sẽ dùng lại user này thay vì query DB lần nữa.
+
+    - Không dùng BaseHTTPMiddleware (tránh tạo task/stream phụ cho mỗi request).
+    - Cache hit phục vụ từ bộ nhớ, không chạm DB; thay đổi từ worker khác được thấy
+      sau tối đa PRINCIPAL_VERSION_CHECK_SECONDS (xem app/core/principal_cache.py).
+    - Cache miss / cần đọc lại phiên bản users: truy vấn DB chạy trong threadpool.
     """
 
-    async def dispatch(self, request: Request, call_next):
-        if "authorization" in request.headers:
-            auth_header = request.headers["authorization"]
-            if auth_header.startswith("Bearer "):
-                token = auth_header.split(" ")[1]
-                payload = decode_access_token(token)
-                if payload and "sub" in payload:
-                    db = SessionLocal()
-                    user = user_crud.get_by_username(db, payload["sub"])
-                    db.close()
-                    if user and user.is_active == 1:
-                        request.state.current_user = user
-                    else:
-                        return JSONResponse(
-                            status_code=401,
-                            content={"code": 401, "mes": "Unauthorized", "data": []},
-                        )
-        response = await call_next(request)
-        return response
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = _bearer_token(scope)
+        if token:
+            payload = decode_access_token(token)
+            if payload and "sub" in payload:
+                username = payload["sub"]
+                user, entry = cached_principal(username)
+                if user is None:
+                    user = await run_in_threadpool(get_principal, username, _load_user, _users_version, entry)
+                if user and user.is_active == 1:
+                    scope.setdefault("state", {})["current_user"] = user
+                else:
+                    response = JSONResponse(
+                        status_code=401,
+                        content={"code": 401, "mes": "Unauthorized", "data": []},
+                    )
+                    await response(scope, receive, send)
+                    return
+
+        await self.app(scope, receive, send)
@@ -19,6 +19,22 @@ class Settings(BaseSettings):
     JWT_SECRET: str
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 6000
+    # Cache JWT đã verify (số token tối đa, 0 = tắt)
+    JWT_CACHE_SIZE: int = 2048
+
+    # Cache user đã xác thực trong AuthMiddleware (0 = tắt cache)
+    PRINCIPAL_CACHE_SIZE: int = 1024
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60
+    # Đọc lại phiên bản bảng users (ghi từ worker khác) tối đa 1 lần mỗi khoảng này
+    PRINCIPAL_VERSION_CHECK_SECONDS: float = 1.0
+
+    # Argon2 (hash mật khẩu). Đổi tham số -> hash cũ được hash lại khi login thành công
+    ARGON2_TIME_COST: int = 3
+    ARGON2_MEMORY_COST: int = 65536  # KiB
+    ARGON2_PARALLELISM: int = 4
+    # Process pool cho argon2 (0 worker = chạy trong thread phụ)
+    PASSWORD_POOL_WORKERS: int = 2
+    PASSWORD_POOL_MAX_PENDING: int = 32
 
     # Logging
     LOG_LEVEL: str = "info"
@@ -30,6 +46,70 @@ class Settings(BaseSettings):
     DEFAULT_PAGE_SIZE: int = 100
     MAX_PAGE_SIZE: int = 1500
 
+    # Cache tổng số đơn theo bộ lọc (0 = tắt) và ngưỡng đếm của count=estimate
+    ORDER_COUNT_CACHE_SIZE: int = 256
+    ORDER_COUNT_CACHE_TTL_SECONDS: int = 300
+    ORDER_COUNT_ESTIMATE_CAP: int = 10000
+    # Số dòng mỗi lần fetch khi export (GET /orders/export) - bộ nhớ phụ thuộc giá trị này, không phụ thuộc tổng số dòng
+    EXPORT_BATCH_SIZE: int = 1000
+    # Số phần tử tối đa mỗi request bulk (POST /orders/bulk, /orders/bulk/transitions)
+    BULK_MAX_ITEMS: int = 1000
+
+    # Purge nền (DELETE /orders/all): số đơn mỗi lần commit, số thread xóa file
+    PURGE_BATCH_SIZE: int = 500
+    PURGE_FILE_WORKERS: int = 8
+    # Job "running" không cập nhật quá lâu (process chết) thì cho phép chạy job mới
+    PURGE_JOB_STALE_SECONDS: int = 300
+
+    # Lưu trữ đơn cũ (hot/cold): file SQLite riêng, mặc định <tên db>_archive.db cạnh DB chính
+    ARCHIVE_DB_PATH: str = ""
+    # Đơn closed/error đóng quá số ngày này được chuyển sang archive
+    ARCHIVE_AFTER_DAYS: int = 90
+    ARCHIVE_BATCH_SIZE: int = 500
+
+    # SSE GET /events: số sự kiện giữ lại để resume, hàng đợi mỗi client,
+    # chu kỳ gửi keepalive và chu kỳ đọc change_counters (thay đổi từ worker khác)
+    EVENTS_BUFFER_SIZE: int = 1000
+    EVENTS_SUBSCRIBER_QUEUE: int = 256
+    EVENTS_KEEPALIVE_SECONDS: float = 15
+    EVENTS_WATCH_INTERVAL_SECONDS: float = 1.0
+
+    # Media đơn hàng (video đóng gói, ảnh avatar): thư mục gốc, dung lượng tối đa mỗi file,
+    # kích thước khối đọc/ghi khi stream (upload ghi thẳng xuống đĩa, download theo Range)
+    MEDIA_ROOT: str = "media"
+    MEDIA_VIDEO_MAX_BYTES: int = 4 * 1024 * 1024 * 1024
+    MEDIA_AVATAR_MAX_BYTES: int = 20 * 1024 * 1024
+    MEDIA_IO_CHUNK_BYTES: int = 1024 * 1024
+    # Upload video nhiều phần: phiên không nhận thêm phần nào quá thời gian này bị dọn
+    MEDIA_UPLOAD_TTL_SECONDS: int = 24 * 3600
+    MEDIA_UPLOAD_GC_INTERVAL_SECONDS: int = 3600
+
+    # Ảnh thu nhỏ của avatar: cạnh dài nhất (px) cho lưới đơn / trang chi tiết, chất lượng JPEG,
+    # thư mục cache (mặc định <MEDIA_ROOT>/thumbs) + dung lượng tối đa (xóa ảnh ít dùng nhất),
+    # process pool resize (0 worker = chạy trong thread phụ)
+    THUMB_LIST_PX: int = 160
+    THUMB_DETAIL_PX: int = 640
+    THUMB_QUALITY: int = 80
+    THUMB_CACHE_DIR: str = ""
+    THUMB_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+    THUMB_POOL_WORKERS: int = 2
+    THUMB_POOL_MAX_PENDING: int = 64
+
+    # Giới hạn dung lượng media đơn hàng (0 = tắt): vượt quota hoặc đơn đóng quá số ngày
+    # -> xóa video của đơn closed/error cũ nhất trước, chạy nền mỗi RETENTION_INTERVAL_SECONDS
+    RETENTION_QUOTA_BYTES: int = 0
+    RETENTION_MAX_AGE_DAYS: int = 0
+    RETENTION_INTERVAL_SECONDS: int = 600
+    RETENTION_BATCH_SIZE: int = 500
+
+    # Dọn file media mồ côi (scripts/sweep_media.py): chỉ xét file cũ hơn SWEEP_MIN_AGE_SECONDS
+    # (tránh file đang ghi / vừa upload chưa kịp gán cho đơn), giới hạn số entry quét và số file
+    # xóa / di chuyển mỗi giây (0 = không giới hạn), số đường dẫn đọc từ DB mỗi lô
+    SWEEP_MIN_AGE_SECONDS: int = 3600
+    SWEEP_SCAN_RATE: int = 2000
+    SWEEP_ACTION_RATE: int = 20
+    SWEEP_BATCH_SIZE: int = 1000
+
     # CORS origins
     ALLOWED_ORIGINS: Union[List[str], str] = []
 
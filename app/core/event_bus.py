@@ -0,0 +1,195 @@
+# Phát thông báo thay đổi (orders, cameras) tới các client SSE (GET /events)
+# app/core/event_bus.py
+"""
+Event bus trong process:
+- publish() gọi được từ mọi thread (CRUD trong threadpool, vòng lặp camera),
+  đẩy sang event loop của từng subscriber bằng call_soon_threadsafe.
+- Mỗi subscriber có hàng đợi giới hạn; đầy (client đọc chậm) -> subscriber bị
+  ngắt với thông báo "overflow", client kết nối lại bằng resume token.
+- Ring buffer EVENTS_BUFFER_SIZE sự kiện gần nhất để resume (Last-Event-ID).
+  Token của process khác / đã quá cũ -> gửi "reset" (client tải lại danh sách).
+
+Nhiều worker: mỗi worker có bus riêng. watch_change_counters() đọc bảng
+change_counters định kỳ và phát "<table>.changed" khi worker khác ghi dữ liệu.
+"""
+import asyncio
+import itertools
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import orjson
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.models import ChangeCounter
+
+BOOT_ID = uuid.uuid4().hex[:8]
+
+# Bảng có phát "<table>.changed" khi worker khác thay đổi dữ liệu
+WATCHED_TABLES = ("orders", "cameras")
+
+
+class Subscriber:
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def _put(self, item) -> None:
+        # Chạy trên event loop của subscriber
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)  # báo stream kết thúc
+
+
+class EventBus:
+    def __init__(self, buffer_size: int, subscriber_queue: int):
+        self._lock = threading.Lock()
+        self._seq = itertools.count(1)
+        self._buffer: deque = deque(maxlen=buffer_size)
+        self._subscribers: Set[Subscriber] = set()
+        self._subscriber_queue = subscriber_queue
+        # Phiên bản change_counters do chính process này tạo (bỏ qua khi watch)
+        self._local_versions: Dict[str, Set[int]] = {}
+
+    # --- token ---
+    @staticmethod
+    def make_token(seq: int) -> str:
+        return f"{BOOT_ID}-{seq}"
+
+    @staticmethod
+    def parse_token(token: Optional[str]) -> Optional[int]:
+        """seq của token; None nếu token không thuộc process này."""
+        if not token:
+            return None
+        boot_id, _, seq = token.partition("-")
+        if boot_id != BOOT_ID or not seq.isdigit():
+            return None
+        return int(seq)
+
+    # --- publish / subscribe ---
+    def publish(self, event_type: str, data: dict) -> None:
+        with self._lock:
+            seq = next(self._seq)
+            item = (seq, event_type, orjson.dumps(data))
+            self._buffer.append(item)
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            try:
+                sub.loop.call_soon_threadsafe(sub._put, item)
+            except RuntimeError:
+                # Event loop đã đóng
+                self.unsubscribe(sub)
+
+    def subscribe(self, last_token: Optional[str] = None) -> Tuple[Subscriber, List[tuple], bool]:
+        """
+        Đăng ký subscriber mới (gọi trong event loop).
+        Trả về (subscriber, backlog sau last_token, cần reset hay không).
+        """
+        sub = Subscriber(asyncio.get_running_loop(), self._subscriber_queue)
+        with self._lock:
+            self._subscribers.add(sub)
+            if last_token is None:
+                return sub, [], False
+            last_seq = self.parse_token(last_token)
+            oldest = self._buffer[0][0] if self._buffer else None
+            if last_seq is None or (oldest is not None and last_seq < oldest - 1):
+                return sub, [], True
+            return sub, [item for item in self._buffer if item[0] > last_seq], False
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    # --- đồng bộ giữa các worker ---
+    def note_local_version(self, table_name: str, version: int) -> None:
+        with self._lock:
+            versions = self._local_versions.setdefault(table_name, set())
+            versions.add(version)
+            if len(versions) > 10000:
+                versions.clear()
+
+    def consume_remote_change(self, table_name: str, old: int, new: int) -> bool:
+        """True nếu trong (old, new] có phiên bản không do process này tạo."""
+        with self._lock:
+            local = self._local_versions.get(table_name, set())
+            remote = any(v not in local for v in range(old + 1, new + 1))
+            local.difference_update(range(old + 1, new + 1))
+            return remote
+
+
+event_bus = EventBus(settings.EVENTS_BUFFER_SIZE, settings.EVENTS_SUBSCRIBER_QUEUE)
+
+
+def publish(event_type: str, **data) -> None:
+    """Phát 1 thông báo thay đổi (không lỗi kể cả khi không có subscriber)."""
+    event_bus.publish(event_type, data)
+
+
+def format_sse(item: tuple) -> bytes:
+    seq, event_type, payload = item
+    return (
+        f"id: {EventBus.make_token(seq)}\nevent: {event_type}\ndata: ".encode()
+        + payload
+        + b"\n\n"
+    )
+
+
+_watcher_started = False
+_watcher_lock = threading.Lock()
+
+
+def _read_versions(session_factory: Callable[[], Session]) -> Dict[str, int]:
+    db = session_factory()
+    try:
+        rows = db.execute(
+            select(ChangeCounter.table_name, ChangeCounter.version)
+            .where(ChangeCounter.table_name.in_(WATCHED_TABLES))
+        ).all()
+        return {name: version for name, version in rows}
+    finally:
+        db.close()
+
+
+def watch_change_counters(session_factory: Callable[[], Session]) -> None:
+    """
+    Thread nền (1 cho mỗi process, khởi động khi có subscriber đầu tiên):
+    phát "<table>.changed" khi change_counters tăng do worker khác ghi.
+    """
+    global _watcher_started
+    with _watcher_lock:
+        if _watcher_started:
+            return
+        _watcher_started = True
+
+    def _loop():
+        seen: Dict[str, int] = {}
+        while True:
+            try:
+                versions = _read_versions(session_factory)
+                for table_name, version in versions.items():
+                    old = seen.get(table_name)
+                    if old is not None and version > old and event_bus.consume_remote_change(
+                        table_name, old, version
+                    ):
+                        event_bus.publish(f"{table_name}.changed", {"version": version})
+                    seen[table_name] = version
+            except Exception as e:
+                print(f"[EventBus] ⚠️ Không đọc được change_counters: {e}")
+            time.sleep(settings.EVENTS_WATCH_INTERVAL_SECONDS)
+
+    threading.Thread(target=_loop, name="event-bus-watcher", daemon=True).start()
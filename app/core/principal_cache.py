@@ -0,0 +1,149 @@
+# app/core/principal_cache.py
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Optional, Tuple
+from app.core.config import settings
+from app.utils.lru_cache import TTLCache
+
+# Cache user đã xác thực theo username (sub của JWT).
+# Tránh mỗi request có Bearer token lại mở Session + query bảng users.
+# Mỗi entry = (phiên bản bảng users trong change_counters, Principal).
+# - Ghi ở process này: user_crud gọi invalidate_principal -> hết hiệu lực ngay.
+# - Ghi ở worker khác: phiên bản bảng users được đọc lại tối đa 1 lần mỗi
+#   PRINCIPAL_VERSION_CHECK_SECONDS (không phải mỗi request); entry khác phiên bản = miss.
+principal_cache = TTLCache(
+    maxsize=settings.PRINCIPAL_CACHE_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+)
+
+# Phiên bản bảng users đã biết gần nhất và thời điểm đọc (monotonic)
+_known_version = {"version": None, "checked_at": 0.0}
+_version_lock = threading.Lock()
+_MISSING = object()
+
+
+def _remember_version(version: int) -> None:
+    with _version_lock:
+        _known_version.update(version=version, checked_at=time.monotonic())
+
+
+def _fresh_users_version() -> Optional[int]:
+    """Phiên bản users đã biết nếu đọc chưa quá PRINCIPAL_VERSION_CHECK_SECONDS, ngược lại None."""
+    with _version_lock:
+        if time.monotonic() - _known_version["checked_at"] < settings.PRINCIPAL_VERSION_CHECK_SECONDS:
+            return _known_version["version"]
+    return None
+
+
+def known_users_version(version_reader: Callable[[], int]) -> int:
+    """Phiên bản bảng users; chỉ gọi version_reader (1 query) khi lần đọc trước đã cũ."""
+    version = _fresh_users_version()
+    if version is None:
+        version = version_reader()
+        _remember_version(version)
+    return version
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Ảnh chụp bất biến của User (dùng chung giữa các request, không phải ORM object)."""
+    id: int
+    username: str
+    full_name: Optional[str]
+    role: Optional[str]
+    is_active: int
+    created_at: Optional[datetime]
+
+    @classmethod
+    def from_user(cls, user) -> "Principal":
+        return cls(
+            id=user.id,
+            username=user.username,
+            full_name=user.full_name,
+            role=user.role,
+            is_active=user.is_active,
+            created_at=user.created_at,
+        )
+
+
+def cached_principal(username: str) -> Tuple[Optional[Principal], Optional[tuple]]:
+    """
+    Chỉ dùng bộ nhớ (không truy vấn DB, gọi được ngay trên event loop).
+    Trả về (Principal, None) nếu hit và phiên bản users đã biết còn mới; ngược lại
+    (None, entry trong cache hoặc None) để truyền cho get_principal trong threadpool.
+    """
+    entry = principal_cache.get(username)
+    version = _fresh_users_version()
+    if entry is not None and version is not None and entry[0] == version:
+        return entry[1], None
+    return None, entry
+
+
+def load_principal(
+    username: str,
+    loader: Callable[[str], Optional[object]],
+    version_reader: Callable[[], int],
+) -> Optional[Principal]:
+    """
+    Đọc user bằng `loader(username)` (truy vấn DB) rồi đưa vào cache.
+    Chỉ cache user còn active; user không tồn tại/bị khóa luôn đọc lại DB.
+    Phiên bản users đọc trước và sau khi load: có ghi chen giữa (vd. deactivate
+    commit lúc đang load) thì không cache bản có thể đã cũ.
+    """
+    version = version_reader()
+    user = loader(username)
+    if user is None:
+        _remember_version(version)
+        return None
+    principal = Principal.from_user(user)
+    after = version_reader()
+    _remember_version(after)
+    if principal.is_active == 1 and after == version:
+        principal_cache.set(username, (version, principal))
+    return principal
+
+
+def get_principal(
+    username: str,
+    loader: Callable[[str], Optional[object]],
+    version_reader: Callable[[], int],
+    entry=_MISSING,
+) -> Optional[Principal]:
+    """
+    Lấy user từ cache, nếu miss thì gọi `loader(username)` để đọc DB.
+    Cache hit không truy vấn DB, trừ khi phiên bản users đã biết cũ hơn
+    PRINCIPAL_VERSION_CHECK_SECONDS (khi đó đọc lại change_counters 1 lần cho cả process).
+    entry: kết quả cached_principal đã tra (không tra cache lần nữa).
+    """
+    if entry is _MISSING:
+        entry = principal_cache.get(username)
+    if entry is not None:
+        cached_version, principal = entry
+        if cached_version == known_users_version(version_reader):
+            return principal
+        principal_cache.pop(username)
+    return load_principal(username, loader, version_reader)
+
+
+def invalidate_principal(username: Optional[str]) -> None:
+    """
+    Xóa user khỏi cache của process hiện tại ngay khi dữ liệu user thay đổi.
+    Các worker khác thấy phiên bản bảng users đổi (CRUD users luôn gọi _touch)
+    sau tối đa PRINCIPAL_VERSION_CHECK_SECONDS.
+    """
+    if username:
+        principal_cache.pop(username)
+
+
+def clear_principal_cache() -> None:
+    """Xóa toàn bộ cache và phiên bản users đã biết (dữ liệu bị thay ngoài CRUD, vd. test)."""
+    principal_cache.clear()
+    with _version_lock:
+        _known_version.update(version=None, checked_at=0.0)
+
+
+def principal_cache_stats() -> dict:
+    """Bộ đếm hit/miss của cache (phục vụ theo dõi hiệu năng)."""
+    return principal_cache.stats()
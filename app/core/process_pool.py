@@ -0,0 +1,78 @@
+# app/core/process_pool.py
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+
+class PoolSaturated(Exception):
+    """Hàng đợi của pool đã đầy - caller nên trả 503 thay vì xếp hàng thêm."""
+
+
+class BoundedProcessPool:
+    """
+    Process pool giới hạn số worker và số job đang chờ (admission control).
+    - Tác vụ CPU nặng (argon2, resize ảnh...) chạy ngoài process chính,
+      không chiếm thread của anyio và không tranh CPU với request thường.
+    - Khi số job đang chạy + chờ >= max_pending -> submit() ném PoolSaturated ngay.
+    - max_workers <= 0: chạy trong thread phụ (không fork process), vẫn giữ giới hạn.
+    Pool chỉ được khởi tạo khi có job đầu tiên.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_pending: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.max_workers > 0:
+                # spawn: an toàn khi process chính đang có thread nền (camera loop)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix=self.name
+                )
+        return self._executor
+
+    def _release(self, _future: Future) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise PoolSaturated(f"{self.name}: {self._pending} jobs pending")
+            self._pending += 1
+            try:
+                future = self._get_executor().submit(fn, *args)
+            except Exception:
+                self._pending -= 1
+                raise
+        future.add_done_callback(self._release)
+        return future
+
+    def run_sync(self, fn: Callable[..., Any], *args: Any, timeout: Optional[float] = None) -> Any:
+        """Gọi từ code đồng bộ (threadpool): chờ kết quả từ pool."""
+        return self.submit(fn, *args).result(timeout=timeout)
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Gọi từ code async: await kết quả mà không chặn event loop."""
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
@@ -1,18 +1,50 @@
 # app/core/security.py
 
+import hashlib
+import time
 from datetime import datetime, timedelta
-from typing import Any, Union, Optional
+from typing import Any, Union, Optional, Tuple
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 from app.core.config import settings
+from app.core.process_pool import BoundedProcessPool
+from app.utils.lru_cache import TTLCache
 
 # Cấu hình hash password
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["argon2"],
+    deprecated="auto",
+    argon2__rounds=settings.ARGON2_TIME_COST,
+    argon2__memory_cost=settings.ARGON2_MEMORY_COST,
+    argon2__parallelism=settings.ARGON2_PARALLELISM,
+)
+
+# Pool riêng cho argon2: login dồn dập không chiếm hết threadpool/CPU của API
+password_pool = BoundedProcessPool(
+    name="argon2",
+    max_workers=settings.PASSWORD_POOL_WORKERS,
+    max_pending=settings.PASSWORD_POOL_MAX_PENDING,
+)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Kiểm tra mật khẩu có khớp không"""
     return pwd_context.verify(plain_password, hashed_password)
 
+def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    """
+    Kiểm tra mật khẩu, đồng thời trả về hash mới nếu hash cũ
+    dùng tham số argon2 khác cấu hình hiện tại (None nếu không cần đổi).
+    """
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+async def averify_password(
+    plain_password: str, hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    """verify_and_update_password chạy trong password_pool (ném PoolSaturated khi quá tải)"""
+    return await password_pool.run(verify_and_update_password, plain_password, hashed_password)
+
 def get_password_hash(password: str) -> str:
     """Hash mật khẩu để lưu vào DB"""
     return pwd_context.hash(password)
@@ -38,14 +70,28 @@ def create_access_token(subject: Union[str, Any], expires_delta: timedelta = Non
     )
     return encoded_jwt
 
+# Cache token đã verify, key = sha256(token); entry hết hạn đúng thời điểm `exp`.
+# JWT_CACHE_SIZE = 0 -> cache tắt, mọi lần decode đều verify chữ ký.
+_verified_tokens = TTLCache(maxsize=settings.JWT_CACHE_SIZE)
+
 def decode_access_token(token: str) -> Optional[dict]:
     """Giải mã JWT Token để lấy thông tin user"""
+    key = hashlib.sha256(token.encode("utf-8")).digest()
+    payload = _verified_tokens.get(key)
+    if payload is not None:
+        return dict(payload)
+
     try:
         payload = jwt.decode(
             token, 
             settings.JWT_SECRET, 
             algorithms=[settings.JWT_ALGORITHM]
         )
-        return payload
     except JWTError:
-        return None
\ No newline at end of file
+        return None
+
+    # Chỉ cache token có `exp` (token không hết hạn thì luôn verify lại)
+    exp = payload.get("exp")
+    if isinstance(exp, (int, float)):
+        _verified_tokens.set(key, dict(payload), ttl=exp - time.time())
+    return payload
\ No newline at end of file
@@ -1,14 +1,69 @@
 # app/crud/base.py
-from typing import Generic, TypeVar, Type, List, Optional
+from typing import Dict, Generic, Iterable, TypeVar, Type, List, Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import select
+from sqlalchemy import event, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from pydantic import BaseModel
+from app.core.event_bus import event_bus
+from app.db.models import ChangeCounter
+from app.utils.projection import check_fields
 
 # Khai báo kiểu generic
 ModelType = TypeVar("ModelType")
 CreateSchemaType = TypeVar("CreateSchemaType", bound=BaseModel)
 UpdateSchemaType = TypeVar("UpdateSchemaType", bound=BaseModel)
 
+# Key trong Session.info: phiên bản do transaction hiện tại tạo, chờ commit
+_PENDING_VERSIONS = "pending_table_versions"
+
+
+def bump_table_version(db: Session, table_name: str) -> None:
+    """
+    Tăng phiên bản dữ liệu của bảng (chưa commit - đi cùng transaction của thao tác ghi).
+    """
+    stmt = sqlite_insert(ChangeCounter).values(table_name=table_name, version=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ChangeCounter.table_name],
+        set_={"version": ChangeCounter.version + 1},
+    ).returning(ChangeCounter.version)
+    version = db.execute(stmt).scalar()
+    # Chỉ ghi nhận là của process này sau khi commit thành công (xem _note_committed_versions):
+    # transaction rollback thì số phiên bản này sẽ được worker khác dùng lại
+    db.info.setdefault(_PENDING_VERSIONS, []).append((table_name, version))
+
+
+@event.listens_for(Session, "after_commit")
+def _note_committed_versions(session: Session) -> None:
+    # Ghi nhận phiên bản do process này tạo: GET /events không phát lại "<table>.changed"
+    for table_name, version in session.info.pop(_PENDING_VERSIONS, ()):
+        event_bus.note_local_version(table_name, version)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending_versions(session: Session) -> None:
+    session.info.pop(_PENDING_VERSIONS, None)
+
+
+def get_table_version(db: Session, table_name: str) -> int:
+    """Phiên bản dữ liệu hiện tại của bảng (0 nếu chưa từng ghi)."""
+    version = db.execute(
+        select(ChangeCounter.version).where(ChangeCounter.table_name == table_name)
+    ).scalar()
+    return version or 0
+
+
+def get_table_versions(db: Session, table_names: Iterable[str]) -> Dict[str, int]:
+    """Phiên bản của nhiều bảng trong 1 truy vấn (dùng cho ETag)."""
+    names = list(table_names)
+    rows = db.execute(
+        select(ChangeCounter.table_name, ChangeCounter.version)
+        .where(ChangeCounter.table_name.in_(names))
+    ).all()
+    versions = dict.fromkeys(names, 0)
+    versions.update({name: version for name, version in rows})
+    return versions
+
+
 class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
     """
     CRUD Base class dùng cho mọi model.
@@ -19,6 +74,10 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
     def __init__(self, model: Type[ModelType]):
         self.model = model
 
+    def _touch(self, db: Session) -> None:
+        """Đánh dấu bảng của model đã thay đổi (gọi trước db.commit())."""
+        bump_table_version(db, self.model.__tablename__)
+
     def get(self, db: Session, id: int) -> Optional[ModelType]:
         return db.get(self.model, id)
 
@@ -48,10 +107,35 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
 
         return db.execute(query.offset(skip).limit(limit)).scalars().all()
 
+    def get_multi_columns(
+        self,
+        db: Session,
+        fields: List[str],
+        skip: int = 0,
+        limit: int = 100,
+        sort_by: str = "created_at",
+        sort_dir: str = "desc",
+    ) -> List[dict]:
+        """
+        Giống get_multi nhưng chỉ select các cột trong fields (không dựng ORM entity).
+        Trả về list dict {field: value}.
+        """
+        columns = self.model.__table__.columns
+        check_fields(fields, columns.keys())
+        query = select(*[columns[f] for f in fields])
+
+        if sort_by in columns:
+            sort_col = columns[sort_by]
+            query = query.order_by(sort_col.desc() if sort_dir == "desc" else sort_col)
+
+        rows = db.execute(query.offset(skip).limit(limit))
+        return [dict(row._mapping) for row in rows]
+
     def create(self, db: Session, obj_in: CreateSchemaType) -> ModelType:
         obj_data = obj_in.dict(exclude_unset=True)
         db_obj = self.model(**obj_data)
         db.add(db_obj)
+        self._touch(db)
         db.commit()
         db.refresh(db_obj)
         return db_obj
@@ -63,6 +147,7 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         for field, value in obj_data.items():
             setattr(db_obj, field, value)
         db.add(db_obj)
+        self._touch(db)
         db.commit()
         db.refresh(db_obj)
         return db_obj
@@ -71,5 +156,6 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         obj = db.get(self.model, id)
         if obj:
             db.delete(obj)
+            self._touch(db)
             db.commit()
         return obj
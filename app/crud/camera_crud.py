@@ -3,6 +3,7 @@
 from typing import List, Dict, Any, Optional
 from sqlalchemy.orm import Session
 from app.db import models, schemas
+from app.core.event_bus import publish
 from app.crud.base import CRUDBase
 
 class CRUDCamera(CRUDBase[models.Camera, schemas.CameraCreate, schemas.CameraUpdate]):
@@ -27,6 +28,9 @@ class CRUDCamera(CRUDBase[models.Camera, schemas.CameraCreate, schemas.CameraUpd
                 if hasattr(db_obj, field):
                     setattr(db_obj, field, value)
             db.add(db_obj)
+            # Vòng quét camera upsert lại mỗi chu kỳ: chỉ tăng phiên bản khi có thay đổi thật
+            if db.is_modified(db_obj):
+                self._touch(db)
             db.commit()
             db.refresh(db_obj)
             return db_obj
@@ -42,8 +46,10 @@ class CRUDCamera(CRUDBase[models.Camera, schemas.CameraCreate, schemas.CameraUpd
         if cam:
             cam.is_connected = 1
             cam.status = "ACTIVE"
+            self._touch(db)
             db.commit()
             db.refresh(cam)
+            publish("camera.connected", id=cam.id, device_id=cam.device_id, status=cam.status)
         return cam
 
     def disconnect(self, db: Session, camera_id: int):
@@ -51,8 +57,10 @@ class CRUDCamera(CRUDBase[models.Camera, schemas.CameraCreate, schemas.CameraUpd
         if cam:
             cam.is_connected = 0
             cam.status = "DISCONNECTED"
+            self._touch(db)
             db.commit()
             db.refresh(cam)
+            publish("camera.disconnected", id=cam.id, device_id=cam.device_id, status=cam.status)
         return cam
 
     def delete_by_id(self, db: Session, camera_id: int) -> Optional[models.Camera]:
@@ -62,6 +70,7 @@ class CRUDCamera(CRUDBase[models.Camera, schemas.CameraCreate, schemas.CameraUpd
         cam = self.get(db, camera_id)
         if cam:
             db.delete(cam)
+            self._touch(db)
             db.commit()
         return cam
 
@@ -71,6 +80,7 @@ class CRUDCamera(CRUDBase[models.Camera, schemas.CameraCreate, schemas.CameraUpd
         Trả về số lượng bản ghi đã xóa.
         """
         deleted_count = db.query(self.model).delete()
+        self._touch(db)
         db.commit()
         return deleted_count
 
@@ -0,0 +1,112 @@
+# app/crud/media_index_crud.py
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+from pydantic import BaseModel
+from sqlalchemy import delete, func, select, union_all
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.crud.base import CRUDBase
+from app.db.archive import archive_orders
+from app.db.models import Order, OrderMediaIndex
+
+# Đơn đã đóng: file không còn được ghi thêm, được phép xóa video
+CLOSED_STATUSES = ("closed", "error")
+# Đơn ở bảng hot và đơn đã lưu trữ (archive_chunks chuyển đơn nhưng file vẫn trên đĩa)
+ORDER_TABLES = (Order.__table__, archive_orders)
+
+
+# Schema tối giản để khớp với CRUDBase
+class MediaIndexSchema(BaseModel):
+    order_id: int
+
+
+class CRUDMediaIndex(CRUDBase[OrderMediaIndex, MediaIndexSchema, MediaIndexSchema]):
+    def pending(self, db: Session, after_id: int, limit: int, table=Order.__table__):
+        """
+        Đơn của `table` (orders hoặc archive_orders) cần stat lại (keyset theo id):
+        chưa có trong index, đường dẫn đã đổi, hoặc đơn chưa đóng (video có thể còn
+        đang ghi). Đơn đã index không bị stat lại.
+        """
+        m = self.model
+        return db.execute(
+            select(table.c.id, table.c.path_video, table.c.path_avatar)
+            .outerjoin(m, m.order_id == table.c.id)
+            .where(table.c.id > after_id)
+            .where(
+                (m.order_id.is_(None))
+                | m.video_path.is_distinct_from(table.c.path_video)
+                | m.avatar_path.is_distinct_from(table.c.path_avatar)
+                | table.c.status.not_in(CLOSED_STATUSES)
+                | table.c.status.is_(None)
+            )
+            .order_by(table.c.id)
+            .limit(limit)
+        ).all()
+
+    def upsert_many(self, db: Session, rows: Sequence[Dict]) -> None:
+        if not rows:
+            return
+        stmt = sqlite_insert(self.model).values(list(rows))
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[self.model.order_id],
+            set_={c: stmt.excluded[c] for c in rows[0] if c != "order_id"},
+        ))
+        db.commit()
+
+    def delete_stale(self, db: Session) -> int:
+        """Xóa dòng index của đơn không còn ở cả orders lẫn archive_orders (đã xóa)."""
+        order_id = self.model.order_id
+        deleted = db.execute(
+            delete(self.model).where(*[order_id.not_in(select(table.c.id)) for table in ORDER_TABLES])
+        ).rowcount
+        db.commit()
+        return deleted
+
+    def usage(self, db: Session) -> Dict[str, int]:
+        m = self.model
+        row = db.execute(
+            select(
+                func.coalesce(func.sum(m.video_bytes), 0).label("video_bytes"),
+                func.coalesce(func.sum(m.avatar_bytes), 0).label("avatar_bytes"),
+                func.count().filter((m.video_bytes > 0) | (m.avatar_bytes > 0)).label("orders"),
+            )
+        ).one()
+        return {
+            "video_bytes": row.video_bytes,
+            "avatar_bytes": row.avatar_bytes,
+            "total_bytes": row.video_bytes + row.avatar_bytes,
+            "orders": row.orders,
+        }
+
+    def eviction_candidates(
+        self, db: Session, limit: int, closed_before: Optional[datetime] = None, exclude_ids: Sequence[int] = ()
+    ) -> List:
+        """
+        Video của đơn đã đóng (orders + archive_orders), đóng sớm nhất trước. Đơn đã bị
+        xóa video rời khỏi tập này nên mỗi lô chỉ cần truy vấn lại từ đầu; exclude_ids:
+        đơn không xóa được ở lô trước. closed_before: chỉ lấy đơn đóng trước thời điểm này.
+        """
+        m = self.model
+        branches = []
+        for table in ORDER_TABLES:
+            query = (
+                select(table.c.id, table.c.closed_at, m.video_path, m.video_bytes)
+                .join(m, m.order_id == table.c.id)
+                .where(table.c.status.in_(CLOSED_STATUSES))
+                .where(m.video_path.is_not(None), m.video_path == table.c.path_video)
+            )
+            if closed_before is not None:
+                query = query.where(table.c.closed_at < closed_before)
+            if exclude_ids:
+                query = query.where(table.c.id.not_in(list(exclude_ids)))
+            branches.append(query)
+        candidates = union_all(*branches).subquery("candidates")
+        # closed_at NULL (dữ liệu cũ) xếp trước: coi như đơn cũ nhất
+        return db.execute(
+            select(candidates).order_by(candidates.c.closed_at, candidates.c.id).limit(limit)
+        ).all()
+
+
+media_index_crud = CRUDMediaIndex(OrderMediaIndex)
@@ -1,140 +1,898 @@
 # app/crud/order_crud.py
 import os
-import pytz
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import select, and_, or_, func
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, NamedTuple, Optional, Sequence
+from sqlalchemy.orm import Session, aliased, joinedload
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy import select, insert, update, delete, and_, or_, func, union, union_all
+from datetime import date, datetime, timedelta
 from app.db import models, schemas
-from app.crud.base import CRUDBase
+from app.db.archive import archive_orders
+from app.core.config import settings
+from app.core.event_bus import publish
+from app.crud.base import CRUDBase, get_table_version
+from app.utils.lru_cache import TTLCache
+from app.utils.pagination import encode_cursor, decode_keyset_cursor
+from app.utils.projection import check_fields
+from app.utils.time_utils import utc_now, vn_day_start, vn_now
+
+
+class OrderPage(NamedTuple):
+    items: List[models.Order]
+    total: Optional[int]
+    next_cursor: Optional[str]
+    total_estimated: bool = False
+
+
+# Cache tổng số bản ghi theo bộ lọc đã chuẩn hóa.
+# Key gồm phiên bản bảng orders (change_counters) -> mọi thao tác ghi đều làm cache cũ hết hiệu lực.
+_count_cache = TTLCache(
+    maxsize=settings.ORDER_COUNT_CACHE_SIZE,
+    ttl=settings.ORDER_COUNT_CACHE_TTL_SECONDS,
+)
+
 
 class CRUDOrder(CRUDBase[models.Order, schemas.OrderCreate, schemas.OrderUpdate]):
     """
     CRUD Order Nâng Cao:
-    - Xử lý múi giờ Việt Nam (ICT).
+    - Thời điểm lưu epoch UTC; ranh giới ngày (date_preset, thống kê) theo giờ Việt Nam (ICT).
     - Logic Family Code (Cha - Con - Chính nó).
     - Tự động dọn dẹp Video/Avatar khi xóa dữ liệu.
     """
 
-    def _get_vn_now(self):
-        """Lấy thời gian hiện tại chuẩn Asia/Ho_Chi_Minh"""
-        return datetime.now(pytz.timezone('Asia/Ho_Chi_Minh'))
+    def _now(self) -> datetime:
+        """Thời điểm hiện tại (aware UTC) cho start_at / closed_at"""
+        return utc_now()
 
-    def remove_all(self, db: Session) -> int:
+    @staticmethod
+    def _vn_day(col):
+        """Ngày VN của cột epoch UTC (giống trigger order_daily_stats, migration 0008)."""
+        return func.date(col, "unixepoch", "+7 hours")
+
+    # ------------------------------------------------------------------
+    # FAMILY INDEX (root_id)
+    # ------------------------------------------------------------------
+    def _root_of(self, db: Session, order_id: Optional[int]) -> Optional[int]:
+        """root_id của một đơn ở orders hoặc archive.orders (None nếu đơn không tồn tại)."""
+        if order_id is None:
+            return None
+        for table in (self.model.__table__, archive_orders):
+            root_id = db.execute(
+                select(func.coalesce(table.c.root_id, table.c.id)).where(table.c.id == order_id)
+            ).scalar()
+            if root_id is not None:
+                return root_id
+        return None
+
+    def _roots_of(self, db: Session, order_ids) -> dict:
+        """{id: root_id} của các đơn tồn tại ở orders hoặc archive.orders."""
+        if not order_ids:
+            return {}
+        ids = list(order_ids)
+        rows = db.execute(union_all(*[
+            select(table.c.id, func.coalesce(table.c.root_id, table.c.id)).where(table.c.id.in_(ids))
+            for table in (self.model.__table__, archive_orders)
+        ])).all()
+        return {order_id: root_id for order_id, root_id in rows}
+
+    def _subtree_ids(self, order_id: int):
+        """Subquery id của đơn và toàn bộ con cháu (đệ quy theo ix_orders_parent_id)."""
+        tree = select(self.model.id).where(self.model.id == order_id).cte("subtree", recursive=True)
+        tree = tree.union(select(self.model.id).where(self.model.parent_id == tree.c.id))
+        return select(tree.c.id)
+
+    def _set_subtree_root(self, db: Session, order_id: int, root_id: int) -> None:
+        db.execute(
+            update(self.model)
+            .where(self.model.id.in_(self._subtree_ids(order_id)))
+            .values(root_id=root_id)
+            .execution_options(synchronize_session="fetch")
+        )
+
+    @staticmethod
+    def _notice(order) -> dict:
+        """Nội dung gọn cho thông báo thay đổi (GET /events)."""
+        return {"id": order.id, "code": order.code, "status": order.status, "root_id": order.root_id}
+
+    def create(self, db: Session, obj_in: schemas.OrderCreate) -> models.Order:
+        obj_data = obj_in.model_dump(exclude_unset=True)
+        # Trigger orders_root_ai chỉ tra đơn cha trong bảng hot -> tự gán gốc khi cha
+        # có thể đã lưu trữ (không tìm thấy cha: để trigger gán gốc = chính nó)
+        if obj_in.parent_id is not None:
+            obj_data["root_id"] = self._root_of(db, obj_in.parent_id)
+        db_obj = self.model(**obj_data)
+        db.add(db_obj)
+        self._touch(db)
+        db.commit()
+        db.refresh(db_obj)
+        publish("order.created", **self._notice(db_obj))
+        return db_obj
+
+    def update(
+        self, db: Session, db_obj: models.Order, obj_in: schemas.OrderUpdate
+    ) -> models.Order:
+        obj_data = obj_in.model_dump(exclude_unset=True)
+        if "parent_id" in obj_data and obj_data["parent_id"] != db_obj.parent_id:
+            new_parent = obj_data["parent_id"]
+            if new_parent is not None:
+                in_subtree = db.execute(
+                    select(func.count()).where(self.model.id == new_parent)
+                    .where(self.model.id.in_(self._subtree_ids(db_obj.id)))
+                ).scalar()
+                if in_subtree:
+                    raise ValueError("parent_id would create a cycle in the order family")
+            # Chuyển cả nhánh con sang gốc mới
+            self._set_subtree_root(db, db_obj.id, self._root_of(db, new_parent) or db_obj.id)
+        return super().update(db, db_obj, obj_in)
+
+    def remove(self, db: Session, id: int) -> Optional[models.Order]:
+        obj = db.get(self.model, id)
+        if obj:
+            # Giống ON DELETE SET NULL: con trở thành gốc của nhánh của chính nó
+            child_ids = db.execute(
+                select(self.model.id).where(self.model.parent_id == obj.id)
+            ).scalars().all()
+            for child_id in child_ids:
+                db.execute(
+                    update(self.model)
+                    .where(self.model.id == child_id)
+                    .values(parent_id=None)
+                    .execution_options(synchronize_session="fetch")
+                )
+                self._set_subtree_root(db, child_id, child_id)
+            db.delete(obj)
+            self._touch(db)
+            db.commit()
+            publish("order.deleted", id=id)
+        return obj
+
+    def get_family(self, db: Session, order_id: int) -> List[models.Order]:
         """
-        Xóa toàn bộ dữ liệu Order và dọn dẹp file vật lý trên ổ đĩa.
+        Toàn bộ cây gia phả (mọi độ sâu) chứa đơn order_id: 1 lookup trên ix_orders_root_id.
+        Gồm cả các đơn đã lưu trữ (archive), vì 1 gia phả có thể nằm ở cả 2 bảng.
         """
-        all_orders = db.query(self.model).all()
-        base_path = os.getcwd()
+        M = self._all_orders_entity()
+        root_id = db.execute(select(func.coalesce(M.root_id, M.id)).where(M.id == order_id)).scalar()
+        if root_id is None:
+            return []
+        return db.execute(
+            select(M).where(or_(M.root_id == root_id, M.id == order_id)).order_by(M.id)
+        ).scalars().all()
+
+    def get_with_archive(self, db: Session, id: int) -> Optional[models.Order]:
+        """Như get() nhưng tìm thêm trong archive.orders (đơn đã lưu trữ - chỉ đọc)."""
+        obj = db.get(self.model, id)
+        if obj is None:
+            # Cột archive khớp theo tên (bảng khác, cùng cấu trúc)
+            archived = aliased(self.model, select(archive_orders).subquery("archived_orders"), adapt_on_names=True)
+            obj = db.execute(select(archived).where(archived.id == id)).scalar()
+        return obj
 
-        for order in all_orders:
-            # Xử lý xóa cả Video và Avatar
-            for file_attr in [order.path_video, order.path_avatar]:
-                if file_attr:
-                    full_path = file_attr if os.path.isabs(file_attr) else os.path.join(base_path, file_attr)
-                    try:
-                        if os.path.exists(full_path):
-                            os.remove(full_path)
-                    except Exception as e:
-                        print(f"[OrderCRUD] ⚠️ Không thể xóa file: {full_path} | {e}")
+    @staticmethod
+    def _remove_media_file(path: Optional[str]) -> Optional[bool]:
+        """Xóa 1 file media. None: không có file, True: đã xóa, False: lỗi."""
+        if not path:
+            return None
+        full_path = path if os.path.isabs(path) else os.path.join(os.getcwd(), path)
+        try:
+            os.remove(full_path)
+            return True
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"[OrderCRUD] ⚠️ Không thể xóa file: {full_path} | {e}")
+            return False
 
-        # Xóa bản ghi trong database
-        rows_deleted = db.query(self.model).delete()
+    def clear_video_paths(self, db: Session, items: Sequence[tuple]) -> List[int]:
+        """
+        Bỏ path_video của các đơn sắp bị xóa video (retention), items: (id, đường dẫn).
+        Chỉ cập nhật đơn (ở orders hoặc archive_orders) vẫn trỏ đúng đường dẫn đó;
+        đồng bộ luôn order_media_index. Trả về id các đơn đã cập nhật.
+        """
+        index = models.OrderMediaIndex
+        cleared = []
+        for order_id, path in items:
+            for table in (self.model.__table__, archive_orders):
+                rowcount = db.execute(
+                    update(table)
+                    .where(table.c.id == order_id, table.c.path_video == path)
+                    .values(path_video=None)
+                ).rowcount
+                if rowcount:
+                    cleared.append(order_id)
+                    break
+        if cleared:
+            db.execute(
+                update(index)
+                .where(index.order_id.in_(cleared))
+                .values(video_path=None, video_bytes=0, video_mtime=None)
+            )
+            self._touch(db)
         db.commit()
-        return rows_deleted
+        if cleared:
+            publish("order.media_evicted", ids=cleared)
+        return cleared
 
-    def filter_orders(
+    def purge_chunks(
         self,
         db: Session,
-        skip: int = 0,
-        limit: int = 100,
+        max_id: Optional[int] = None,
+        batch_size: int = None,
+        file_workers: int = None,
+    ) -> Iterator[dict]:
+        """
+        Xóa đơn hàng (id <= max_id) và file media theo từng lô, mỗi lô 1 commit.
+        Bảng orders trước, sau đó archive.orders (đơn đã lưu trữ cùng file của chúng).
+        - Chỉ đọc (id, path_video, path_avatar), duyệt keyset theo id
+        - File được xóa song song bằng thread pool giới hạn
+        - Mỗi lô giữ write lock SQLite trong thời gian ngắn
+        Yield tiến độ từng lô: {rows, files_deleted, files_failed}.
+        """
+        batch_size = batch_size or settings.PURGE_BATCH_SIZE
+        with ThreadPoolExecutor(max_workers=file_workers or settings.PURGE_FILE_WORKERS) as pool:
+            for table in (self.model.__table__, archive_orders):
+                last_id = 0
+                while True:
+                    query = select(table.c.id, table.c.path_video, table.c.path_avatar).where(
+                        table.c.id > last_id
+                    )
+                    if max_id is not None:
+                        query = query.where(table.c.id <= max_id)
+                    rows = db.execute(query.order_by(table.c.id).limit(batch_size)).all()
+                    if not rows:
+                        break
+
+                    paths = [p for row in rows for p in (row.path_video, row.path_avatar) if p]
+                    outcomes = list(pool.map(self._remove_media_file, paths))
+
+                    ids = [row.id for row in rows]
+                    if table is archive_orders:
+                        # Không có trigger trên archive: tự trừ phần archive_chunks đã cộng bù
+                        self._adjust_daily_stats(db, table, ids, -1)
+                    deleted = db.execute(
+                        delete(table).where(table.c.id.in_(ids)).execution_options(synchronize_session=False)
+                    ).rowcount
+                    self._touch(db)
+                    db.commit()
+
+                    last_id = ids[-1]
+                    publish("order.deleted", ids=ids)
+                    yield {
+                        "rows": deleted,
+                        "files_deleted": outcomes.count(True),
+                        "files_failed": outcomes.count(False),
+                    }
+
+    def remove_all(self, db: Session) -> int:
+        """
+        Xóa toàn bộ dữ liệu Order và dọn dẹp file vật lý trên ổ đĩa (chạy đồng bộ).
+        API dùng job nền (app/services/order_purge_service.py).
+        """
+        return sum(chunk["rows"] for chunk in self.purge_chunks(db))
+
+    def _code_match_ids(self, code_list: List[str], exact: bool = False, include_archive: bool = False):
+        """
+        Subquery id các đơn có code khớp danh sách mã.
+        - exact: so sánh bằng (IN) trên ix_orders_code.
+        - chuỗi con >= 3 ký tự: MATCH trên FTS5 trigram (orders_code_fts).
+        - chuỗi con ngắn hơn (trigram không index được): LIKE '%x%'.
+        - include_archive: thêm các đơn khớp trong archive.orders (IN / LIKE, không có FTS).
+        """
+        archived = archive_orders.c
+        if exact:
+            query = select(self.model.id).where(self.model.code.in_(code_list))
+            if include_archive:
+                query = union(query, select(archived.id).where(archived.code.in_(code_list)))
+            return query
+
+        fts_terms = [c for c in code_list if len(c) >= 3]
+        short_terms = [c for c in code_list if len(c) < 3]
+        parts = []
+        if fts_terms:
+            # Mỗi mã là 1 phrase FTS5 ("..." với " được nhân đôi)
+            match_query = " OR ".join('"' + c.replace('"', '""') + '"' for c in fts_terms)
+            parts.append(
+                select(models.orders_code_fts.c.rowid.label("id")).where(
+                    models.orders_code_fts.c.code.match(match_query)
+                )
+            )
+        if short_terms:
+            parts.append(
+                select(self.model.id).where(or_(*[self.model.code.contains(c) for c in short_terms]))
+            )
+        if include_archive:
+            parts.append(select(archived.id).where(or_(*[archived.code.contains(c) for c in code_list])))
+        return parts[0] if len(parts) == 1 else union(*parts)
+
+    def _filter_conditions(
+        self,
         code: str = None,
         status: str = None,
         date_preset: str = None,
         start_date: datetime = None,
         end_date: datetime = None,
-        sort_by: str = "created_at",
-        sort_dir: str = "desc",
-    ):
-        # Sử dụng joinedload để lấy luôn thông tin cha (hỗ trợ Flat List hiển thị đủ info)
-        query = select(self.model).options(joinedload(self.model.parent))
-        vn_now = self._get_vn_now()
+        code_match: str = "contains",
+        entity=None,
+        meta: Optional[dict] = None,
+    ) -> list:
+        """
+        Danh sách điều kiện WHERE dùng chung cho list, count và các truy vấn khác.
+        entity: Order (mặc định, chỉ bảng hot) hoặc kết quả của _query_entity (hot + archive).
+        """
+        M = self.model if entity is None else entity
+        conditions = []
 
         # --- 1. LOGIC FILTER CODE (Family Logic - Ưu tiên hàng đầu) ---
         if code:
             # Hỗ trợ search nhiều code cách nhau bởi dấu phẩy
             code_list = [c.strip() for c in code.split(",") if c.strip()]
             
-            # Subqueries tìm gia phả: Cha của mã này, và mã này là cha của ai
-            conditions = [self.model.code.contains(c) for c in code_list]
-            sub_ids = select(self.model.id).where(or_(*conditions))
-            sub_parent_ids = select(self.model.parent_id).where(or_(*conditions))
+            # Id các đơn khớp mã (qua index), rồi mở rộng ra cả gia phả (mọi độ sâu)
+            # bằng root_id (ix_orders_root_id)
+            matched_ids = self._code_match_ids(
+                code_list, exact=code_match == "exact", include_archive=M is not self.model
+            )
+            root_ids = select(M.root_id).where(M.id.in_(matched_ids))
 
-            query = query.where(
+            conditions.append(
                 or_(
-                    or_(*conditions),                # Chính nó
-                    self.model.parent_id.in_(sub_ids), # Các con của nó
-                    self.model.id.in_(sub_parent_ids)  # Cha của nó
+                    M.id.in_(matched_ids),       # Chính nó
+                    M.root_id.in_(root_ids),     # Cha, con, cháu... cùng gốc
                 )
             )
             # Khi có Code, hệ thống bỏ qua lọc ngày để lấy toàn bộ lịch sử gia phả
 
         else:
             # --- 2. LOGIC DATE FILTER (Chỉ chạy khi KHÔNG có code) ---
-            today_start = vn_now.replace(hour=0, minute=0, second=0, microsecond=0)
+            # Ranh giới ngày VN -> so sánh số nguyên trên cột epoch (range scan index)
+            today_start = vn_day_start()
             
             if date_preset == "today":
-                query = query.where(and_(self.model.created_at >= today_start, 
-                                         self.model.created_at < today_start + timedelta(days=1)))
+                conditions.append(and_(M.created_at >= today_start, 
+                                       M.created_at < today_start + timedelta(days=1)))
             elif date_preset == "yesterday":
                 start = today_start - timedelta(days=1)
-                query = query.where(and_(self.model.created_at >= start, self.model.created_at < today_start))
+                conditions.append(and_(M.created_at >= start, M.created_at < today_start))
             elif date_preset == "last7days":
-                query = query.where(self.model.created_at >= today_start - timedelta(days=7))
+                conditions.append(M.created_at >= today_start - timedelta(days=7))
             elif date_preset == "last15days":
-                query = query.where(self.model.created_at >= today_start - timedelta(days=15))
+                conditions.append(M.created_at >= today_start - timedelta(days=15))
 
             if start_date and end_date:
-                query = query.where(
+                conditions.append(
                     and_(
-                        self.model.created_at >= start_date,
-                        or_(self.model.closed_at <= end_date, self.model.closed_at.is_(None))
+                        M.created_at >= start_date,
+                        or_(M.closed_at <= end_date, M.closed_at.is_(None))
                     )
                 )
 
         # --- 3. FILTER STATUS ---
         if status:
-            query = query.where(self.model.status == status)
+            conditions.append(M.status == status)
+
+        # --- 4. FILTER METADATA (cột ảo meta_<key>, có index) ---
+        for key, values in (meta or {}).items():
+            col = getattr(M, models.metadata_column_name(key))
+            conditions.append(col == values[0] if len(values) == 1 else col.in_(values))
+
+        return conditions
+
+    def parse_meta_filters(self, params: dict) -> dict:
+        """
+        {"carrier": "GHN,GHTK", "sku_count": "2"} -> {"carrier": ["GHN", "GHTK"], "sku_count": [2]}
+        ValueError nếu khóa chưa khai báo trong models.ORDER_METADATA_KEYS hoặc sai kiểu.
+        """
+        meta = {}
+        for key, raw in params.items():
+            if key not in models.ORDER_METADATA_KEYS:
+                raise ValueError(f"Unknown metadata key: {key}")
+            python_type = models.ORDER_METADATA_KEYS[key].python_type
+            try:
+                values = [python_type(v.strip()) for v in raw.split(",") if v.strip()]
+            except ValueError:
+                raise ValueError(f"Invalid value for metadata key {key}: {raw}")
+            if values:
+                meta[key] = values
+        return meta
+
+    def _query_entity(self, code: str = None, start_date: datetime = None, end_date: datetime = None):
+        """
+        Nguồn dữ liệu của truy vấn lọc:
+        - tìm theo code hoặc khoảng start_date/end_date: orders UNION ALL archive.orders
+        - còn lại (date_preset, không lọc): chỉ bảng orders (hot)
+        """
+        if not code and not (start_date and end_date):
+            return self.model
+        return self._all_orders_entity()
+
+    def _all_orders_entity(self):
+        """Order ánh xạ lên orders UNION ALL archive.orders (chỉ dùng để đọc)."""
+        orders_all = union_all(
+            select(self.model.__table__), select(archive_orders)
+        ).subquery("orders_all")
+        return aliased(self.model, orders_all)
+
+    def _sort_column(self, sort_by: str, entity=None):
+        """Cột sort hợp lệ (chỉ cột thật của bảng), mặc định created_at."""
+        M = self.model if entity is None else entity
+        key = sort_by if sort_by in self.model.__table__.columns else "created_at"
+        return getattr(M, key)
+
+    def _keyset_condition(self, sort_col, sort_dir: str, value, last_id: int, entity=None):
+        """
+        Điều kiện "sau vị trí (value, last_id)" theo thứ tự (sort_col, id).
+        SQLite xếp NULL đầu tiên khi ASC và cuối cùng khi DESC.
+        """
+        id_col = (self.model if entity is None else entity).id
+        if sort_dir == "desc":
+            if value is None:
+                return and_(sort_col.is_(None), id_col < last_id)
+            return or_(
+                sort_col < value,
+                and_(sort_col == value, id_col < last_id),
+                sort_col.is_(None),
+            )
+        if value is None:
+            return or_(and_(sort_col.is_(None), id_col > last_id), sort_col.is_not(None))
+        return or_(sort_col > value, and_(sort_col == value, id_col > last_id))
+
+    def _count_key(self, code, code_match, status, date_preset, start_date, end_date, meta=None) -> tuple:
+        """Key chuẩn hóa của bộ lọc; date preset gắn với ngày hiện tại (VN) vì mốc thời gian trượt theo ngày."""
+        meta_key = tuple(sorted((k, tuple(v)) for k, v in (meta or {}).items()))
+        if code:
+            exact = code_match == "exact"
+            # exact: IN phân biệt hoa thường -> giữ nguyên; contains (FTS trigram / LIKE) thì không
+            codes = tuple(sorted({c.strip() if exact else c.strip().lower() for c in code.split(",") if c.strip()}))
+            return ("code", codes, "exact" if exact else "contains", status, meta_key)
+        preset_day = vn_now().date() if date_preset else None
+        return ("date", date_preset, preset_day, start_date, end_date, status, meta_key)
+
+    def _count_filtered(self, db: Session, conditions: list, filter_key: tuple, mode: str, entity=None):
+        """
+        Trả về (total, is_estimate).
+        - exact: đọc cache theo (phiên bản bảng, bộ lọc), miss thì count(*) rồi lưu cache.
+        - estimate: dùng kết quả exact nếu có; nếu không, dùng tổng của phiên bản trước
+          (nếu có) hoặc count có giới hạn ORDER_COUNT_ESTIMATE_CAP dòng.
+        """
+        M = self.model if entity is None else entity
+        version = get_table_version(db, self.model.__tablename__)
+        total = _count_cache.get((version, filter_key))
+        if total is not None:
+            return total, False
+
+        if mode == "estimate":
+            stale = _count_cache.get(("last", filter_key))
+            if stale is not None:
+                return stale, True
+            cap = settings.ORDER_COUNT_ESTIMATE_CAP
+            capped = select(M.id).where(*conditions).limit(cap).subquery()
+            total = db.execute(select(func.count()).select_from(capped)).scalar() or 0
+            if total >= cap:
+                return total, True
+        else:
+            count_query = select(func.count()).select_from(M).where(*conditions)
+            total = db.execute(count_query).scalar() or 0
+
+        _count_cache.set((version, filter_key), total)
+        _count_cache.set(("last", filter_key), total)
+        return total, False
+
+    def filter_orders_page(
+        self,
+        db: Session,
+        skip: int = 0,
+        limit: int = 100,
+        code: str = None,
+        status: str = None,
+        date_preset: str = None,
+        start_date: datetime = None,
+        end_date: datetime = None,
+        sort_by: str = "created_at",
+        sort_dir: str = "desc",
+        cursor: Optional[str] = None,
+        count: str = "exact",
+        code_match: str = "contains",
+        fields: Optional[List[str]] = None,
+        meta: Optional[dict] = None,
+    ) -> OrderPage:
+        """
+        Lấy 1 trang đơn hàng.
+        - cursor=None: phân trang offset (skip/limit) như cũ.
+        - cursor="" (trang đầu) hoặc next_cursor của trang trước: phân trang keyset
+          theo (sort_by, id), không phụ thuộc skip -> trang sâu không chậm dần.
+        - count: "exact" (đếm chính xác, có cache), "estimate" (ước lượng rẻ),
+          "none" (bỏ qua câu count(*) trên toàn bộ tập đã lọc).
+        - code_match="exact": code là danh sách mã chính xác (so sánh bằng).
+        - fields: chỉ select các cột này (+ "parent" để kèm đơn cha), items là list dict;
+          không dựng ORM entity, chỉ join đơn cha khi có "parent".
+        - meta: kết quả parse_meta_filters (lọc theo khóa order_metadata đã khai báo).
+        """
+        # Tìm theo code / khoảng ngày cụ thể: gộp cả đơn đã lưu trữ (archive)
+        M = self._query_entity(code=code, start_date=start_date, end_date=end_date)
+        sort_col = self._sort_column(sort_by, entity=M)
+        sort_dir = "asc" if sort_dir == "asc" else "desc"
+        conditions = self._filter_conditions(
+            code=code,
+            status=status,
+            date_preset=date_preset,
+            start_date=start_date,
+            end_date=end_date,
+            code_match=code_match,
+            entity=M,
+            meta=meta,
+        )
 
-        # --- 4. SORTING ---
-        if hasattr(self.model, sort_by):
-            sort_col = getattr(self.model, sort_by)
-            query = query.order_by(sort_col.desc() if sort_dir == "desc" else sort_col.asc())
+        if fields:
+            query, row_to_item = self._projection_query(M, fields, sort_col)
+            query = query.where(*conditions)
+        else:
+            # Sử dụng joinedload để lấy luôn thông tin cha (hỗ trợ Flat List hiển thị đủ info)
+            query = select(M).options(joinedload(M.parent)).where(*conditions)
+
+        # --- 4. SORTING (id làm tie-breaker để thứ tự ổn định giữa các trang) ---
+        if sort_dir == "desc":
+            query = query.order_by(sort_col.desc(), M.id.desc())
+        else:
+            query = query.order_by(sort_col.asc(), M.id.asc())
 
-        # --- 5. PAGINATION & TOTAL COUNT ---
+        # --- 5. TOTAL COUNT (tùy chọn) ---
         # Đếm tổng record sau khi đã áp dụng các bộ lọc (Để phân trang chính xác)
-        count_query = select(func.count()).select_from(query.subquery())
-        total = db.execute(count_query).scalar() or 0
-        
-        # Lấy dữ liệu
-        result = db.execute(query.offset(skip).limit(limit)).scalars().all()
-        return result, total
+        total, total_estimated = None, False
+        if count in ("exact", "estimate"):
+            filter_key = self._count_key(code, code_match, status, date_preset, start_date, end_date, meta)
+            total, total_estimated = self._count_filtered(db, conditions, filter_key, count, entity=M)
+
+        # --- 6. PAGINATION ---
+        if cursor is not None:
+            if cursor:
+                is_epoch = isinstance(self.model.__table__.c[sort_col.key].type, models.UTCEpoch)
+                value, last_id = decode_keyset_cursor(cursor, sort_col.key, sort_dir, datetime_value=is_epoch)
+                query = query.where(self._keyset_condition(sort_col, sort_dir, value, last_id, entity=M))
+        else:
+            query = query.offset(skip)
+
+        # Lấy dư 1 dòng để biết còn trang sau hay không
+        result = db.execute(query.limit(limit + 1))
+        rows = result.all() if fields else result.scalars().all()
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = encode_cursor(
+                {"s": sort_col.key, "d": sort_dir, "v": getattr(last, sort_col.key), "i": last.id}
+            )
+        items = [row_to_item(row) for row in rows[:limit]] if fields else rows[:limit]
+        return OrderPage(
+            items=items, total=total, next_cursor=next_cursor, total_estimated=total_estimated
+        )
+
+    def _projection_query(self, M, fields: List[str], sort_col):
+        """
+        select() chỉ gồm các cột được yêu cầu (+ id và cột sort cho keyset cursor),
+        "parent": outer join đơn cha với cùng các cột. Trả về (query, hàm Row -> dict).
+        """
+        table_columns = self.model.__table__.columns.keys()
+        check_fields(fields, list(table_columns) + ["parent"])
+        wanted = [f for f in fields if f != "parent"]
+        selected = list(dict.fromkeys(wanted + ["id", sort_col.key]))
+        query = select(*[getattr(M, f).label(f) for f in selected])
+
+        if "parent" not in fields:
+            return query, lambda row: {f: getattr(row, f) for f in wanted}
+
+        Parent = aliased(self.model)
+        parent_fields = list(dict.fromkeys(wanted + ["id"]))
+        query = query.add_columns(
+            *[getattr(Parent, f).label(f"parent__{f}") for f in parent_fields]
+        ).outerjoin(Parent, Parent.id == M.parent_id)
+
+        def row_to_item(row):
+            item = {f: getattr(row, f) for f in wanted}
+            if getattr(row, "parent__id") is None:
+                item["parent"] = None
+            else:
+                item["parent"] = {f: getattr(row, f"parent__{f}") for f in parent_fields}
+            return item
+
+        return query, row_to_item
+
+    def export_columns(self) -> List[str]:
+        """Các cột được export (chỉ cột của bảng orders, không kèm quan hệ và cột ảo meta_*)."""
+        return [c.key for c in self.model.__table__.columns if c.computed is None]
+
+    def iter_export_batches(
+        self,
+        db: Session,
+        code: str = None,
+        status: str = None,
+        date_preset: str = None,
+        start_date: datetime = None,
+        end_date: datetime = None,
+        sort_by: str = "created_at",
+        sort_dir: str = "desc",
+        code_match: str = "contains",
+        batch_size: int = None,
+        meta: Optional[dict] = None,
+    ) -> Iterator[Sequence]:
+        """
+        Duyệt toàn bộ đơn hàng khớp bộ lọc (giống filter_orders) theo từng lô Row.
+        - Chỉ select cột (không dựng ORM entity, không joinedload)
+        - yield_per: driver fetch dần từng lô -> bộ nhớ không tăng theo số dòng
+        """
+        M = self._query_entity(code=code, start_date=start_date, end_date=end_date)
+        sort_col = self._sort_column(sort_by, entity=M)
+        conditions = self._filter_conditions(
+            code=code,
+            status=status,
+            date_preset=date_preset,
+            start_date=start_date,
+            end_date=end_date,
+            code_match=code_match,
+            entity=M,
+            meta=meta,
+        )
+        columns = [getattr(M, key) for key in self.export_columns()]
+        query = select(*columns).where(*conditions)
+        if sort_dir == "asc":
+            query = query.order_by(sort_col.asc(), M.id.asc())
+        else:
+            query = query.order_by(sort_col.desc(), M.id.desc())
+
+        result = db.execute(
+            query.execution_options(yield_per=batch_size or settings.EXPORT_BATCH_SIZE)
+        )
+        try:
+            yield from result.partitions()
+        finally:
+            result.close()
+
+    def filter_orders(
+        self,
+        db: Session,
+        skip: int = 0,
+        limit: int = 100,
+        code: str = None,
+        status: str = None,
+        date_preset: str = None,
+        start_date: datetime = None,
+        end_date: datetime = None,
+        sort_by: str = "created_at",
+        sort_dir: str = "desc",
+        code_match: str = "contains",
+    ):
+        page = self.filter_orders_page(
+            db,
+            skip=skip,
+            limit=limit,
+            code=code,
+            status=status,
+            date_preset=date_preset,
+            start_date=start_date,
+            end_date=end_date,
+            sort_by=sort_by,
+            sort_dir=sort_dir,
+            code_match=code_match,
+        )
+        return page.items, page.total
+
+    # ------------------------------------------------------------------
+    # LƯU TRỮ (hot -> archive)
+    # ------------------------------------------------------------------
+    def _adjust_daily_stats(self, db: Session, table, ids: List[int], sign: int) -> None:
+        """
+        Cộng (sign=1) / trừ (sign=-1) các đơn `ids` của `table` vào order_daily_stats,
+        cùng khóa (ngày VN, camera, user, status) như trigger của bảng orders.
+        """
+        stat = models.OrderDailyStat.__table__
+        day = self._vn_day(table.c.created_at)
+        camera = func.coalesce(table.c.camera_id, 0)
+        user = func.coalesce(table.c.user_id, 0)
+        status = func.coalesce(table.c.status, "")
+        upsert = sqlite_insert(stat).from_select(
+            ["day", "camera_id", "user_id", "status", "count"],
+            select(day, camera, user, status, func.count() * sign)
+            .where(table.c.id.in_(ids), table.c.created_at.is_not(None))
+            .group_by(day, camera, user, status),
+        )
+        db.execute(upsert.on_conflict_do_update(
+            index_elements=["day", "camera_id", "user_id", "status"],
+            set_={"count": stat.c.count + upsert.excluded.count},
+        ))
+        if sign < 0:
+            db.execute(delete(stat).where(stat.c.count <= 0))
+
+    def archive_chunks(
+        self, db: Session, older_than: datetime, batch_size: int = None
+    ) -> Iterator[int]:
+        """
+        Chuyển đơn closed/error có closed_at < older_than sang archive.orders theo lô.
+        Mỗi lô 1 transaction (INSERT vào archive + DELETE khỏi orders); yield số đơn đã chuyển.
+        Đơn đã lưu trữ vẫn được tính trong order_daily_stats.
+        """
+        batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+        table = self.model.__table__
+        while True:
+            ids = db.execute(
+                select(self.model.id)
+                .where(self.model.status.in_(("closed", "error")), self.model.closed_at < older_than)
+                .order_by(self.model.id)
+                .limit(batch_size)
+            ).scalars().all()
+            if not ids:
+                break
+
+            # Cột ảo meta_* được archive tự tính lại từ order_metadata
+            stored = [c for c in table.columns if c.computed is None]
+            db.execute(archive_orders.insert().from_select(
+                [c.name for c in stored], select(*stored).where(table.c.id.in_(ids))
+            ))
+            # Trigger DELETE trừ rollup -> cộng bù lại để thống kê vẫn gồm đơn đã lưu trữ
+            self._adjust_daily_stats(db, table, ids, 1)
+            db.execute(
+                delete(self.model).where(self.model.id.in_(ids)).execution_options(synchronize_session=False)
+            )
+            self._touch(db)
+            db.commit()
+            yield len(ids)
+
+    # ------------------------------------------------------------------
+    # BULK (trạm đóng gói replay sau khi mất mạng)
+    # ------------------------------------------------------------------
+    def bulk_create(self, db: Session, objs_in: List[schemas.OrderCreate]) -> List[dict]:
+        """
+        Tạo nhiều đơn trong 1 transaction (1 câu INSERT nhiều dòng, RETURNING id).
+        Đơn cha được tìm ở cả orders và archive.orders; đơn có parent_id không tồn tại
+        bị bỏ qua và báo lỗi riêng cho phần tử đó.
+        Trả về kết quả theo đúng thứ tự đầu vào: {index, ok, id, error}.
+        """
+        roots = self._roots_of(db, {o.parent_id for o in objs_in if o.parent_id is not None})
+
+        results, rows, row_index = [], [], []
+        for index, obj_in in enumerate(objs_in):
+            if obj_in.parent_id is not None and obj_in.parent_id not in roots:
+                results.append({"index": index, "ok": False, "id": None, "error": "Parent order not found"})
+                continue
+            results.append({"index": index, "ok": True, "id": None, "error": None})
+            # root_id gán sẵn (cha có thể đã lưu trữ); đơn gốc: None -> trigger gán = id
+            rows.append({**obj_in.model_dump(), "root_id": roots.get(obj_in.parent_id)})
+            row_index.append(index)
+
+        if rows:
+            # created_at lấy default của cột (utc_now)
+            ids = db.execute(
+                insert(self.model).returning(self.model.id, sort_by_parameter_order=True),
+                rows,
+            ).scalars().all()
+            for index, new_id in zip(row_index, ids):
+                results[index]["id"] = new_id
+            self._touch(db)
+            db.commit()
+            # 1 sự kiện cho cả lô (như purge): lô lớn không làm tràn hàng đợi subscriber / ring buffer
+            publish("order.created", ids=[results[index]["id"] for index in row_index])
+        return results
+
+    def bulk_transition(self, db: Session, transitions: List[schemas.OrderTransition]) -> List[dict]:
+        """
+        Áp dụng nhiều thao tác start/close trong 1 transaction (1 câu UPDATE executemany theo id).
+        Các thao tác trên cùng một đơn được áp dụng lần lượt theo thứ tự gửi lên.
+        Trả về kết quả theo đúng thứ tự đầu vào: {index, ok, id, status, error}.
+        """
+        ids = {t.id for t in transitions}
+        state = {
+            row.id: dict(row._mapping)
+            for row in db.execute(
+                select(self.model.id, self.model.status, self.model.start_at, self.model.closed_at)
+                .where(self.model.id.in_(ids))
+            )
+        }
+
+        now = self._now()
+        results = []
+        for index, t in enumerate(transitions):
+            current = state.get(t.id)
+            if current is None:
+                results.append({"index": index, "ok": False, "id": t.id, "status": None, "error": "Order not found"})
+                continue
+            if t.action == "start":
+                current.update(status="processing", start_at=now)
+            else:
+                current.update(status=t.status, closed_at=now)
+            results.append({"index": index, "ok": True, "id": t.id, "status": current["status"], "error": None})
+
+        if state:
+            # ORM bulk UPDATE theo primary key -> executemany
+            db.execute(update(self.model), list(state.values()))
+            self._touch(db)
+            db.commit()
+            # Tối đa 1 sự kiện mỗi loại cho cả lô: {ids: [...]}
+            started, closed = [], []
+            for t, result in zip(transitions, results):
+                if result["ok"]:
+                    (started if t.action == "start" else closed).append(t.id)
+            if started:
+                publish("order.started", ids=started)
+            if closed:
+                publish("order.closed", ids=closed)
+        return results
+
+    # ------------------------------------------------------------------
+    # THỐNG KÊ (rollup order_daily_stats, do trigger duy trì)
+    # ------------------------------------------------------------------
+    def stats_range(self, date_preset: Optional[str], start_day: date = None, end_day: date = None):
+        """Khoảng ngày VN [start_day, end_day] cho các preset giống filter_orders."""
+        today = vn_now().date()
+        if date_preset == "today":
+            return today, today
+        if date_preset == "yesterday":
+            return today - timedelta(days=1), today - timedelta(days=1)
+        if date_preset == "last7days":
+            return today - timedelta(days=7), today
+        if date_preset == "last15days":
+            return today - timedelta(days=15), today
+        if start_day is None or end_day is None:
+            raise ValueError("start_day and end_day are required without date_preset")
+        if start_day > end_day:
+            raise ValueError("start_day must not be after end_day")
+        return start_day, end_day
+
+    def daily_stats(
+        self,
+        db: Session,
+        start_day: date,
+        end_day: date,
+        camera_id: Optional[int] = None,
+        user_id: Optional[int] = None,
+    ) -> dict:
+        """
+        Số đơn theo ngày và trạng thái trong khoảng [start_day, end_day].
+        Chỉ đọc bảng rollup -> chi phí theo số ngày, không theo số đơn.
+        """
+        stat = models.OrderDailyStat
+        query = (
+            select(stat.day, stat.status, func.sum(stat.count))
+            .where(stat.day >= start_day, stat.day <= end_day)
+            .group_by(stat.day, stat.status)
+            .order_by(stat.day)
+        )
+        if camera_id is not None:
+            query = query.where(stat.camera_id == camera_id)
+        if user_id is not None:
+            query = query.where(stat.user_id == user_id)
+
+        by_status, by_day = {}, {}
+        for day, status, count in db.execute(query):
+            by_status[status] = by_status.get(status, 0) + count
+            bucket = by_day.setdefault(day, {"day": day, "total": 0, "by_status": {}})
+            bucket["total"] += count
+            bucket["by_status"][status] = count
+
+        return {
+            "start_day": start_day,
+            "end_day": end_day,
+            "total": sum(by_status.values()),
+            "by_status": by_status,
+            "by_day": list(by_day.values()),
+        }
 
     def start_order(self, db: Session, order_id: int):
         db_obj = self.get(db, id=order_id)
         if db_obj:
             db_obj.status = "processing"
-            db_obj.start_at = self._get_vn_now()
+            db_obj.start_at = self._now()
+            self._touch(db)
             db.commit()
             db.refresh(db_obj)
+            publish("order.started", **self._notice(db_obj))
         return db_obj
 
     def close_order(self, db: Session, order_id: int, status: str = "closed"):
         db_obj = self.get(db, id=order_id)
         if db_obj:
             db_obj.status = status
-            db_obj.closed_at = self._get_vn_now()
+            db_obj.closed_at = self._now()
+            self._touch(db)
             db.commit()
             db.refresh(db_obj)
+            publish("order.closed", **self._notice(db_obj))
         return db_obj
 
 order_crud = CRUDOrder(models.Order)
\ No newline at end of file
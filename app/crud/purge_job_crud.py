@@ -0,0 +1,56 @@
+# app/crud/purge_job_crud.py
+from datetime import timedelta
+from typing import Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from pydantic import BaseModel
+from app.core.config import settings
+from app.crud.base import CRUDBase
+from app.db.models import PurgeJob, get_vn_time
+
+
+# Schema tối giản để khớp với CRUDBase
+class PurgeJobSchema(BaseModel):
+    max_order_id: Optional[int] = None
+    total: int = 0
+
+
+class CRUDPurgeJob(CRUDBase[PurgeJob, PurgeJobSchema, PurgeJobSchema]):
+    def _now(self):
+        # DateTime trên SQLite lưu giờ VN không kèm tzinfo
+        return get_vn_time().replace(tzinfo=None)
+
+    def get_active(self, db: Session) -> Optional[PurgeJob]:
+        """Job đang chạy (bỏ qua job không cập nhật quá PURGE_JOB_STALE_SECONDS - process đã chết)."""
+        fresh_after = self._now() - timedelta(seconds=settings.PURGE_JOB_STALE_SECONDS)
+        return db.execute(
+            select(self.model)
+            .where(self.model.status == "running", self.model.updated_at >= fresh_after)
+            .order_by(self.model.id.desc())
+            .limit(1)
+        ).scalars().first()
+
+    def add_progress(self, db: Session, job_id: int, chunk: dict) -> None:
+        db.execute(
+            update(self.model)
+            .where(self.model.id == job_id)
+            .values(
+                deleted_rows=self.model.deleted_rows + chunk["rows"],
+                deleted_files=self.model.deleted_files + chunk["files_deleted"],
+                failed_files=self.model.failed_files + chunk["files_failed"],
+                updated_at=self._now(),
+            )
+        )
+        db.commit()
+
+    def finish(self, db: Session, job_id: int, status: str, error: Optional[str] = None) -> None:
+        now = self._now()
+        db.execute(
+            update(self.model)
+            .where(self.model.id == job_id)
+            .values(status=status, error=error, updated_at=now, finished_at=now)
+        )
+        db.commit()
+
+
+purge_job_crud = CRUDPurgeJob(PurgeJob)
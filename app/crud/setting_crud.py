@@ -22,6 +22,9 @@ class CRUDSetting(CRUDBase[Setting, SettingSchema, SettingSchema]):
             db_obj = self.model(key=key, value=value)
             db.add(db_obj)
         
+        # sync gửi lại cả bộ setting: chỉ tăng phiên bản khi giá trị thật sự đổi
+        if db.is_modified(db_obj):
+            self._touch(db)
         db.commit()
         db.refresh(db_obj)
         return db_obj
@@ -1,7 +1,8 @@
 from sqlalchemy.orm import Session
 from app.db import models, schemas
 from app.crud.base import CRUDBase
-from app.core.security import hash_password 
+from app.core.security import hash_password, password_pool
+from app.core.principal_cache import invalidate_principal
 
 class CRUDUser(CRUDBase[models.User, schemas.UserCreate, schemas.UserUpdate]):
     
@@ -15,9 +16,9 @@ class CRUDUser(CRUDBase[models.User, schemas.UserCreate, schemas.UserUpdate]):
         # Lấy password thô ra để hash
         raw_password = obj_in_data.pop("password")
         
-        # Chỉ hash DUY NHẤT một lần ở đây
+        # Chỉ hash DUY NHẤT một lần ở đây (chạy trong password_pool, không chiếm CPU của API)
         # Đảm bảo password_hash là tên cột trong DB của bạn
-        obj_in_data["password_hash"] = hash_password(raw_password)
+        obj_in_data["password_hash"] = password_pool.run_sync(hash_password, raw_password)
         
         db_obj = self.model(**obj_in_data)
         db.add(db_obj)
@@ -25,20 +26,49 @@ class CRUDUser(CRUDBase[models.User, schemas.UserCreate, schemas.UserUpdate]):
         db.refresh(db_obj)
         return db_obj
 
+    def update(
+        self, db: Session, db_obj: models.User, obj_in: schemas.UserUpdate
+    ) -> models.User:
+        user = super().update(db, db_obj, obj_in)
+        invalidate_principal(user.username)
+        return user
+
+    def update_password_hash(self, db: Session, user: models.User, password_hash: str):
+        """Lưu hash mới (ví dụ khi rehash do đổi tham số argon2)."""
+        user.password_hash = password_hash
+        self._touch(db)
+        db.commit()
+        db.refresh(user)
+        invalidate_principal(user.username)
+        return user
+
     def activate(self, db: Session, user_id: int):
         user = self.get(db, id=user_id)
         if user:
             user.is_active = 1
+            # Tăng phiên bản bảng users: principal cache ở mọi worker hết hiệu lực
+            self._touch(db)
             db.commit()
             db.refresh(user)
+            invalidate_principal(user.username)
         return user
 
     def deactivate(self, db: Session, user_id: int):
         user = self.get(db, id=user_id)
         if user:
             user.is_active = 0
+            # Tăng phiên bản bảng users: principal cache ở mọi worker hết hiệu lực
+            self._touch(db)
             db.commit()
             db.refresh(user)
+            invalidate_principal(user.username)
+        return user
+
+    def remove(self, db: Session, id: int):
+        user = self.get(db, id=id)
+        username = user.username if user else None
+        user = super().remove(db, id=id)
+        invalidate_principal(username)
         return user
 
 user_crud = CRUDUser(models.User)
\ No newline at end of file
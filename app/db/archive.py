@@ -0,0 +1,120 @@
+# Kho lưu trữ (cold storage) cho đơn hàng đã đóng lâu ngày
+# app/db/archive.py
+"""
+Đơn hàng đã đóng quá ARCHIVE_AFTER_DAYS ngày được chuyển sang 1 file SQLite riêng,
+ATTACH vào mọi connection với tên schema "archive". Bảng orders (hot) nhỏ lại nên
+các truy vấn date_preset / count / index walk không phải trả giá cho lịch sử nhiều năm.
+"""
+import os
+from sqlalchemy import MetaData, Table, Column, Computed, Index, event
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.schema import CreateColumn, CreateTable, CreateIndex
+from app.core.config import settings
+from app.db.models import ORDER_METADATA_KEYS, Order, metadata_column_name
+
+ARCHIVE_SCHEMA = "archive"
+
+archive_metadata = MetaData()
+
+
+def _archive_column(c) -> Column:
+    # Cột ảo meta_* giữ nguyên biểu thức generated
+    computed = [Computed(c.computed.sqltext, persisted=c.computed.persisted)] if c.computed is not None else []
+    return Column(c.name, c.type, *computed, primary_key=c.primary_key)
+
+
+# Cùng cột với orders (không FK: bảng được tham chiếu nằm ở DB chính)
+archive_orders = Table(
+    "orders",
+    archive_metadata,
+    *[_archive_column(c) for c in Order.__table__.columns],
+    schema=ARCHIVE_SCHEMA,
+)
+Index("ix_archive_orders_created_at_id", archive_orders.c.created_at, archive_orders.c.id)
+Index("ix_archive_orders_code", archive_orders.c.code)
+Index("ix_archive_orders_root_id", archive_orders.c.root_id)
+for _key in ORDER_METADATA_KEYS:
+    _name = metadata_column_name(_key)
+    Index(f"ix_archive_orders_{_name}", archive_orders.c[_name])
+
+
+def archive_db_path(db_url: str = None) -> str:
+    """File archive: ARCHIVE_DB_PATH, mặc định <tên db>_archive.db cạnh DB chính."""
+    if settings.ARCHIVE_DB_PATH:
+        return settings.ARCHIVE_DB_PATH
+    db_file = (db_url or settings.DB_URL).replace("sqlite:///", "")
+    if db_file in ("", ":memory:"):
+        return ":memory:"
+    root, ext = os.path.splitext(db_file)
+    return f"{root}_archive{ext or '.db'}"
+
+
+_dialect = sqlite.dialect()
+_TABLE_DDL = str(CreateTable(archive_orders, if_not_exists=True).compile(dialect=_dialect))
+_INDEX_DDL = [
+    str(CreateIndex(index, if_not_exists=True).compile(dialect=_dialect))
+    for index in sorted(archive_orders.indexes, key=lambda i: i.name)
+]
+
+
+# PRAGMA archive.user_version: 1 = cột thời gian đã là epoch UTC (migration 0008)
+ARCHIVE_FORMAT_VERSION = 1
+_EPOCH_COLUMNS = ("created_at", "start_at", "closed_at")
+
+
+def _epoch_from_text(col: str) -> str:
+    """Như migration 0008: chuỗi không có offset là giờ VN (UTC+7)."""
+    return (
+        f"CASE WHEN {col} GLOB '*[+-][0-9][0-9]:[0-9][0-9]' OR {col} GLOB '*Z' "
+        f"THEN CAST(strftime('%s', {col}) AS INTEGER) "
+        f"ELSE CAST(strftime('%s', {col}) AS INTEGER) - 25200 END"
+    )
+
+
+def _upgrade_archive_format(dbapi_connection, cursor) -> None:
+    """Chuyển dữ liệu của file archive cũ sang định dạng hiện tại (1 lần cho mỗi file)."""
+    version = cursor.execute(f"PRAGMA {ARCHIVE_SCHEMA}.user_version").fetchone()[0]
+    if version >= ARCHIVE_FORMAT_VERSION:
+        return
+    for col in _EPOCH_COLUMNS:
+        cursor.execute(
+            f"UPDATE {ARCHIVE_SCHEMA}.orders SET {col} = {_epoch_from_text(col)} "
+            f"WHERE typeof({col}) = 'text'"
+        )
+    cursor.execute(f"PRAGMA {ARCHIVE_SCHEMA}.user_version = {ARCHIVE_FORMAT_VERSION}")
+    # sqlite3 tự mở transaction trước UPDATE
+    dbapi_connection.commit()
+
+
+def attach_archive(dbapi_connection, path: str) -> None:
+    """
+    ATTACH file archive vào connection, tạo bảng nếu chưa có, thêm các cột
+    mới của orders (migration sau này) còn thiếu trong file archive cũ và
+    chuyển dữ liệu cũ sang định dạng hiện tại.
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (path,))
+        cursor.execute(_TABLE_DDL)
+        existing = {row[1] for row in cursor.execute(f"PRAGMA {ARCHIVE_SCHEMA}.table_xinfo(orders)")}
+        for col in archive_orders.columns:
+            if col.name not in existing:
+                col_ddl = CreateColumn(col).compile(dialect=_dialect)
+                cursor.execute(f"ALTER TABLE {ARCHIVE_SCHEMA}.orders ADD COLUMN {col_ddl}")
+        # Index sau khi đủ cột (file archive cũ có thể thiếu cột được index)
+        for ddl in _INDEX_DDL:
+            cursor.execute(ddl)
+        _upgrade_archive_format(dbapi_connection, cursor)
+    finally:
+        cursor.close()
+
+
+def install(engine) -> None:
+    """Đăng ký ATTACH archive cho mọi connection mới của engine (chỉ SQLite)."""
+    if engine.dialect.name != "sqlite":
+        return
+    path = archive_db_path(str(engine.url))
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        attach_archive(dbapi_connection, path)
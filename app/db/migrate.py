@@ -0,0 +1,23 @@
+# app/db/migrate.py
+import os
+from typing import Optional
+from alembic import command
+from alembic.config import Config
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+ALEMBIC_INI = os.path.join(ROOT_DIR, "alembic.ini")
+
+
+def alembic_config(db_url: Optional[str] = None) -> Config:
+    """Config Alembic của project; db_url=None -> dùng settings.DB_URL."""
+    cfg = Config(ALEMBIC_INI)
+    # Không để Alembic cấu hình lại logging của app khi chạy từ code
+    cfg.attributes["configure_logger"] = False
+    if db_url:
+        cfg.set_main_option("sqlalchemy.url", db_url)
+    return cfg
+
+
+def upgrade_head(db_url: Optional[str] = None) -> None:
+    """Chạy toàn bộ migration tới revision mới nhất."""
+    command.upgrade(alembic_config(db_url), "head")
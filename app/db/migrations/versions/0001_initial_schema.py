@@ -0,0 +1,100 @@
+"""initial schema (users, cameras, orders, settings)
+
+Bảng chỉ được tạo nếu chưa tồn tại, để DB cũ tạo bằng init.sql
+có thể chuyển sang Alembic mà không mất dữ liệu.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _has_table(name: str) -> bool:
+    return sa.inspect(op.get_bind()).has_table(name)
+
+
+def upgrade() -> None:
+    if not _has_table("users"):
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("username", sa.String(50), nullable=False),
+            sa.Column("password_hash", sa.Text(), nullable=False),
+            sa.Column("full_name", sa.String(100)),
+            sa.Column("role", sa.String(20), server_default="operator"),
+            sa.Column("is_active", sa.Integer(), server_default="1"),
+            sa.Column("created_at", sa.DateTime(), server_default=sa.func.current_timestamp()),
+        )
+        op.create_index("ix_users_id", "users", ["id"])
+        op.create_index("ix_users_username", "users", ["username"], unique=True)
+
+    if not _has_table("cameras"):
+        op.create_table(
+            "cameras",
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("name", sa.String()),
+            sa.Column("unique_id", sa.String(), nullable=False),
+            sa.Column("device_id", sa.String(100), nullable=False),
+            sa.Column("display_name", sa.String(100)),
+            sa.Column("rtsp_url", sa.Text()),
+            sa.Column("backend", sa.String(50)),
+            sa.Column("prefer_gst", sa.Integer(), server_default="0"),
+            sa.Column("is_connected", sa.Integer(), server_default="0"),
+            sa.Column("created_at", sa.DateTime(), server_default=sa.func.current_timestamp()),
+            sa.Column("device_path", sa.String(255)),
+            sa.Column("status", sa.String(50)),
+            sa.Column("os_index", sa.Integer(), server_default="0"),
+        )
+        op.create_index("ix_cameras_id", "cameras", ["id"])
+        op.create_index("ix_cameras_unique_id", "cameras", ["unique_id"], unique=True)
+        op.create_index("ix_cameras_device_id", "cameras", ["device_id"], unique=True)
+
+    if not _has_table("orders"):
+        op.create_table(
+            "orders",
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("camera_id", sa.Integer(), sa.ForeignKey("cameras.id", ondelete="SET NULL")),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="SET NULL")),
+            sa.Column("parent_id", sa.Integer(), sa.ForeignKey("orders.id", ondelete="SET NULL")),
+            sa.Column("session_id", sa.String(100)),
+            sa.Column("code", sa.String(100)),
+            sa.Column("status", sa.String(20), server_default="packing"),
+            sa.Column("created_at", sa.DateTime(), server_default=sa.func.current_timestamp()),
+            sa.Column("start_at", sa.DateTime()),
+            sa.Column("closed_at", sa.DateTime()),
+            sa.Column("path_avatar", sa.String(255)),
+            sa.Column("path_video", sa.String(255)),
+            sa.Column("order_metadata", sa.Text()),
+            sa.Column("note", sa.Text()),
+            sqlite_autoincrement=True,
+        )
+        op.create_index("ix_orders_id", "orders", ["id"])
+        op.create_index("ix_orders_code", "orders", ["code"])
+
+    if not _has_table("settings"):
+        op.create_table(
+            "settings",
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("key", sa.String(100), nullable=False),
+            sa.Column("value", sa.Text(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(), server_default=sa.func.current_timestamp()),
+        )
+        op.create_index("ix_settings_id", "settings", ["id"])
+        op.create_index("ix_settings_key", "settings", ["key"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_table("settings")
+    op.drop_table("orders")
+    op.drop_table("cameras")
+    op.drop_table("users")
@@ -0,0 +1,31 @@
+"""composite indexes cho các truy vấn nóng của filter_orders
+
+- (created_at, id): date preset + sort mặc định created_at desc, keyset cursor
+- (status, created_at): lọc status kết hợp preset/sort theo ngày
+- (parent_id): tìm con trong family code search
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_orders_created_at_id", "orders", ["created_at", "id"], if_not_exists=True)
+    op.create_index("ix_orders_status_created_at", "orders", ["status", "created_at"], if_not_exists=True)
+    op.create_index("ix_orders_parent_id", "orders", ["parent_id"], if_not_exists=True)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_orders_parent_id", table_name="orders")
+    op.drop_index("ix_orders_status_created_at", table_name="orders")
+    op.drop_index("ix_orders_created_at_id", table_name="orders")
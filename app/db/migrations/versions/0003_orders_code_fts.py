@@ -0,0 +1,47 @@
+"""FTS5 trigram index cho orders.code (tìm kiếm chuỗi con)
+
+Bảng ảo orders_code_fts dùng external content = orders, đồng bộ bằng trigger.
+filter_orders dùng MATCH trên bảng này thay cho LIKE '%x%' (full scan).
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS orders_code_fts USING fts5("
+        "code, content='orders', content_rowid='id', tokenize='trigram')"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS orders_code_fts_ai AFTER INSERT ON orders BEGIN "
+        "INSERT INTO orders_code_fts(rowid, code) VALUES (new.id, new.code); END"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS orders_code_fts_ad AFTER DELETE ON orders BEGIN "
+        "INSERT INTO orders_code_fts(orders_code_fts, rowid, code) VALUES ('delete', old.id, old.code); END"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS orders_code_fts_au AFTER UPDATE OF code ON orders BEGIN "
+        "INSERT INTO orders_code_fts(orders_code_fts, rowid, code) VALUES ('delete', old.id, old.code); "
+        "INSERT INTO orders_code_fts(rowid, code) VALUES (new.id, new.code); END"
+    )
+    # Index dữ liệu đã có
+    op.execute("INSERT INTO orders_code_fts(orders_code_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS orders_code_fts_au")
+    op.execute("DROP TRIGGER IF EXISTS orders_code_fts_ad")
+    op.execute("DROP TRIGGER IF EXISTS orders_code_fts_ai")
+    op.execute("DROP TABLE IF EXISTS orders_code_fts")
@@ -0,0 +1,56 @@
+"""orders.root_id: chỉ mục gia phả (family) dạng materialized root
+
+Mỗi đơn lưu id của gốc cây gia phả (chính nó nếu không có cha),
+cả family ở mọi độ sâu lấy được bằng 1 lookup trên ix_orders_root_id.
+Trigger orders_root_ai gán root_id cho mọi INSERT (kể cả ghi thẳng qua ORM);
+đổi cha / xoá đơn thì CRUDOrder chuyển gốc cho cả nhánh (trigger SQLite
+không dùng được CTE đệ quy).
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("orders", sa.Column("root_id", sa.Integer()))
+
+    # Backfill: đi từ các gốc (không có cha / cha không còn tồn tại) xuống con cháu
+    op.execute(
+        """
+        WITH RECURSIVE tree(id, root_id) AS (
+            SELECT id, id FROM orders
+            WHERE parent_id IS NULL OR parent_id NOT IN (SELECT id FROM orders)
+            UNION
+            SELECT o.id, tree.root_id FROM orders o JOIN tree ON o.parent_id = tree.id
+        )
+        UPDATE orders SET root_id = (SELECT tree.root_id FROM tree WHERE tree.id = orders.id)
+        """
+    )
+    # Dữ liệu lỗi (vòng lặp cha-con): coi mỗi đơn là gốc của chính nó
+    op.execute("UPDATE orders SET root_id = id WHERE root_id IS NULL")
+    op.create_index("ix_orders_root_id", "orders", ["root_id"])
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS orders_root_ai AFTER INSERT ON orders "
+        "WHEN new.root_id IS NULL BEGIN "
+        "UPDATE orders SET root_id = COALESCE("
+        "(SELECT COALESCE(p.root_id, p.id) FROM orders p WHERE p.id = new.parent_id), new.id) "
+        "WHERE id = new.id; END"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS orders_root_ai")
+    op.drop_index("ix_orders_root_id", table_name="orders")
+    # Không dùng batch (copy bảng) để giữ nguyên các trigger FTS
+    op.drop_column("orders", "root_id")
@@ -0,0 +1,37 @@
+"""bảng purge_jobs (tiến độ job xóa toàn bộ đơn hàng chạy nền)
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0006"
+down_revision: Union[str, None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "purge_jobs",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("status", sa.String(20), nullable=False),
+        sa.Column("max_order_id", sa.Integer()),
+        sa.Column("total", sa.Integer(), nullable=False),
+        sa.Column("deleted_rows", sa.Integer(), nullable=False),
+        sa.Column("deleted_files", sa.Integer(), nullable=False),
+        sa.Column("failed_files", sa.Integer(), nullable=False),
+        sa.Column("error", sa.Text()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("updated_at", sa.DateTime()),
+        sa.Column("finished_at", sa.DateTime()),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("purge_jobs")
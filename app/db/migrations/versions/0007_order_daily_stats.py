@@ -0,0 +1,72 @@
+"""bảng order_daily_stats: rollup số đơn theo ngày (giờ VN), camera, user, trạng thái
+
+Trigger trên orders cập nhật cộng dồn khi tạo / đổi trạng thái / xóa đơn,
+nên mọi đường ghi (CRUD, bulk, purge) đều giữ rollup đúng.
+created_at lưu giờ VN không kèm tzinfo -> date(created_at) là ngày VN.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0007"
+down_revision: Union[str, None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_KEY = "day, camera_id, user_id, status"
+
+
+def _bump(row: str, delta: str) -> str:
+    """Câu upsert cộng delta vào ô rollup của dòng new/old."""
+    return (
+        f"INSERT INTO order_daily_stats({_KEY}, count) "
+        f"SELECT date({row}.created_at), COALESCE({row}.camera_id, 0), COALESCE({row}.user_id, 0), "
+        f"COALESCE({row}.status, ''), {delta} WHERE {row}.created_at IS NOT NULL "
+        f"ON CONFLICT({_KEY}) DO UPDATE SET count = count + excluded.count;"
+    )
+
+
+_CLEANUP = "DELETE FROM order_daily_stats WHERE count <= 0;"
+
+
+def upgrade() -> None:
+    op.create_table(
+        "order_daily_stats",
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("camera_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("status", sa.String(20), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("day", "camera_id", "user_id", "status"),
+    )
+    op.execute(
+        f"INSERT INTO order_daily_stats({_KEY}, count) "
+        "SELECT date(created_at), COALESCE(camera_id, 0), COALESCE(user_id, 0), COALESCE(status, ''), COUNT(*) "
+        "FROM orders WHERE created_at IS NOT NULL GROUP BY 1, 2, 3, 4"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS order_daily_stats_ai AFTER INSERT ON orders BEGIN "
+        f"{_bump('new', '1')} END"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS order_daily_stats_ad AFTER DELETE ON orders BEGIN "
+        f"{_bump('old', '-1')} {_CLEANUP} END"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS order_daily_stats_au "
+        "AFTER UPDATE OF created_at, camera_id, user_id, status ON orders BEGIN "
+        f"{_bump('old', '-1')} {_bump('new', '1')} {_CLEANUP} END"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS order_daily_stats_au")
+    op.execute("DROP TRIGGER IF EXISTS order_daily_stats_ad")
+    op.execute("DROP TRIGGER IF EXISTS order_daily_stats_ai")
+    op.drop_table("order_daily_stats")
@@ -0,0 +1,104 @@
+"""orders.created_at / start_at / closed_at: INTEGER epoch giây (UTC)
+
+Trước đây lưu chuỗi datetime (giờ VN không kèm offset, một số dòng có offset)
+nên lọc khoảng thời gian là so sánh chuỗi. Giờ là số nguyên UTC: date_preset /
+start_date / end_date là range scan số nguyên trên ix_orders_created_at_id và
+ix_orders_status_created_at. Giờ VN chỉ đổi ở tầng API.
+
+Đổi cột tại chỗ (ADD -> backfill -> DROP -> RENAME) thay vì batch copy bảng để
+giữ nguyên trigger FTS / root_id; trigger rollup order_daily_stats được tạo lại
+với ngày VN = date(created_at, 'unixepoch', '+7 hours').
+File archive (ATTACH) được chuyển khi mở kết nối, xem app/db/archive.py.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0008"
+down_revision: Union[str, None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_COLUMNS = ("created_at", "start_at", "closed_at")
+_INDEXES = {
+    "ix_orders_created_at_id": ["created_at", "id"],
+    "ix_orders_status_created_at": ["status", "created_at"],
+}
+_KEY = "day, camera_id, user_id, status"
+_TRIGGERS = ("order_daily_stats_au", "order_daily_stats_ad", "order_daily_stats_ai")
+
+
+def _to_epoch(col: str) -> str:
+    """Chuỗi datetime -> epoch UTC; chuỗi không có offset là giờ VN (UTC+7)."""
+    return (
+        f"CASE WHEN {col} IS NULL OR typeof({col}) = 'integer' THEN {col} "
+        f"WHEN {col} GLOB '*[+-][0-9][0-9]:[0-9][0-9]' OR {col} GLOB '*Z' "
+        f"THEN CAST(strftime('%s', {col}) AS INTEGER) "
+        f"ELSE CAST(strftime('%s', {col}) AS INTEGER) - 25200 END"
+    )
+
+
+def _to_text(col: str) -> str:
+    return f"datetime({col}, 'unixepoch', '+7 hours')"
+
+
+def _create_stat_triggers(day: str) -> None:
+    """Giống migration 0007, chỉ khác biểu thức ngày VN của created_at."""
+    def bump(row: str, delta: str) -> str:
+        return (
+            f"INSERT INTO order_daily_stats({_KEY}, count) "
+            f"SELECT {day.format(row=row)}, COALESCE({row}.camera_id, 0), COALESCE({row}.user_id, 0), "
+            f"COALESCE({row}.status, ''), {delta} WHERE {row}.created_at IS NOT NULL "
+            f"ON CONFLICT({_KEY}) DO UPDATE SET count = count + excluded.count;"
+        )
+
+    cleanup = "DELETE FROM order_daily_stats WHERE count <= 0;"
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS order_daily_stats_ai AFTER INSERT ON orders BEGIN "
+        f"{bump('new', '1')} END"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS order_daily_stats_ad AFTER DELETE ON orders BEGIN "
+        f"{bump('old', '-1')} {cleanup} END"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS order_daily_stats_au "
+        "AFTER UPDATE OF created_at, camera_id, user_id, status ON orders BEGIN "
+        f"{bump('old', '-1')} {bump('new', '1')} {cleanup} END"
+    )
+
+
+def _swap_columns(col_type, convert) -> None:
+    """Thay 3 cột thời gian bằng cột mới cùng tên, giá trị = convert(cột cũ)."""
+    for name in _TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {name}")
+    for name in _INDEXES:
+        op.drop_index(name, table_name="orders")
+    for col in _COLUMNS:
+        op.add_column("orders", sa.Column(f"{col}_new", col_type))
+    op.execute(
+        "UPDATE orders SET " + ", ".join(f"{col}_new = {convert(col)}" for col in _COLUMNS)
+    )
+    for col in _COLUMNS:
+        # Không dùng batch (copy bảng) để giữ nguyên các trigger FTS / root_id
+        op.drop_column("orders", col)
+        op.execute(f"ALTER TABLE orders RENAME COLUMN {col}_new TO {col}")
+    for name, columns in _INDEXES.items():
+        op.create_index(name, "orders", columns)
+
+
+def upgrade() -> None:
+    _swap_columns(sa.Integer(), _to_epoch)
+    # Ngày trong order_daily_stats vẫn là ngày VN như cũ -> không cần tính lại
+    _create_stat_triggers("date({row}.created_at, 'unixepoch', '+7 hours')")
+
+
+def downgrade() -> None:
+    _swap_columns(sa.DateTime(), _to_text)
+    _create_stat_triggers("date({row}.created_at)")
@@ -0,0 +1,44 @@
+"""orders.meta_*: cột ảo json_extract(order_metadata) có index
+
+Các khóa khai báo trong models.ORDER_METADATA_KEYS thành cột VIRTUAL generated
+(không lưu thêm dữ liệu, chỉ index), lọc bằng GET /orders?meta.<key>=...
+CASE json_valid(): dòng cũ có order_metadata không phải JSON cho NULL thay vì lỗi.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0009"
+down_revision: Union[str, None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_KEYS = {
+    "carrier": sa.String(100),
+    "sku_count": sa.Integer(),
+    "station": sa.String(100),
+}
+
+
+def _expr(key: str) -> str:
+    return f"CASE WHEN json_valid(order_metadata) THEN json_extract(order_metadata, '$.{key}') END"
+
+
+def upgrade() -> None:
+    for key, col_type in _KEYS.items():
+        # SQLite chỉ cho ADD COLUMN với cột generated VIRTUAL
+        op.add_column("orders", sa.Column(f"meta_{key}", col_type, sa.Computed(_expr(key), persisted=False)))
+        op.create_index(f"ix_orders_meta_{key}", "orders", [f"meta_{key}"])
+
+
+def downgrade() -> None:
+    for key in reversed(list(_KEYS)):
+        op.drop_index(f"ix_orders_meta_{key}", table_name="orders")
+        # Không dùng batch (copy bảng) để giữ nguyên các trigger
+        op.drop_column("orders", f"meta_{key}")
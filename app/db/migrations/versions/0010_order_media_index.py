@@ -0,0 +1,34 @@
+"""bảng order_media_index (dung lượng file media theo đơn cho quota / retention)
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0010"
+down_revision: Union[str, None] = "0009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "order_media_index",
+        sa.Column("order_id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("video_path", sa.String(255)),
+        sa.Column("video_bytes", sa.Integer(), nullable=False),
+        sa.Column("video_mtime", sa.Integer()),
+        sa.Column("avatar_path", sa.String(255)),
+        sa.Column("avatar_bytes", sa.Integer(), nullable=False),
+        sa.Column("avatar_mtime", sa.Integer()),
+        sa.Column("indexed_at", sa.Integer(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("order_media_index")
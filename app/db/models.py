@@ -1,12 +1,37 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Computed, Integer, String, Text, Date, DateTime, ForeignKey, Index, table, column
 from sqlalchemy.orm import relationship
-from datetime import datetime
-import pytz
+from sqlalchemy.types import TypeDecorator
+from datetime import datetime, timezone
 from app.db.base import Base
+from app.utils.time_utils import VN_TZ, utc_now
 
 # Hàm lấy thời gian hiện tại theo múi giờ Việt Nam
 def get_vn_time():
-    return datetime.now(pytz.timezone('Asia/Ho_Chi_Minh'))
+    return datetime.now(VN_TZ)
+
+
+class UTCEpoch(TypeDecorator):
+    """
+    Thời điểm lưu dạng INTEGER epoch giây (UTC): lọc khoảng thời gian là so sánh
+    số nguyên trên index, không phụ thuộc định dạng chuỗi / offset.
+    - Ghi: datetime aware đổi về UTC; datetime naive được hiểu là giờ VN
+      (quy ước của dữ liệu cũ và tham số start_date / end_date của API).
+    - Đọc: datetime aware UTC; tầng API đổi sang giờ VN (time_utils.to_vn).
+    """
+    impl = Integer
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, int):
+            return value
+        if value.tzinfo is None:
+            value = VN_TZ.localize(value)
+        return int(value.timestamp())
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return datetime.fromtimestamp(value, timezone.utc)
 
 # =========================
 # USER MODEL
@@ -55,6 +80,26 @@ class Camera(Base):
 # =========================
 # ORDER MODEL
 # =========================
+
+# Khóa order_metadata được index: cột ảo meta_<key> = json_extract(...) (migration 0009),
+# lọc bằng GET /orders?meta.<key>=... Thêm khóa = thêm vào đây + migration thêm cột/index.
+ORDER_METADATA_KEYS = {
+    "carrier": String(100),
+    "sku_count": Integer(),
+    "station": String(100),
+}
+
+
+def metadata_column_name(key: str) -> str:
+    return f"meta_{key}"
+
+
+def _metadata_column(key: str) -> Column:
+    # json_valid: dữ liệu cũ không phải JSON không làm hỏng truy vấn / index
+    expr = f"CASE WHEN json_valid(order_metadata) THEN json_extract(order_metadata, '$.{key}') END"
+    return Column(ORDER_METADATA_KEYS[key], Computed(expr, persisted=False), index=True)
+
+
 class Order(Base):
     __tablename__ = "orders"
 
@@ -62,25 +107,44 @@ class Order(Base):
     camera_id = Column(Integer, ForeignKey("cameras.id", ondelete="SET NULL"))
     user_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"))
     parent_id = Column(Integer, ForeignKey("orders.id", ondelete="SET NULL"))
+    # Gốc của cây gia phả (chính nó nếu không có cha) - do CRUDOrder duy trì
+    root_id = Column(Integer, index=True)
     session_id = Column(String(100))
     code = Column(String(100), index=True)
     status = Column(String(20), default="packing")  # packing, closed, error
     
-    # Cập nhật default sang giờ Việt Nam cho tất cả các trường thời gian
-    created_at = Column(DateTime, default=get_vn_time)
-    start_at = Column(DateTime)
-    closed_at = Column(DateTime)
+    # Epoch UTC (xem UTCEpoch, migration 0008); đổi sang giờ VN ở tầng API
+    created_at = Column(UTCEpoch, default=utc_now)
+    start_at = Column(UTCEpoch)
+    closed_at = Column(UTCEpoch)
     
     path_avatar = Column(String(255))
     path_video = Column(String(255))
     order_metadata = Column(Text)
     note = Column(Text)
 
+    # Cột ảo (VIRTUAL, không tốn chỗ) từ order_metadata, có index
+    meta_carrier = _metadata_column("carrier")
+    meta_sku_count = _metadata_column("sku_count")
+    meta_station = _metadata_column("station")
+
     # Relationships
     user = relationship("User", back_populates="orders")
     camera = relationship("Camera", back_populates="orders")
     parent = relationship("Order", remote_side=[id])
+
+    # Index khớp các truy vấn của CRUDOrder.filter_orders (xem migration 0002)
+    __table_args__ = (
+        Index("ix_orders_created_at_id", "created_at", "id"),
+        Index("ix_orders_status_created_at", "status", "created_at"),
+        Index("ix_orders_parent_id", "parent_id"),
+    )
     
+
+# Bảng ảo FTS5 (trigram) index orders.code - tạo bởi migration 0003, đồng bộ bằng trigger.
+# Không thuộc Base.metadata; chỉ dùng để viết truy vấn MATCH.
+orders_code_fts = table("orders_code_fts", column("rowid"), column("code"))
+
     # app/db/models.py (Thêm vào cuối file)
 
 class Setting(Base):
@@ -89,4 +153,80 @@ class Setting(Base):
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     key = Column(String(100), unique=True, nullable=False, index=True)
     value = Column(Text, nullable=False)
-    updated_at = Column(DateTime, default=get_vn_time, onupdate=get_vn_time)
\ No newline at end of file
+    updated_at = Column(DateTime, default=get_vn_time, onupdate=get_vn_time)
+
+
+# =========================
+# CHANGE COUNTER
+# =========================
+class ChangeCounter(Base):
+    """
+    Bộ đếm phiên bản theo bảng, tăng mỗi khi CRUD ghi vào bảng đó (cùng transaction).
+    Lưu trong DB nên đúng cả khi chạy nhiều worker; dùng để vô hiệu hóa cache.
+    """
+    __tablename__ = "change_counters"
+
+    table_name = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+# =========================
+# ORDER DAILY STATS (rollup)
+# =========================
+class OrderDailyStat(Base):
+    """
+    Số đơn theo (ngày tạo giờ VN, camera, user, trạng thái hiện tại).
+    Được trigger trên bảng orders cập nhật cộng dồn (xem migration 0007);
+    camera_id / user_id = 0 nghĩa là không gán.
+    """
+    __tablename__ = "order_daily_stats"
+
+    day = Column(Date, primary_key=True)
+    camera_id = Column(Integer, primary_key=True, default=0)
+    user_id = Column(Integer, primary_key=True, default=0)
+    status = Column(String(20), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+# =========================
+# PURGE JOB (DELETE /orders/all chạy nền)
+# =========================
+class PurgeJob(Base):
+    """
+    Tiến độ job xóa toàn bộ đơn hàng + file media chạy nền.
+    Lưu trong DB để worker nào cũng trả lời được GET /orders/purge-jobs/{id}.
+    """
+    __tablename__ = "purge_jobs"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    status = Column(String(20), nullable=False, default="running")  # running, done, failed
+    max_order_id = Column(Integer)  # Chỉ xóa đơn có id <= giá trị này (đơn tạo sau không bị xóa)
+    total = Column(Integer, nullable=False, default=0)
+    deleted_rows = Column(Integer, nullable=False, default=0)
+    deleted_files = Column(Integer, nullable=False, default=0)
+    failed_files = Column(Integer, nullable=False, default=0)
+    error = Column(Text)
+    created_at = Column(DateTime, default=get_vn_time)
+    updated_at = Column(DateTime, default=get_vn_time, onupdate=get_vn_time)
+    finished_at = Column(DateTime)
+
+
+# =========================
+# ORDER MEDIA INDEX (quota / retention)
+# =========================
+class OrderMediaIndex(Base):
+    """
+    Dung lượng + mtime (epoch) file media của từng đơn, cập nhật tăng dần
+    (chỉ stat lại khi đường dẫn trong orders / archive.orders đổi hoặc đơn chưa đóng), xem
+    app/services/retention_service.py. Đường dẫn = giá trị đã stat.
+    """
+    __tablename__ = "order_media_index"
+
+    order_id = Column(Integer, primary_key=True, autoincrement=False)
+    video_path = Column(String(255))
+    video_bytes = Column(Integer, nullable=False, default=0)
+    video_mtime = Column(Integer)
+    avatar_path = Column(String(255))
+    avatar_bytes = Column(Integer, nullable=False, default=0)
+    avatar_mtime = Column(Integer)
+    indexed_at = Column(Integer, nullable=False)
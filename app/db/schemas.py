@@ -1,8 +1,33 @@
 # Pydantic schemas cho request/response
 # app/db/schemas.py
+import json
 from datetime import datetime
-from typing import Optional
-from pydantic import BaseModel, Field
+from typing import Annotated, List, Optional
+from pydantic import AfterValidator, BaseModel, BeforeValidator, Field
+from app.utils.time_utils import to_vn
+
+def _check_order_metadata(value):
+    """
+    order_metadata phải là JSON object (dict được chuyển thành chuỗi JSON).
+    Kiểm tra 1 lần khi ghi; cột ảo meta_* trong DB đọc thẳng từ chuỗi này.
+    """
+    if value is None:
+        return None
+    if isinstance(value, dict):
+        return json.dumps(value, ensure_ascii=False)
+    try:
+        parsed = json.loads(value)
+    except (TypeError, ValueError):
+        raise ValueError("order_metadata must be valid JSON")
+    if not isinstance(parsed, dict):
+        raise ValueError("order_metadata must be a JSON object")
+    return value
+
+
+OrderMetadata = Annotated[Optional[str], BeforeValidator(_check_order_metadata)]
+
+# Thời điểm epoch UTC đọc từ DB -> giờ VN khi trả ra API (xem models.UTCEpoch)
+VNDateTime = Annotated[datetime, AfterValidator(to_vn)]
 
 # =========================
 # USER SCHEMAS
@@ -29,6 +54,9 @@ class UserUpdate(BaseModel):
 class UserOut(UserBase):
     id: int
     created_at: datetime
+    # Dữ liệu đọc từ DB: không kiểm tra lại ràng buộc của input
+    username: str
+    role: Optional[str] = None
 
     class Config:
         # Cập nhật cho Pydantic v1. Dùng from_attributes=True cho Pydantic v2
@@ -81,6 +109,9 @@ class CameraUpdate(BaseModel):
 class CameraOut(CameraBase):
     id: int
     created_at: datetime
+    # Dữ liệu đọc từ DB: không kiểm tra lại ràng buộc của input
+    device_id: str
+    status: Optional[str] = None
     
     class Config:
         # Pydantic v2 style
@@ -100,7 +131,7 @@ class OrderBase(BaseModel):
     status: str = Field(default="packing", pattern="^(packing|closed|error)$")
     path_avatar: Optional[str] = None
     path_video: Optional[str] = None
-    order_metadata: Optional[str] = None
+    order_metadata: OrderMetadata = None
     note: Optional[str] = None
 
 
@@ -109,19 +140,71 @@ class OrderCreate(OrderBase):
 
 
 class OrderUpdate(BaseModel):
+    parent_id: Optional[int] = None
     status: Optional[str] = Field(None, pattern="^(packing|closed|error)$")
     path_avatar: Optional[str] = None
     path_video: Optional[str] = None
-    order_metadata: Optional[str] = None
+    order_metadata: OrderMetadata = None
     note: Optional[str] = None
     closed_at: Optional[datetime] = None
 
 
+class OrderBulkCreate(BaseModel):
+    items: List[OrderCreate] = Field(..., min_length=1)
+
+
+class OrderTransition(BaseModel):
+    id: int
+    action: str = Field(..., pattern="^(start|close)$")
+    # Chỉ dùng cho action=close (giống POST /orders/{id}/close)
+    status: str = Field(default="closed", pattern="^(closed|error)$")
+
+
+class OrderBulkTransition(BaseModel):
+    items: List[OrderTransition] = Field(..., min_length=1)
+
+
 class OrderOut(OrderBase):
     id: int
-    created_at: datetime
-    start_at: Optional[datetime] = None
-    closed_at: Optional[datetime] = None
+    # Dữ liệu đọc từ DB đã kiểm tra khi ghi -> không parse lại JSON khi serialize
+    order_metadata: Optional[str] = None
+    root_id: Optional[int] = None
+    created_at: Optional[VNDateTime] = None
+    start_at: Optional[VNDateTime] = None
+    closed_at: Optional[VNDateTime] = None
+    # Dữ liệu đọc từ DB: có cả trạng thái "processing" (start_order)
+    status: Optional[str] = None
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class OrderWithParentOut(OrderOut):
+    # Thông tin đơn cha (danh sách phẳng cha + con, xem filter_orders)
+    parent: Optional[OrderOut] = None
+
+
+class VideoUploadCreate(BaseModel):
+    # Upload video nhiều phần (resumable): tổng dung lượng + content-type của file cuối
+    size: int = Field(..., gt=0)
+    content_type: str = Field(..., min_length=1)
+
+# =========================
+# PURGE JOB SCHEMAS
+# =========================
+
+class PurgeJobOut(BaseModel):
+    id: int
+    status: str
+    max_order_id: Optional[int] = None
+    total: int
+    deleted_rows: int
+    deleted_files: int
+    failed_files: int
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
@@ -2,6 +2,7 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
+from app.db import archive
 
 # SỬA LỖI: Đổi settings.db_url thành settings.DB_URL để khớp với config.py
 engine = create_engine(
@@ -10,6 +11,9 @@ engine = create_engine(
     pool_pre_ping=True,
 )
 
+# ATTACH DB lưu trữ đơn cũ (schema "archive") cho mọi connection
+archive.install(engine)
+
 # Tạo session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -14,8 +14,12 @@ from app.core.auth_middleware import AuthMiddleware
 from app.core.router_loader import auto_include_routers
 from app.core.openapi_config import configure_openapi
 from app.core.docs_utils import custom_swagger_ui_html_response # <--- Import hàm vừa tách
+from app.core.security import password_pool
 from app.db.session import get_db
 from app.services.camera_management_service import run_camera_upsert_loop
+from app.services.retention_service import run_retention_loop
+from app.services.thumbnail_service import thumb_pool
+from app.services.upload_service import run_upload_gc_loop
 from scripts.check_db import main as check_db_main
 
 # ==========================================
@@ -63,6 +67,18 @@ async def startup_event():
     )
     camera_thread.start()
 
+    # Dọn các phiên upload video bỏ dở
+    threading.Thread(target=run_upload_gc_loop, daemon=True).start()
+
+    # Giới hạn dung lượng media (chỉ chạy khi có cấu hình quota / tuổi tối đa)
+    if settings.RETENTION_QUOTA_BYTES > 0 or settings.RETENTION_MAX_AGE_DAYS > 0:
+        threading.Thread(target=run_retention_loop, daemon=True).start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    password_pool.shutdown(wait=False)
+    thumb_pool.shutdown(wait=False)
+
 # ==========================================
 # 6. SWAGGER UI (Đã dùng hàm tách biệt)
 # ==========================================
@@ -17,6 +17,7 @@ except ImportError:
 
 # --- IMPORT THỰC TẾ ---
 from app.crud.camera_crud import camera_crud 
+from app.core.event_bus import publish
 from app.db.schemas import CameraOut as CameraResponse 
 
 
@@ -123,6 +124,11 @@ def get_connected_cameras() -> Dict[str, Dict[str, Any]]:
 # 3. Camera Management Service
 # ----------------------------------------------------------------------
 
+def _publish_camera(event_type: str, camera) -> None:
+    """Thông báo camera cắm / rút cho client SSE (GET /events)."""
+    publish(event_type, id=camera.id, device_id=camera.device_id, status=camera.status)
+
+
 class CameraManagementService:
     def __init__(self, db: Session):
         self.db = db
@@ -139,6 +145,7 @@ class CameraManagementService:
         for db_camera in db_cameras_list:
             db_id = str(db_camera.device_id) 
             if db_id in connected_ids:
+                was_active = db_camera.status == "ACTIVE"
                 new_info = connected_cameras[db_id]
                 camera_data = {
                     'name': new_info['name'],
@@ -152,6 +159,8 @@ class CameraManagementService:
                 updated_db_camera = self.camera_crud.upsert(self.db, camera_data)
                 updated_cameras.append(CameraResponse.from_orm(updated_db_camera))
                 connected_ids.remove(db_id)
+                if not was_active:
+                    _publish_camera("camera.connected", updated_db_camera)
             else:
                 if db_camera.status == "ACTIVE":
                     camera_data = {
@@ -161,6 +170,7 @@ class CameraManagementService:
                     }
                     updated_db_camera = self.camera_crud.upsert(self.db, camera_data)
                     updated_cameras.append(CameraResponse.from_orm(updated_db_camera))
+                    _publish_camera("camera.disconnected", updated_db_camera)
                 else:
                     updated_cameras.append(CameraResponse.from_orm(db_camera))
 
@@ -178,6 +188,7 @@ class CameraManagementService:
             }
             new_db_camera = self.camera_crud.upsert(self.db, new_camera_data)
             updated_cameras.append(CameraResponse.from_orm(new_db_camera))
+            _publish_camera("camera.connected", new_db_camera)
             
         return updated_cameras
 
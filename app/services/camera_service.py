@@ -1,4 +1,5 @@
 # app/services/camera_service.py
+from typing import List, Optional
 from sqlalchemy.orm import Session
 from app.crud.camera_crud import camera_crud
 from app.db import schemas
@@ -14,10 +15,13 @@ class CameraService:
     def get_camera(self, cam_id: int):
         return camera_crud.get(self.db, cam_id)
 
-    def get_all_cameras(self, skip: int = 0, limit: int = 100):
+    def get_all_cameras(self, skip: int = 0, limit: int = 100, fields: Optional[List[str]] = None):
         """
         Lấy danh sách tất cả camera, gọi đến tầng CRUD.
+        fields: chỉ lấy các cột này (list dict thay vì ORM object).
         """
+        if fields:
+            return camera_crud.get_multi_columns(self.db, fields, skip=skip, limit=limit)
         return camera_crud.get_all(self.db, skip=skip, limit=limit)
 
     def update_camera(self, cam_id: int, cam_in: schemas.CameraUpdate):
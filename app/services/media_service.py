@@ -0,0 +1,198 @@
+# File media của đơn hàng: upload stream thẳng xuống đĩa, tra đường dẫn để phục vụ Range
+# app/services/media_service.py
+"""
+- Upload: body request (raw, có thể chunked) ghi dần vào file tạm cùng thư mục,
+  mỗi lần ghi tối đa MEDIA_IO_CHUNK_BYTES trong threadpool, xong thì os.replace
+  (atomic) rồi cập nhật Order.path_video / path_avatar. Không giữ cả body trong RAM.
+- File nằm dưới MEDIA_ROOT/orders/<id // 1000>/<id>/; chỉ file dưới MEDIA_ROOT
+  mới được phục vụ qua API (đường dẫn trong DB do client ghi).
+"""
+import mimetypes
+import os
+import stat
+import uuid
+from typing import AsyncIterator, Callable, Dict, NamedTuple, Optional, Tuple
+
+from anyio import to_thread
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.crud.order_crud import order_crud
+from app.db import models, schemas
+from app.db.session import SessionLocal
+
+
+class MediaKind(NamedTuple):
+    field: str               # cột của Order lưu đường dẫn
+    types: Dict[str, str]    # content-type được nhận -> phần mở rộng file
+    max_setting: str         # tên setting giới hạn dung lượng
+
+
+MEDIA_KINDS: Dict[str, MediaKind] = {
+    "video": MediaKind(
+        "path_video",
+        {"video/mp4": ".mp4", "video/webm": ".webm", "video/x-matroska": ".mkv", "video/quicktime": ".mov"},
+        "MEDIA_VIDEO_MAX_BYTES",
+    ),
+    "avatar": MediaKind(
+        "path_avatar",
+        {"image/jpeg": ".jpg", "image/png": ".png", "image/webp": ".webp"},
+        "MEDIA_AVATAR_MAX_BYTES",
+    ),
+}
+
+
+class MediaError(Exception):
+    status_code = 400
+
+
+class UnsupportedMediaType(MediaError):
+    status_code = 415
+
+
+class UploadTooLarge(MediaError):
+    status_code = 413
+
+
+def upload_limit(kind: str) -> int:
+    return getattr(settings, MEDIA_KINDS[kind].max_setting)
+
+
+def media_root() -> str:
+    return os.path.abspath(settings.MEDIA_ROOT)
+
+
+def order_media_dir(order_id: int) -> str:
+    # Chia thư mục theo nghìn đơn để 1 thư mục không có quá nhiều entry
+    return os.path.join(media_root(), "orders", f"{order_id // 1000:04d}", str(order_id))
+
+
+def resolve_media_path(path: str) -> str:
+    """Đường dẫn tuyệt đối (đường dẫn tương đối tính từ cwd, như CRUDOrder._remove_media_file)."""
+    return os.path.abspath(path)
+
+
+def is_managed_path(path: Optional[str]) -> bool:
+    """True nếu path nằm dưới MEDIA_ROOT."""
+    if not path:
+        return False
+    root = media_root()
+    full = resolve_media_path(path)
+    return os.path.commonpath([root, full]) == root and full != root
+
+
+def extension_for(kind: str, content_type: Optional[str]) -> str:
+    mime = (content_type or "").split(";")[0].strip().lower()
+    ext = MEDIA_KINDS[kind].types.get(mime)
+    if ext is None:
+        allowed = ", ".join(MEDIA_KINDS[kind].types)
+        raise UnsupportedMediaType(f"Content-Type must be one of: {allowed}")
+    return ext
+
+
+def _open_part(dest: str):
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    part = f"{dest}.{uuid.uuid4().hex}.part"
+    return part, open(part, "wb")
+
+
+def _commit_part(file, part: str, dest: str) -> None:
+    file.flush()
+    os.fsync(file.fileno())
+    file.close()
+    os.replace(part, dest)
+
+
+def _discard_part(file, part: str) -> None:
+    file.close()
+    try:
+        os.remove(part)
+    except FileNotFoundError:
+        pass
+
+
+async def write_stream(chunks: AsyncIterator[bytes], dest: str, max_bytes: int) -> int:
+    """
+    Ghi stream vào dest (atomic qua file .part). Trả về số byte.
+    Vượt max_bytes -> UploadTooLarge, file tạm bị xóa, dest giữ nguyên.
+    """
+    part, file = await to_thread.run_sync(_open_part, dest)
+    try:
+        total, buf = 0, bytearray()
+        async for chunk in chunks:
+            total += len(chunk)
+            if total > max_bytes:
+                raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+            buf += chunk
+            if len(buf) >= settings.MEDIA_IO_CHUNK_BYTES:
+                await to_thread.run_sync(file.write, buf)
+                buf = bytearray()
+        if buf:
+            await to_thread.run_sync(file.write, buf)
+        await to_thread.run_sync(_commit_part, file, part, dest)
+        return total
+    except BaseException:
+        await to_thread.run_sync(_discard_part, file, part)
+        raise
+
+
+def get_order(
+    order_id: int,
+    include_archive: bool = False,
+    session_factory: Callable[[], Session] = SessionLocal,
+) -> Optional[models.Order]:
+    """include_archive=True: tìm cả đơn đã lưu trữ (chỉ dùng để đọc / phục vụ file)."""
+    db = session_factory()
+    try:
+        if include_archive:
+            return order_crud.get_with_archive(db, id=order_id)
+        return order_crud.get(db, id=order_id)
+    finally:
+        db.close()
+
+
+def set_order_media(
+    order_id: int, kind: str, path: str, session_factory: Callable[[], Session] = SessionLocal
+) -> Optional[models.Order]:
+    """Gán đường dẫn mới cho đơn; xóa file cũ (nếu khác và thuộc MEDIA_ROOT)."""
+    field = MEDIA_KINDS[kind].field
+    db = session_factory()
+    try:
+        order = order_crud.get(db, id=order_id)
+        if order is None:
+            return None
+        old_path = getattr(order, field)
+        order = order_crud.update(db, order, schemas.OrderUpdate(**{field: path}))
+    finally:
+        db.close()
+    if old_path and is_managed_path(old_path) and resolve_media_path(old_path) != resolve_media_path(path):
+        order_crud._remove_media_file(resolve_media_path(old_path))
+    return order
+
+
+async def save_upload(order_id: int, kind: str, content_type: Optional[str], chunks: AsyncIterator[bytes]):
+    """Upload nguyên file (PUT): stream xuống MEDIA_ROOT rồi gán cho đơn."""
+    ext = extension_for(kind, content_type)
+    dest = os.path.join(order_media_dir(order_id), f"{kind}{ext}")
+    size = await write_stream(chunks, dest, upload_limit(kind))
+    order = await to_thread.run_sync(set_order_media, order_id, kind, dest)
+    if order is None:
+        # Đơn bị xóa trong lúc upload
+        await to_thread.run_sync(order_crud._remove_media_file, dest)
+    return order, size
+
+
+def media_file(order: models.Order, kind: str) -> Optional[Tuple[str, str, os.stat_result]]:
+    """(đường dẫn, content-type, stat) của file media của đơn; None nếu không có / không được phục vụ."""
+    path = getattr(order, MEDIA_KINDS[kind].field)
+    if not is_managed_path(path):
+        return None
+    full = resolve_media_path(path)
+    try:
+        st = os.stat(full)
+    except OSError:
+        return None
+    if not stat.S_ISREG(st.st_mode):
+        return None
+    media_type = mimetypes.guess_type(full)[0] or "application/octet-stream"
+    return full, media_type, st
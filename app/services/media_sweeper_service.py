@@ -0,0 +1,179 @@
+# Dọn file media mồ côi: file dưới MEDIA_ROOT không còn đơn nào (kể cả archive) trỏ tới
+# app/services/media_sweeper_service.py
+"""
+- Đường dẫn được tham chiếu: đọc path_video / path_avatar của orders + archive_orders
+  theo lô (keyset id), chỉ giữ đường dẫn dưới MEDIA_ROOT, chuẩn hóa thành đường dẫn
+  tương đối -> set (tra O(1)).
+- Quét cây thư mục bằng os.scandir (generator, không dựng danh sách toàn bộ file),
+  bỏ qua uploads/ (GC riêng), thumbs/ (cache) và .orphans/ (nơi chuyển file mồ côi).
+- File mới hơn SWEEP_MIN_AGE_SECONDS không bị xét (đang ghi / vừa upload chưa gán đơn).
+- Tập tham chiếu chỉ là ảnh chụp lúc bắt đầu quét: trước khi di chuyển / xóa, từng file
+  được kiểm tra lại trong orders + archive_orders (đơn có thể vừa được gán file này,
+  vd. upload nhiều phần complete giữa lúc quét).
+- Tốc độ quét và xóa / di chuyển bị giới hạn (RateLimiter) để không tranh I/O với
+  camera đang ghi hình.
+- action: "report" (dry run, chỉ liệt kê), "move" (chuyển vào .orphans/<thời điểm>/), "delete".
+"""
+import os
+import shutil
+import time
+from typing import Dict, Iterator, Optional, Set, Tuple
+
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db import models
+from app.db.archive import archive_orders
+from app.services.media_service import media_root
+from app.utils.rate_limit import RateLimiter
+
+ACTIONS = ("report", "move", "delete")
+# Thư mục cấp 1 dưới MEDIA_ROOT không thuộc phạm vi dọn
+SKIP_DIRS = {"uploads", "thumbs", ".orphans"}
+
+
+def _relative(path: Optional[str], root: str) -> Optional[str]:
+    """Đường dẫn tương đối so với root nếu path nằm dưới root (path tương đối tính từ cwd)."""
+    if not path:
+        return None
+    full = os.path.abspath(path)
+    if os.path.commonpath([root, full]) != root or full == root:
+        return None
+    return os.path.relpath(full, root)
+
+
+def referenced_paths(db: Session, root: str, batch_size: Optional[int] = None) -> Set[str]:
+    """Tập đường dẫn (tương đối với root) mà orders / archive_orders đang trỏ tới."""
+    batch_size = batch_size or settings.SWEEP_BATCH_SIZE
+    refs: Set[str] = set()
+    for table in (models.Order.__table__, archive_orders):
+        last_id = 0
+        while True:
+            rows = db.execute(
+                select(table.c.id, table.c.path_video, table.c.path_avatar)
+                .where(table.c.id > last_id)
+                .order_by(table.c.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            for row in rows:
+                for path in (row.path_video, row.path_avatar):
+                    rel = _relative(path, root)
+                    if rel is not None:
+                        refs.add(rel)
+            last_id = rows[-1].id
+    return refs
+
+
+def is_referenced(db: Session, full_path: str) -> bool:
+    """
+    Truy vấn lại DB: có đơn nào (orders / archive_orders) trỏ tới file này không.
+    So với dạng tuyệt đối và dạng tương đối tính từ cwd (2 cách đường dẫn được lưu).
+    Cột path_* không có index -> chỉ gọi cho file sắp bị xử lý (đã giới hạn tốc độ).
+    """
+    forms = {full_path, os.path.relpath(full_path, os.getcwd())}
+    # Kết thúc transaction đọc cũ để thấy dữ liệu vừa commit (snapshot WAL)
+    db.rollback()
+    for table in (models.Order.__table__, archive_orders):
+        found = db.execute(
+            select(table.c.id)
+            .where(or_(table.c.path_video.in_(forms), table.c.path_avatar.in_(forms)))
+            .limit(1)
+        ).first()
+        if found is not None:
+            return True
+    return False
+
+
+def iter_media_files(root: str, limiter: Optional[RateLimiter] = None) -> Iterator[Tuple[str, os.DirEntry]]:
+    """(đường dẫn tương đối, DirEntry) của mọi file thường dưới root, quét dần bằng os.scandir."""
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        try:
+            entries = os.scandir(current)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if limiter is not None:
+                    limiter.acquire()
+                if entry.is_symlink():
+                    continue
+                if entry.is_dir():
+                    if current == root and entry.name in SKIP_DIRS:
+                        continue
+                    stack.append(entry.path)
+                elif entry.is_file():
+                    yield os.path.relpath(entry.path, root), entry
+
+
+def sweep(
+    db: Session,
+    action: str = "report",
+    min_age_seconds: Optional[int] = None,
+    scan_rate: Optional[float] = None,
+    action_rate: Optional[float] = None,
+    report_limit: int = 1000,
+    now: Optional[float] = None,
+) -> Dict:
+    """
+    Tìm (và xử lý) file mồ côi dưới MEDIA_ROOT. Trả về báo cáo:
+    scanned, orphans, orphan_bytes, moved, deleted, failed, referenced, items (tối đa report_limit).
+    """
+    if action not in ACTIONS:
+        raise ValueError(f"action must be one of {ACTIONS}")
+    root = media_root()
+    min_age = settings.SWEEP_MIN_AGE_SECONDS if min_age_seconds is None else min_age_seconds
+    now = time.time() if now is None else now
+    scan_limiter = RateLimiter(settings.SWEEP_SCAN_RATE if scan_rate is None else scan_rate)
+    action_limiter = RateLimiter(settings.SWEEP_ACTION_RATE if action_rate is None else action_rate)
+    quarantine = os.path.join(root, ".orphans", time.strftime("%Y%m%d-%H%M%S", time.localtime(now)))
+
+    # Ảnh chụp tập tham chiếu để lọc nhanh; file có thể được gán cho đơn sau thời điểm
+    # này -> kiểm tra lại từng file trước khi xử lý (is_referenced)
+    refs = referenced_paths(db, root)
+    db.rollback()  # không giữ transaction đọc trong suốt lúc quét
+    # referenced: file mồ côi theo ảnh chụp nhưng đã được gán cho đơn lúc kiểm tra lại
+    report = {"action": action, "scanned": 0, "orphans": 0, "orphan_bytes": 0,
+              "moved": 0, "deleted": 0, "failed": 0, "referenced": 0, "items": []}
+
+    for rel, entry in iter_media_files(root, scan_limiter):
+        report["scanned"] += 1
+        if rel in refs:
+            continue
+        try:
+            st = entry.stat(follow_symlinks=False)
+        except OSError:
+            continue
+        if now - st.st_mtime < min_age:
+            continue
+
+        report["orphans"] += 1
+        report["orphan_bytes"] += st.st_size
+        if len(report["items"]) < report_limit:
+            report["items"].append({"path": rel, "bytes": st.st_size, "mtime": int(st.st_mtime)})
+        if action == "report":
+            continue
+
+        action_limiter.acquire()
+        if is_referenced(db, entry.path):
+            report["referenced"] += 1
+            continue
+        try:
+            if action == "move":
+                dest = os.path.join(quarantine, rel)
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                shutil.move(entry.path, dest)
+                report["moved"] += 1
+            else:
+                os.remove(entry.path)
+                report["deleted"] += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"[MediaSweeper] ⚠️ Không thể xử lý file: {entry.path} | {e}")
+            report["failed"] += 1
+    return report
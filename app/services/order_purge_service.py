@@ -0,0 +1,67 @@
+# Job nền xóa toàn bộ đơn hàng + file media (DELETE /orders/all)
+# app/services/order_purge_service.py
+import threading
+from typing import Callable, Tuple
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+from app.crud.order_crud import order_crud
+from app.crud.purge_job_crud import purge_job_crud, PurgeJobSchema
+from app.db import models, schemas
+from app.db.archive import archive_orders
+from app.db.session import SessionLocal
+
+
+def start_purge_job(
+    session_factory: Callable[[], Session] = SessionLocal,
+) -> Tuple[schemas.PurgeJobOut, bool]:
+    """
+    Tạo job purge và chạy trong thread nền.
+    Nếu đã có job đang chạy thì trả về job đó (created=False), không tạo job mới.
+    """
+    db = session_factory()
+    try:
+        active = purge_job_crud.get_active(db)
+        if active:
+            return schemas.PurgeJobOut.model_validate(active), False
+
+        # Gồm cả đơn đã lưu trữ (archive): purge xóa cả 2 bảng
+        max_ids, total = [], 0
+        for table in (models.Order.__table__, archive_orders):
+            table_max, count = db.execute(select(func.max(table.c.id), func.count(table.c.id))).one()
+            if table_max is not None:
+                max_ids.append(table_max)
+            total += count
+        max_id = max(max_ids, default=None)
+        job = purge_job_crud.create(db, PurgeJobSchema(max_order_id=max_id, total=total))
+        job_out = schemas.PurgeJobOut.model_validate(job)
+    finally:
+        db.close()
+
+    threading.Thread(
+        target=run_purge_job,
+        args=(job_out.id, session_factory),
+        name=f"purge-job-{job_out.id}",
+        daemon=True,
+    ).start()
+    return job_out, True
+
+
+def run_purge_job(job_id: int, session_factory: Callable[[], Session] = SessionLocal) -> None:
+    """Xóa theo lô (xem CRUDOrder.purge_chunks), cập nhật tiến độ sau mỗi lô."""
+    db = session_factory()
+    try:
+        job = purge_job_crud.get(db, id=job_id)
+        for chunk in order_crud.purge_chunks(db, max_id=job.max_order_id):
+            purge_job_crud.add_progress(db, job_id, chunk)
+        purge_job_crud.finish(db, job_id, "done")
+        print(f"[PurgeJob] ✅ Job {job_id} hoàn tất")
+    except Exception as e:
+        db.rollback()
+        purge_job_crud.finish(db, job_id, "failed", error=str(e))
+        print(f"[PurgeJob] ❌ Job {job_id} lỗi: {e}")
+    finally:
+        db.close()
+
+
+def get_purge_job(db: Session, job_id: int):
+    return purge_job_crud.get(db, id=job_id)
@@ -0,0 +1,163 @@
+# Giới hạn dung lượng media đơn hàng: quota + tuổi tối đa, xóa video đơn cũ nhất trước
+# app/services/retention_service.py
+"""
+- Index (bảng order_media_index) cập nhật tăng dần: mỗi vòng chỉ stat file của đơn
+  mới / đổi đường dẫn / chưa đóng, không quét cả cây thư mục media. Gồm cả đơn đã
+  lưu trữ (archive_orders): file của chúng vẫn nằm trên đĩa và là video cũ nhất.
+- Đơn closed/error đóng quá RETENTION_MAX_AGE_DAYS -> xóa video.
+- Tổng dung lượng > RETENTION_QUOTA_BYTES -> xóa video đơn đóng sớm nhất cho tới khi
+  dưới quota. Mỗi đơn bị xóa video: path_video = NULL (xem CRUDOrder.clear_video_paths).
+- Chỉ xóa video; avatar (nhỏ) được giữ để lưới đơn vẫn có ảnh.
+"""
+import os
+import time
+from datetime import timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.crud.media_index_crud import ORDER_TABLES, media_index_crud
+from app.crud.order_crud import order_crud
+from app.db.session import SessionLocal
+from app.utils.time_utils import utc_now
+
+
+def _stat(path: Optional[str]) -> Tuple[int, Optional[int]]:
+    """(dung lượng, mtime epoch) của file; (0, None) nếu không có. Đường dẫn tương đối tính từ cwd."""
+    if not path:
+        return 0, None
+    try:
+        st = os.stat(path if os.path.isabs(path) else os.path.join(os.getcwd(), path))
+    except OSError:
+        return 0, None
+    return st.st_size, int(st.st_mtime)
+
+
+def sync_index(db: Session, batch_size: Optional[int] = None) -> int:
+    """Cập nhật order_media_index cho các đơn cần stat lại. Trả về số đơn đã stat."""
+    batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+    media_index_crud.delete_stale(db)
+    indexed = 0
+    for table in ORDER_TABLES:
+        indexed += _sync_table(db, table, batch_size)
+    return indexed
+
+
+def _sync_table(db: Session, table, batch_size: int) -> int:
+    last_id, indexed = 0, 0
+    while True:
+        rows = media_index_crud.pending(db, after_id=last_id, limit=batch_size, table=table)
+        if not rows:
+            break
+        now = int(time.time())
+        entries = []
+        for row in rows:
+            video_bytes, video_mtime = _stat(row.path_video)
+            avatar_bytes, avatar_mtime = _stat(row.path_avatar)
+            entries.append({
+                "order_id": row.id,
+                "video_path": row.path_video,
+                "video_bytes": video_bytes,
+                "video_mtime": video_mtime,
+                "avatar_path": row.path_avatar,
+                "avatar_bytes": avatar_bytes,
+                "avatar_mtime": avatar_mtime,
+                "indexed_at": now,
+            })
+        media_index_crud.upsert_many(db, entries)
+        indexed += len(entries)
+        last_id = rows[-1].id
+    return indexed
+
+
+def _evict(db: Session, rows, skip_ids: List[int], result: Dict) -> int:
+    """
+    Bỏ path_video của các đơn (UPDATE có điều kiện, đã commit) rồi mới xóa file: đơn
+    đổi đường dẫn giữa chừng không được cập nhật nên file (có thể đang dùng) không bị xóa.
+    Trả về số byte giải phóng. Đơn không cập nhật được / xóa file lỗi được thêm vào
+    skip_ids (bỏ qua ở lô sau).
+    """
+    cleared = set(order_crud.clear_video_paths(db, [(row.id, row.video_path) for row in rows]))
+    freed = 0
+    for row in rows:
+        if row.id not in cleared:
+            skip_ids.append(row.id)
+        elif order_crud._remove_media_file(row.video_path) is False:
+            # Đơn đã bỏ đường dẫn: file còn lại là mồ côi (media_sweeper_service dọn sau)
+            result["failed"] += 1
+        else:
+            freed += row.video_bytes
+    result["evicted"] += len(cleared)
+    result["freed_bytes"] += freed
+    return freed
+
+
+def enforce(db: Session, quota_bytes: Optional[int] = None, max_age_days: Optional[int] = None) -> Dict:
+    """Áp dụng tuổi tối đa rồi quota (0 = tắt). Index phải được sync trước."""
+    quota = settings.RETENTION_QUOTA_BYTES if quota_bytes is None else quota_bytes
+    max_age = settings.RETENTION_MAX_AGE_DAYS if max_age_days is None else max_age_days
+    batch_size = settings.RETENTION_BATCH_SIZE
+    result = {"evicted": 0, "freed_bytes": 0, "failed": 0}
+    skip_ids: List[int] = []
+
+    if max_age > 0:
+        closed_before = utc_now() - timedelta(days=max_age)
+        while True:
+            rows = media_index_crud.eviction_candidates(
+                db, batch_size, closed_before=closed_before, exclude_ids=skip_ids
+            )
+            if not rows:
+                break
+            _evict(db, rows, skip_ids, result)
+
+    if quota > 0:
+        used = media_index_crud.usage(db)["total_bytes"]
+        while used > quota:
+            rows = media_index_crud.eviction_candidates(db, batch_size, exclude_ids=skip_ids)
+            if not rows:
+                break
+            # Chỉ lấy đủ số đơn để xuống dưới quota
+            chosen, planned = [], used
+            for row in rows:
+                if planned <= quota:
+                    break
+                chosen.append(row)
+                planned -= row.video_bytes
+            used -= _evict(db, chosen, skip_ids, result)
+
+    return result
+
+
+def get_usage(db: Session) -> Dict:
+    usage = media_index_crud.usage(db)
+    usage["quota_bytes"] = settings.RETENTION_QUOTA_BYTES
+    usage["max_age_days"] = settings.RETENTION_MAX_AGE_DAYS
+    return usage
+
+
+def run_retention_cycle(session_factory: Callable[[], Session] = SessionLocal) -> Dict:
+    db = session_factory()
+    try:
+        indexed = sync_index(db)
+        result = enforce(db)
+        result["indexed"] = indexed
+        return result
+    finally:
+        db.close()
+
+
+def run_retention_loop(interval_seconds: Optional[int] = None) -> None:
+    interval = interval_seconds or settings.RETENTION_INTERVAL_SECONDS
+    print(f"Retention Service started (interval: {interval}s)")
+    while True:
+        try:
+            result = run_retention_cycle()
+            if result["evicted"] or result["failed"]:
+                print(
+                    f"[Retention] 🧹 Đã xóa video {result['evicted']} đơn "
+                    f"({result['freed_bytes']} bytes), lỗi {result['failed']}"
+                )
+        except Exception as e:
+            print(f"ERROR in Retention Loop: {e}")
+        time.sleep(interval)
@@ -0,0 +1,210 @@
+# Ảnh thu nhỏ của avatar đơn hàng (lưới đơn / trang chi tiết)
+# app/services/thumbnail_service.py
+"""
+- Tên file cache = hash(đường dẫn ảnh gốc, mtime_ns, size, kích thước, chất lượng):
+  ảnh gốc đổi -> tên mới, nên file cache không bao giờ đổi nội dung và được
+  phục vụ với Cache-Control immutable (GET /thumbs/<key>.jpg).
+- Resize chạy trong thumb_pool (BoundedProcessPool): lúc upload avatar (nền) hoặc
+  lần đầu có request. Nhiều request cùng 1 ảnh chưa có -> chỉ resize 1 lần.
+- Cache giới hạn THUMB_CACHE_MAX_BYTES: mtime của file = lần dùng cuối, vượt giới hạn
+  thì xóa file dùng lâu nhất tới khi còn 90% (LRU).
+- Không cài Pillow -> available() = False, API trả ảnh gốc.
+"""
+import asyncio
+import hashlib
+import os
+import re
+import threading
+import time
+from typing import Dict, Optional
+
+from anyio import to_thread
+
+from app.core.config import settings
+from app.core.process_pool import BoundedProcessPool, PoolSaturated
+from app.services.media_service import media_root
+from app.utils import thumbnail
+
+THUMB_VERSION = 1
+# Chỉ cập nhật mtime (đánh dấu vừa dùng) khi lần trước đã cách quá khoảng này
+_TOUCH_INTERVAL_SECONDS = 60
+_KEY = re.compile(r"^[0-9a-f]{32}$")
+
+thumb_pool = BoundedProcessPool(
+    name="thumbs",
+    max_workers=settings.THUMB_POOL_WORKERS,
+    max_pending=settings.THUMB_POOL_MAX_PENDING,
+)
+
+
+class ThumbnailError(Exception):
+    """Ảnh gốc không đọc được (hỏng / không phải ảnh)."""
+
+
+def available() -> bool:
+    return thumbnail.Image is not None
+
+
+def thumb_sizes() -> Dict[str, int]:
+    return {"list": settings.THUMB_LIST_PX, "detail": settings.THUMB_DETAIL_PX}
+
+
+def thumb_key(src: str, st: os.stat_result, max_side: int) -> str:
+    raw = f"{src}\0{st.st_mtime_ns}\0{st.st_size}\0{max_side}\0{settings.THUMB_QUALITY}\0{THUMB_VERSION}"
+    return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+def is_valid_key(key: str) -> bool:
+    return bool(_KEY.match(key or ""))
+
+
+class ThumbnailCache:
+    """Thư mục cache <root>/<2 ký tự đầu của key>/<key>.jpg, giới hạn dung lượng, xóa theo LRU."""
+
+    def __init__(self, root: Optional[str] = None, max_bytes: Optional[int] = None):
+        self._root = root
+        self._max_bytes = max_bytes
+        self._bytes: Optional[int] = None  # tính lười bằng 1 lần quét thư mục
+        self._lock = threading.Lock()
+
+    @property
+    def root(self) -> str:
+        return self._root or settings.THUMB_CACHE_DIR or os.path.join(media_root(), "thumbs")
+
+    @property
+    def max_bytes(self) -> int:
+        return settings.THUMB_CACHE_MAX_BYTES if self._max_bytes is None else self._max_bytes
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.jpg")
+
+    def lookup(self, key: str) -> Optional[str]:
+        """Đường dẫn file cache nếu có (đồng thời đánh dấu vừa dùng), ngược lại None."""
+        path = self.path_for(key)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        now = time.time()
+        if now - st.st_mtime > _TOUCH_INTERVAL_SECONDS:
+            try:
+                os.utime(path, (now, now))
+            except FileNotFoundError:
+                return None  # vừa bị evict
+        return path
+
+    def _scan(self):
+        files = []
+        try:
+            buckets = list(os.scandir(self.root))
+        except FileNotFoundError:
+            return files
+        for bucket in buckets:
+            if not bucket.is_dir(follow_symlinks=False):
+                continue
+            try:
+                entries = os.scandir(bucket.path)
+            except FileNotFoundError:
+                continue
+            with entries:
+                for entry in entries:
+                    if entry.name.endswith(".jpg"):
+                        try:
+                            st = entry.stat(follow_symlinks=False)
+                        except FileNotFoundError:
+                            continue
+                        files.append((st.st_mtime, st.st_size, entry.path))
+        return files
+
+    def added(self, nbytes: int) -> None:
+        """Ghi nhận 1 file mới; vượt giới hạn thì evict."""
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = sum(size for _, size, _ in self._scan())
+            else:
+                self._bytes += nbytes
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        # Quét lại (worker khác cũng ghi vào cùng thư mục), xóa file dùng lâu nhất
+        files = sorted(self._scan())
+        total = sum(size for _, size, _ in files)
+        target = int(self.max_bytes * 0.9)
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._bytes = total
+
+    def usage(self) -> int:
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = sum(size for _, size, _ in self._scan())
+            return self._bytes
+
+
+thumb_cache = ThumbnailCache()
+
+# key -> Future đang resize (gộp các request cùng ảnh)
+_inflight: Dict[str, asyncio.Future] = {}
+
+
+async def get_thumbnail(src: str, st: os.stat_result, size: str) -> str:
+    """
+    Key của ảnh thu nhỏ `size` ("list" / "detail") cho ảnh gốc src, tạo nếu chưa có.
+    Ném PoolSaturated khi pool quá tải, ThumbnailError nếu ảnh gốc hỏng.
+    """
+    max_side = thumb_sizes()[size]
+    key = thumb_key(src, st, max_side)
+    if await to_thread.run_sync(thumb_cache.lookup, key) is not None:
+        return key
+
+    future = _inflight.get(key)
+    if future is None:
+        future = asyncio.ensure_future(_render(src, key, max_side))
+        _inflight[key] = future
+        future.add_done_callback(lambda _: _inflight.pop(key, None))
+    await asyncio.shield(future)
+    return key
+
+
+async def _render(src: str, key: str, max_side: int) -> None:
+    try:
+        nbytes = await thumb_pool.run(
+            thumbnail.render_thumbnail, src, thumb_cache.path_for(key), max_side, settings.THUMB_QUALITY
+        )
+    except (OSError, ValueError) as e:
+        # Pillow ném UnidentifiedImageError (lớp con của OSError) khi không đọc được ảnh
+        raise ThumbnailError(str(e))
+    await to_thread.run_sync(thumb_cache.added, nbytes)
+
+
+def prewarm(src: str) -> None:
+    """Tạo sẵn mọi kích thước ngay sau khi upload avatar (nền, bỏ qua nếu pool bận)."""
+    if not available():
+        return
+    try:
+        st = os.stat(src)
+    except OSError:
+        return
+    for max_side in thumb_sizes().values():
+        key = thumb_key(src, st, max_side)
+        if thumb_cache.lookup(key) is not None:
+            continue
+        try:
+            future = thumb_pool.submit(
+                thumbnail.render_thumbnail, src, thumb_cache.path_for(key), max_side, settings.THUMB_QUALITY
+            )
+        except PoolSaturated:
+            return  # để request đầu tiên tạo
+        future.add_done_callback(_prewarm_done)
+
+
+def _prewarm_done(future) -> None:
+    if not future.cancelled() and future.exception() is None:
+        thumb_cache.added(future.result())
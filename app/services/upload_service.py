@@ -0,0 +1,270 @@
+# Upload video nhiều phần, tiếp tục được khi đứt mạng (resumable)
+# app/services/upload_service.py
+"""
+Mỗi phiên upload là 1 thư mục MEDIA_ROOT/uploads/<upload_id>/:
+- info.json: order_id, size, phần mở rộng file cuối, thời điểm tạo
+- data: file đích, tạo sẵn đúng dung lượng (sparse); mỗi phần ghi bằng os.pwrite
+  vào đúng vị trí nên các phần đến không theo thứ tự / song song cũng được
+- ranges/<start>-<end>: file rỗng đánh dấu 1 phần đã ghi xong (sau fsync)
+
+Trạng thái phiên = ghép các khoảng trong ranges/, không có dữ liệu dùng chung
+cần khóa (an toàn cả khi chạy nhiều worker). Đủ byte -> os.replace data sang
+thư mục media của đơn (cùng filesystem, atomic) rồi gán Order.path_video.
+Phiên không nhận thêm phần nào quá MEDIA_UPLOAD_TTL_SECONDS bị xóa (run_upload_gc_loop).
+"""
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from anyio import to_thread
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db import models
+from app.db.session import SessionLocal
+from app.services.media_service import (
+    MediaError,
+    UploadTooLarge,
+    extension_for,
+    get_order,
+    media_root,
+    order_media_dir,
+    set_order_media,
+    upload_limit,
+)
+
+_UPLOAD_ID = re.compile(r"^[0-9a-f]{32}$")
+_CONTENT_RANGE = re.compile(r"^bytes\s+(\d+)-(\d+)/(\d+)$")
+
+
+class UploadNotFound(MediaError):
+    status_code = 404
+
+
+class UploadIncomplete(MediaError):
+    status_code = 409
+
+
+def uploads_root() -> str:
+    return os.path.join(media_root(), "uploads")
+
+
+def _upload_dir(upload_id: str) -> str:
+    if not _UPLOAD_ID.match(upload_id or ""):
+        raise UploadNotFound("Upload not found")
+    return os.path.join(uploads_root(), upload_id)
+
+
+def _load_info(order_id: int, upload_id: str) -> Tuple[str, dict]:
+    path = _upload_dir(upload_id)
+    try:
+        with open(os.path.join(path, "info.json"), "rb") as f:
+            info = json.load(f)
+    except (OSError, ValueError):
+        raise UploadNotFound("Upload not found")
+    if info.get("order_id") != order_id:
+        raise UploadNotFound("Upload not found")
+    return path, info
+
+
+def _received(path: str) -> List[Tuple[int, int]]:
+    """Các khoảng đã nhận (end tính cả), đã sắp xếp và ghép khoảng chồng / liền nhau."""
+    ranges = []
+    try:
+        names = os.listdir(os.path.join(path, "ranges"))
+    except FileNotFoundError:
+        raise UploadNotFound("Upload not found")
+    for name in names:
+        start, _, end = name.partition("-")
+        if start.isdigit() and end.isdigit():
+            ranges.append((int(start), int(end)))
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _state(upload_id: str, info: dict, received: List[Tuple[int, int]]) -> Dict:
+    size = info["size"]
+    # offset: số byte liên tục từ đầu file đã nhận (client gửi tiếp từ đây)
+    offset = received[0][1] + 1 if received and received[0][0] == 0 else 0
+    return {
+        "upload_id": upload_id,
+        "order_id": info["order_id"],
+        "size": size,
+        "offset": offset,
+        "received": [[start, end] for start, end in received],
+        "complete": received == [(0, size - 1)],
+    }
+
+
+def create_upload(
+    order_id: int, size: int, content_type: str, session_factory: Callable[[], Session] = SessionLocal
+) -> Optional[Dict]:
+    """Tạo phiên upload; None nếu đơn không tồn tại."""
+    ext = extension_for("video", content_type)
+    limit = upload_limit("video")
+    if size > limit:
+        raise UploadTooLarge(f"Upload exceeds {limit} bytes")
+    if get_order(order_id, session_factory=session_factory) is None:
+        return None
+
+    upload_id = uuid.uuid4().hex
+    path = os.path.join(uploads_root(), upload_id)
+    os.makedirs(os.path.join(path, "ranges"))
+    with open(os.path.join(path, "data"), "wb") as f:
+        f.truncate(size)
+    info = {"order_id": order_id, "size": size, "ext": ext, "created_at": int(time.time())}
+    # info.json ghi sau cùng: phiên chỉ "tồn tại" khi đã tạo đủ file
+    with open(os.path.join(path, "info.json"), "w") as f:
+        json.dump(info, f)
+    return _state(upload_id, info, [])
+
+
+def get_upload(order_id: int, upload_id: str) -> Dict:
+    path, info = _load_info(order_id, upload_id)
+    return _state(upload_id, info, _received(path))
+
+
+def parse_content_range(header: Optional[str], size: int) -> Tuple[int, int]:
+    """'bytes a-b/size' -> (a, b). Tổng phải khớp dung lượng khai báo khi tạo phiên."""
+    match = _CONTENT_RANGE.match((header or "").strip())
+    if not match:
+        raise MediaError("Content-Range must be 'bytes <start>-<end>/<size>'")
+    start, end, total = (int(g) for g in match.groups())
+    if total != size or start > end or end >= size:
+        raise MediaError(f"Content-Range out of bounds for upload of {size} bytes")
+    return start, end
+
+
+async def write_chunk(
+    order_id: int, upload_id: str, content_range: Optional[str], chunks: AsyncIterator[bytes]
+) -> Dict:
+    """
+    Ghi 1 phần vào đúng vị trí của file data. Body phải đúng bằng độ dài khoảng,
+    nếu không phần đó không được đánh dấu (client gửi lại). Gửi lại phần đã có là vô hại.
+    """
+    path, info = await to_thread.run_sync(_load_info, order_id, upload_id)
+    start, end = parse_content_range(content_range, info["size"])
+    expected = end - start + 1
+
+    try:
+        fd = await to_thread.run_sync(os.open, os.path.join(path, "data"), os.O_WRONLY)
+    except FileNotFoundError:
+        raise UploadNotFound("Upload not found")
+    try:
+        offset, buf = start, bytearray()
+        async for chunk in chunks:
+            if offset - start + len(buf) + len(chunk) > expected:
+                raise MediaError("Body is longer than Content-Range")
+            buf += chunk
+            if len(buf) >= settings.MEDIA_IO_CHUNK_BYTES:
+                offset += await to_thread.run_sync(os.pwrite, fd, buf, offset)
+                buf = bytearray()
+        if buf:
+            offset += await to_thread.run_sync(os.pwrite, fd, buf, offset)
+        if offset - start != expected:
+            raise MediaError("Body is shorter than Content-Range")
+        await to_thread.run_sync(os.fsync, fd)
+    finally:
+        os.close(fd)
+    await to_thread.run_sync(_mark_received, path, start, end)
+    return await to_thread.run_sync(get_upload, order_id, upload_id)
+
+
+def _mark_received(path: str, start: int, end: int) -> None:
+    ranges = os.path.join(path, "ranges")
+    try:
+        open(os.path.join(ranges, f"{start}-{end}"), "wb").close()
+        # mtime của ranges/ = lần hoạt động cuối của phiên (xem purge_stale_uploads)
+        os.utime(ranges)
+    except FileNotFoundError:
+        raise UploadNotFound("Upload not found")
+
+
+def complete_upload(
+    order_id: int, upload_id: str, session_factory: Callable[[], Session] = SessionLocal
+) -> Optional[models.Order]:
+    """Đủ byte -> chuyển file vào thư mục media của đơn, gán path_video, xóa phiên."""
+    path, info = _load_info(order_id, upload_id)
+    state = _state(upload_id, info, _received(path))
+    if not state["complete"]:
+        raise UploadIncomplete(f"Upload incomplete: {state['offset']}/{state['size']} bytes from start")
+
+    dest = os.path.join(order_media_dir(order_id), f"video{info['ext']}")
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    data = os.path.join(path, "data")
+    try:
+        # mtime = lúc gán cho đơn, không phải lúc nhận phần cuối (có thể cách hàng giờ):
+        # media_sweeper_service coi file mới hơn SWEEP_MIN_AGE_SECONDS là đang dùng.
+        # Đặt trước os.replace để file không lúc nào xuất hiện ở dest với mtime cũ.
+        os.utime(data)
+        os.replace(data, dest)
+    except FileNotFoundError:
+        # Request complete khác đã chuyển file trước
+        raise UploadNotFound("Upload not found")
+    shutil.rmtree(path, ignore_errors=True)
+    order = set_order_media(order_id, "video", dest, session_factory)
+    if order is None:
+        # Đơn bị xóa trong lúc upload
+        try:
+            os.remove(dest)
+        except OSError:
+            pass
+    return order
+
+
+def abort_upload(order_id: int, upload_id: str) -> None:
+    path, _ = _load_info(order_id, upload_id)
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def _last_activity(entry: os.DirEntry) -> float:
+    try:
+        return os.stat(os.path.join(entry.path, "ranges")).st_mtime
+    except OSError:
+        # Phiên tạo dở (chưa có ranges/) -> tính theo thư mục phiên
+        return entry.stat().st_mtime
+
+
+def purge_stale_uploads(max_age_seconds: Optional[int] = None, now: Optional[float] = None) -> int:
+    """Xóa các phiên upload bị bỏ dở. Trả về số phiên đã xóa."""
+    max_age = settings.MEDIA_UPLOAD_TTL_SECONDS if max_age_seconds is None else max_age_seconds
+    cutoff = (now if now is not None else time.time()) - max_age
+    removed = 0
+    try:
+        entries = os.scandir(uploads_root())
+    except FileNotFoundError:
+        return 0
+    with entries:
+        for entry in entries:
+            if not entry.is_dir(follow_symlinks=False) or not _UPLOAD_ID.match(entry.name):
+                continue
+            try:
+                stale = _last_activity(entry) < cutoff
+            except OSError:
+                continue
+            if stale:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed += 1
+    return removed
+
+
+def run_upload_gc_loop(interval_seconds: Optional[int] = None) -> None:
+    interval = interval_seconds or settings.MEDIA_UPLOAD_GC_INTERVAL_SECONDS
+    print(f"Upload GC started (interval: {interval}s)")
+    while True:
+        try:
+            removed = purge_stale_uploads()
+            if removed:
+                print(f"[UploadGC] 🧹 Đã xóa {removed} phiên upload bỏ dở")
+        except Exception as e:
+            print(f"ERROR in Upload GC Loop: {e}")
+        time.sleep(interval)
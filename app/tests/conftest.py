@@ -1 +1,44 @@
 # Cấu hình test chung 
+# app/tests/conftest.py
+import os
+import tempfile
+import pytest
+
+# Mặc định dùng SQLite tạm cho test (phải đặt trước khi import app.*)
+_TEST_DIR = tempfile.mkdtemp(prefix="adocv1-test-")
+os.environ.setdefault("DB_URL", f"sqlite:///{os.path.join(_TEST_DIR, 'test.db')}")
+os.environ.setdefault("JWT_SECRET", "test-secret")
+os.environ.setdefault("MEDIA_ROOT", os.path.join(_TEST_DIR, "media"))
+
+from app.db.base import Base  # noqa: E402
+from app.db import models  # noqa: E402,F401
+from app.db.archive import archive_orders  # noqa: E402
+from app.db.migrate import upgrade_head  # noqa: E402
+from app.db.session import SessionLocal  # noqa: E402
+from app.core.principal_cache import clear_principal_cache  # noqa: E402
+from app.crud.order_crud import _count_cache  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _create_schema():
+    # Schema tạo bằng chính chuỗi migration Alembic như môi trường thật
+    upgrade_head()
+    yield
+
+
+@pytest.fixture
+def db():
+    """Session DB cho mỗi test, dọn sạch dữ liệu sau khi test xong."""
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        for table in reversed(Base.metadata.sorted_tables):
+            session.execute(table.delete())
+        session.execute(archive_orders.delete())
+        session.commit()
+        session.close()
+        # Dữ liệu bị xóa ngoài CRUD (không tăng change_counters) -> dọn luôn cache in-process
+        _count_cache.clear()
+        clear_principal_cache()
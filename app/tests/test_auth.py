@@ -14,3 +14,232 @@ def test_root_endpoint():
     response = client.get("/")
     assert response.status_code == 200
     assert response.json()["mes"] == "AD-OCV1 is running"
+
+
+# --- Principal cache ---
+from fastapi import Depends, FastAPI
+from sqlalchemy import event
+from app.api import deps
+from app.core.auth_middleware import AuthMiddleware
+from app.core.config import settings
+from app.core.principal_cache import Principal, principal_cache, get_principal, load_principal
+from app.crud.base import bump_table_version, get_table_version
+from app.core.security import create_access_token
+from app.crud.user_crud import user_crud
+from app.db import schemas
+from app.db.session import engine
+
+
+def _make_user(db, username="cache_user"):
+    return user_crud.create(
+        db, schemas.UserCreate(username=username, password="secret123")
+    )
+
+
+def test_principal_cache_hit_skips_loader(db):
+    principal_cache.clear()
+    user = _make_user(db)
+    calls = []
+
+    def loader(name):
+        calls.append(name)
+        return user_crud.get_by_username(db, name)
+
+    version = lambda: get_table_version(db, "users")  # noqa: E731
+    assert get_principal(user.username, loader, version).id == user.id
+    assert get_principal(user.username, loader, version).id == user.id
+    assert calls == [user.username]
+
+
+def test_principal_cache_invalidated_on_deactivate(db):
+    principal_cache.clear()
+    user = _make_user(db)
+    token = create_access_token(subject=user.username)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    before = principal_cache.stats()
+    assert client.get("/cameras", headers=headers).status_code == 200
+    assert client.get("/cameras", headers=headers).status_code == 200
+    after = principal_cache.stats()
+    assert after["misses"] - before["misses"] == 1
+    assert after["hits"] - before["hits"] == 1
+
+    user_crud.deactivate(db, user_id=user.id)
+    assert client.get("/cameras", headers=headers).status_code == 401
+
+
+def test_principal_cache_sees_writes_from_other_workers(db, monkeypatch):
+    principal_cache.clear()
+    user = _make_user(db, username="worker_user")
+    token = create_access_token(subject=user.username)
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/cameras", headers=headers).status_code == 200
+
+    # Worker khác khóa user: chỉ có DB + change_counters thay đổi, cache của process này còn nguyên
+    user.is_active = 0
+    bump_table_version(db, "users")
+    db.commit()
+    assert principal_cache.get(user.username) is not None
+    # Trong khoảng PRINCIPAL_VERSION_CHECK_SECONDS vẫn dùng bản cache, sau đó thấy thay đổi
+    assert client.get("/cameras", headers=headers).status_code == 200
+    monkeypatch.setattr(settings, "PRINCIPAL_VERSION_CHECK_SECONDS", 0)
+    assert client.get("/cameras", headers=headers).status_code == 401
+
+
+def test_principal_cache_hit_runs_no_sql(db, monkeypatch):
+    principal_cache.clear()
+    monkeypatch.setattr(settings, "PRINCIPAL_VERSION_CHECK_SECONDS", 3600)
+    user = _make_user(db, username="warm_user")
+    headers = {"Authorization": f"Bearer {create_access_token(subject=user.username)}"}
+    # /auth/me chỉ dùng current_user từ middleware
+    assert client.get("/auth/me", headers=headers).status_code == 200
+
+    statements = []
+
+    def _count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", _count)
+    try:
+        for _ in range(5):
+            assert client.get("/auth/me", headers=headers).status_code == 200
+    finally:
+        event.remove(engine, "before_cursor_execute", _count)
+    assert statements == []
+
+
+def test_principal_cache_skips_user_changed_while_loading(db):
+    principal_cache.clear()
+    user = _make_user(db, username="race_user")
+    version = lambda: get_table_version(db, "users")  # noqa: E731
+
+    def loader(name):
+        loaded = user_crud.get_by_username(db, name)
+        snapshot = Principal.from_user(loaded)
+        user_crud.deactivate(db, user_id=user.id)  # commit chen giữa load và cache.set
+        return snapshot
+
+    principal = load_principal(user.username, loader, version)
+    assert principal.is_active == 1
+    assert principal_cache.get(user.username) is None
+
+
+def test_principal_cache_holds_immutable_snapshot_and_drops_removed_user(db):
+    principal_cache.clear()
+    user = _make_user(db, username="snap_user")
+    version = lambda: get_table_version(db, "users")  # noqa: E731
+    principal = get_principal(user.username, lambda name: user_crud.get_by_username(db, name), version)
+    assert isinstance(principal, Principal)
+    with pytest.raises(Exception):
+        principal.role = "admin"
+
+    user_crud.remove(db, id=user.id)
+    assert principal_cache.get(user.username) is None
+    assert get_principal(user.username, lambda name: user_crud.get_by_username(db, name), version) is None
+
+
+
+def test_middleware_passes_user_to_get_current_user(db, monkeypatch):
+    principal_cache.clear()
+    user = _make_user(db, username="scope_user")
+    token = create_access_token(subject=user.username)
+    load_principal(user.username, lambda name: user, lambda: get_table_version(db, "users"))
+
+    # deps.get_current_user phải dùng user trong request.state, không query lại DB
+    def _fail(*args, **kwargs):
+        raise AssertionError("get_current_user không được query lại user")
+
+    monkeypatch.setattr(deps.user_crud, "get_by_username", _fail)
+
+    mini = FastAPI()
+    mini.add_middleware(AuthMiddleware)
+
+    @mini.get("/whoami")
+    def whoami(current_user=Depends(deps.get_current_user)):
+        return {"username": current_user.username}
+
+    resp = TestClient(mini).get("/whoami", headers={"Authorization": f"Bearer {token}"})
+    assert resp.status_code == 200
+    assert resp.json() == {"username": "scope_user"}
+
+
+# --- Login: argon2 trong password_pool ---
+from passlib.context import CryptContext
+from app.core.config import settings
+from app.core.security import password_pool
+
+
+def test_login_rehashes_outdated_argon2_params(db):
+    user = _make_user(db, username="rehash_user")
+    weak = CryptContext(schemes=["argon2"], argon2__rounds=1, argon2__memory_cost=1024)
+    user_crud.update_password_hash(db, user, weak.hash("secret123"))
+
+    resp = client.post(
+        "/api/login", data={"username": "rehash_user", "password": "secret123"}
+    )
+    assert resp.status_code == 200
+    assert "access_token" in resp.json()
+
+    db.refresh(user)
+    assert "t=1" not in user.password_hash
+    assert f"m={settings.ARGON2_MEMORY_COST}" in user.password_hash
+
+
+def test_login_rejected_with_503_when_pool_saturated(db, monkeypatch):
+    _make_user(db, username="busy_user")
+    monkeypatch.setattr(password_pool, "max_pending", 0)
+
+    resp = client.post(
+        "/api/login", data={"username": "busy_user", "password": "secret123"}
+    )
+    assert resp.status_code == 503
+    assert resp.headers["retry-after"] == "1"
+
+
+# --- Verified-JWT cache ---
+from app.core import security
+from app.utils.lru_cache import TTLCache
+
+
+def test_decode_access_token_uses_verified_cache(monkeypatch):
+    monkeypatch.setattr(security, "_verified_tokens", TTLCache(maxsize=8))
+    token = create_access_token(subject="jwt_user")
+
+    assert security.decode_access_token(token)["sub"] == "jwt_user"
+    assert security.decode_access_token(token)["sub"] == "jwt_user"
+    stats = security._verified_tokens.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+    # Token sửa chữ ký không bao giờ khớp cache
+    # (ghép chữ ký của token khác: sửa vài ký tự cuối có thể chỉ đổi bit padding base64)
+    other_signature = create_access_token(subject="other_user").rsplit(".", 1)[1]
+    assert security.decode_access_token(token.rsplit(".", 1)[0] + "." + other_signature) is None
+
+
+def test_verified_cache_disabled_is_noop(monkeypatch):
+    monkeypatch.setattr(security, "_verified_tokens", TTLCache(maxsize=0))
+    token = create_access_token(subject="jwt_user")
+    assert security.decode_access_token(token)["sub"] == "jwt_user"
+    assert len(security._verified_tokens) == 0
+
+
+def test_ttl_cache_entry_expires_and_lru_evicts():
+    now = [0.0]
+    cache = TTLCache(maxsize=2, ttl=60, timer=lambda: now[0])
+    cache.set("a", 1, ttl=10)
+    cache.set("b", 2)
+    now[0] = 11
+    assert cache.get("a") is None  # hết hạn theo TTL riêng (exp)
+    cache.set("c", 3)
+    cache.get("b")
+    cache.set("d", 4)  # vượt maxsize -> bỏ entry ít dùng nhất ("c")
+    assert cache.get("c") is None
+    assert cache.get("b") == 2 and cache.get("d") == 4
+
+
+def test_user_endpoints_never_return_password_hash(db):
+    user = _make_user(db, username="serialize_user")
+    headers = {"Authorization": f"Bearer {create_access_token(subject=user.username)}"}
+    data = client.get(f"/users/{user.id}", headers=headers).json()["data"]
+    assert data["username"] == "serialize_user"
+    assert "password_hash" not in data
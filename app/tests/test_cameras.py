@@ -1 +1,66 @@
 # Test CRUD camera 
+# app/tests/test_cameras.py
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core.security import create_access_token
+from app.crud.base import get_table_version
+from app.crud.camera_crud import camera_crud
+from app.crud.setting_crud import setting_crud
+from app.db import models
+
+client = TestClient(app)
+
+
+def _camera_data(**overrides):
+    data = {"name": "Cam 0", "unique_id": "U0", "device_id": "/dev/video0", "status": "ACTIVE", "os_index": 0}
+    data.update(overrides)
+    return data
+
+
+def test_camera_writes_bump_version_only_on_change(db):
+    cam = camera_crud.upsert(db, _camera_data())
+    version = get_table_version(db, "cameras")
+    # Vòng quét gửi lại đúng dữ liệu cũ -> không đổi phiên bản
+    camera_crud.upsert(db, _camera_data())
+    assert get_table_version(db, "cameras") == version
+
+    camera_crud.disconnect(db, cam.id)
+    assert get_table_version(db, "cameras") == version + 1
+    camera_crud.delete_by_id(db, cam.id)
+    assert get_table_version(db, "cameras") == version + 2
+
+
+def test_cameras_etag(db):
+    cam = camera_crud.upsert(db, _camera_data())
+    etag = client.get("/cameras").headers["ETag"]
+    assert client.get("/cameras", headers={"If-None-Match": etag}).status_code == 304
+    detail_etag = client.get(f"/cameras/{cam.id}").headers["ETag"]
+
+    camera_crud.connect(db, cam.id)
+    assert client.get("/cameras", headers={"If-None-Match": etag}).status_code == 200
+    assert client.get(f"/cameras/{cam.id}", headers={"If-None-Match": detail_etag}).status_code == 200
+
+
+def test_settings_etag(db):
+    setting_crud.upsert_by_key(db, "theme", "dark")
+    etag = client.get("/settings").headers["ETag"]
+    assert client.get("/settings", headers={"If-None-Match": f'"x", {etag}'}).status_code == 304
+
+    # sync cùng giá trị -> vẫn 304
+    client.post("/settings/sync", json={"theme": "dark"})
+    assert client.get("/settings", headers={"If-None-Match": etag}).status_code == 304
+    client.post("/settings/sync", json={"theme": "light"})
+    resp = client.get("/settings", headers={"If-None-Match": etag})
+    assert resp.status_code == 200 and resp.json()["data"]["theme"] == "light"
+
+
+def test_cameras_fields_projection(db):
+    db.add(models.Camera(unique_id="cam-u1", device_id="cam-dev-1", name="Cam 1"))
+    db.commit()
+    user = models.User(username="fields_user", password_hash="x")
+    db.add(user)
+    db.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(subject='fields_user')}"}
+    data = client.get("/cameras", params={"fields": "id,name"}, headers=headers).json()["data"]
+    assert [set(c) for c in data] == [{"id", "name"}]
+    assert client.get("/cameras", params={"fields": "nope"}, headers=headers).status_code == 400
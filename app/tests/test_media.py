@@ -0,0 +1,482 @@
+# Test upload / tải file media của đơn
+# app/tests/test_media.py
+import io
+import os
+import time
+from datetime import timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from app.main import app
+from app.core.config import settings
+from app.crud.media_index_crud import media_index_crud
+from app.crud.order_crud import order_crud
+from app.db import models, schemas
+from app.db.archive import archive_orders
+from app.services import (
+    media_service,
+    media_sweeper_service,
+    retention_service,
+    thumbnail_service,
+    upload_service,
+)
+from app.utils.range_response import RangeNotSatisfiable, parse_range
+from app.utils.rate_limit import RateLimiter
+from app.utils.time_utils import utc_now
+
+client = TestClient(app)
+
+VIDEO = bytes(range(256)) * 40  # 10240 byte
+
+
+def _order_with_video(db, code="MEDIA1", body=VIDEO):
+    order = order_crud.create(db, schemas.OrderCreate(code=code))
+    resp = client.put(f"/orders/{order.id}/video", content=body, headers={"Content-Type": "video/mp4"})
+    assert resp.status_code == 200
+    return order, resp.json()["data"]
+
+
+def test_parse_range():
+    assert parse_range(None, 100) is None
+    assert parse_range("bytes=0-9", 100) == (0, 9)
+    assert parse_range("bytes=90-", 100) == (90, 99)
+    assert parse_range("bytes=-10", 100) == (90, 99)
+    assert parse_range("bytes=-500", 100) == (0, 99)
+    assert parse_range("bytes=50-500", 100) == (50, 99)
+    # Nhiều khoảng / sai cú pháp -> trả cả file
+    assert parse_range("bytes=0-1,5-6", 100) is None
+    assert parse_range("items=0-1", 100) is None
+    assert parse_range("bytes=a-b", 100) is None
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range("bytes=100-", 100)
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range("bytes=-0", 100)
+
+
+def test_upload_video_streams_to_media_root(db):
+    order, data = _order_with_video(db)
+    path = data["order"]["path_video"]
+    assert data["size"] == len(VIDEO)
+    assert media_service.is_managed_path(path)
+    with open(path, "rb") as f:
+        assert f.read() == VIDEO
+    # Không còn file tạm .part
+    assert [n for n in os.listdir(os.path.dirname(path)) if n.endswith(".part")] == []
+
+    # Upload lại định dạng khác -> file cũ bị xóa
+    resp = client.put(f"/orders/{order.id}/video", content=b"webm", headers={"Content-Type": "video/webm"})
+    new_path = resp.json()["data"]["order"]["path_video"]
+    assert new_path.endswith(".webm") and not os.path.exists(path)
+
+
+def test_upload_rejects_bad_type_size_and_missing_order(db, monkeypatch):
+    order = order_crud.create(db, schemas.OrderCreate(code="MEDIA2"))
+    url = f"/orders/{order.id}/avatar"
+    assert client.put(url, content=b"x", headers={"Content-Type": "text/plain"}).status_code == 415
+    monkeypatch.setattr(settings, "MEDIA_AVATAR_MAX_BYTES", 4)
+    assert client.put(url, content=b"12345", headers={"Content-Type": "image/png"}).status_code == 413
+    assert client.put("/orders/999999/avatar", content=b"x", headers={"Content-Type": "image/png"}).status_code == 404
+    db.refresh(order)
+    assert order.path_avatar is None
+    assert not os.path.exists(media_service.order_media_dir(order.id)) or os.listdir(
+        media_service.order_media_dir(order.id)
+    ) == []
+
+
+def test_download_video_range(db):
+    order, _ = _order_with_video(db)
+    url = f"/orders/{order.id}/video"
+
+    full = client.get(url)
+    assert full.status_code == 200
+    assert full.content == VIDEO
+    assert full.headers["accept-ranges"] == "bytes"
+    assert full.headers["content-type"] == "video/mp4"
+    etag = full.headers["etag"]
+
+    part = client.get(url, headers={"Range": "bytes=2-5"})
+    assert part.status_code == 206
+    assert part.content == VIDEO[2:6]
+    assert part.headers["content-range"] == f"bytes 2-5/{len(VIDEO)}"
+    assert part.headers["content-length"] == "4"
+
+    tail = client.get(url, headers={"Range": "bytes=-3"})
+    assert tail.status_code == 206 and tail.content == VIDEO[-3:]
+
+    bad = client.get(url, headers={"Range": f"bytes={len(VIDEO)}-"})
+    assert bad.status_code == 416
+    assert bad.headers["content-range"] == f"bytes */{len(VIDEO)}"
+
+    # If-Range khớp -> 206, không khớp (file đã đổi) -> cả file
+    assert client.get(url, headers={"Range": "bytes=0-0", "If-Range": etag}).status_code == 206
+    stale = client.get(url, headers={"Range": "bytes=0-0", "If-Range": '"old"'})
+    assert stale.status_code == 200 and stale.content == VIDEO
+
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    head = client.head(url)
+    assert head.status_code == 200 and head.content == b""
+    assert head.headers["content-length"] == str(len(VIDEO))
+
+
+def test_download_large_range_is_chunked(db, monkeypatch):
+    monkeypatch.setattr(settings, "MEDIA_IO_CHUNK_BYTES", 1000)
+    order, _ = _order_with_video(db)
+    resp = client.get(f"/orders/{order.id}/video", headers={"Range": "bytes=100-5099"})
+    assert resp.status_code == 206
+    assert resp.content == VIDEO[100:5100]
+
+
+def test_download_only_serves_managed_files(db, tmp_path):
+    outside = tmp_path / "secret.mp4"
+    outside.write_bytes(b"secret")
+    order = order_crud.create(db, schemas.OrderCreate(code="MEDIA3", path_video=str(outside)))
+    assert client.get(f"/orders/{order.id}/video").status_code == 404
+    assert client.get(f"/orders/{order.id}/avatar").status_code == 404
+
+
+# --- Upload video nhiều phần (resumable) ---
+def _start_upload(order_id, size=len(VIDEO)):
+    resp = client.post(f"/orders/{order_id}/video/uploads", json={"size": size, "content_type": "video/mp4"})
+    assert resp.status_code == 201
+    return f"/orders/{order_id}/video/uploads/{resp.json()['data']['upload_id']}"
+
+
+def _put_chunk(url, start, end):
+    return client.put(
+        url, content=VIDEO[start:end + 1], headers={"Content-Range": f"bytes {start}-{end}/{len(VIDEO)}"}
+    )
+
+
+def test_resumable_upload_out_of_order(db):
+    order = order_crud.create(db, schemas.OrderCreate(code="UP1"))
+    url = _start_upload(order.id)
+
+    # Phần cuối đến trước: offset (liên tục từ đầu) vẫn là 0
+    state = _put_chunk(url, 6000, len(VIDEO) - 1).json()["data"]
+    assert state["offset"] == 0 and state["received"] == [[6000, len(VIDEO) - 1]]
+    assert client.post(f"{url}/complete").status_code == 409
+
+    _put_chunk(url, 0, 2999)
+    resp = client.get(url)
+    assert resp.headers["Upload-Offset"] == "3000"
+    assert resp.json()["data"]["complete"] is False
+
+    # Gửi lại phần đã có (retry) + phần còn thiếu chồng lấn
+    _put_chunk(url, 0, 2999)
+    state = _put_chunk(url, 2500, 6499).json()["data"]
+    assert state["complete"] is True and state["offset"] == len(VIDEO)
+
+    resp = client.post(f"{url}/complete")
+    assert resp.status_code == 200
+    path = resp.json()["data"]["order"]["path_video"]
+    with open(path, "rb") as f:
+        assert f.read() == VIDEO
+    assert client.get(url).status_code == 404
+    assert client.get(f"/orders/{order.id}/video").content == VIDEO
+
+
+def test_resumable_upload_rejects_bad_chunks(db):
+    order = order_crud.create(db, schemas.OrderCreate(code="UP2"))
+    url = _start_upload(order.id)
+    # Thiếu / sai Content-Range, vượt dung lượng, body không khớp độ dài khoảng
+    assert client.put(url, content=b"abc").status_code == 400
+    assert client.put(url, content=b"abc", headers={"Content-Range": "bytes 0-2/5"}).status_code == 400
+    assert client.put(url, content=b"a", headers={"Content-Range": f"bytes {len(VIDEO)}-{len(VIDEO)}/{len(VIDEO)}"}).status_code == 400
+    assert client.put(url, content=b"ab", headers={"Content-Range": f"bytes 0-9/{len(VIDEO)}"}).status_code == 400
+    assert client.put(url, content=b"a" * 20, headers={"Content-Range": f"bytes 0-9/{len(VIDEO)}"}).status_code == 400
+    assert client.get(url).json()["data"]["received"] == []
+
+    # Phiên của đơn khác / id lạ -> 404
+    other = order_crud.create(db, schemas.OrderCreate(code="UP3"))
+    upload_id = url.rsplit("/", 1)[1]
+    assert client.get(f"/orders/{other.id}/video/uploads/{upload_id}").status_code == 404
+    assert client.get(f"/orders/{order.id}/video/uploads/not-an-id").status_code == 404
+    assert client.post("/orders/999999/video/uploads", json={"size": 10, "content_type": "video/mp4"}).status_code == 404
+    assert client.post(f"/orders/{order.id}/video/uploads", json={"size": 10, "content_type": "text/plain"}).status_code == 415
+
+    assert client.delete(url).status_code == 200
+    assert client.get(url).status_code == 404
+
+
+def test_purge_stale_uploads(db):
+    order = order_crud.create(db, schemas.OrderCreate(code="UP4"))
+    stale_url = _start_upload(order.id)
+    fresh_url = _start_upload(order.id)
+    _put_chunk(fresh_url, 0, 99)
+
+    stale_dir = os.path.join(upload_service.uploads_root(), stale_url.rsplit("/", 1)[1])
+    old = os.stat(stale_dir).st_mtime - 2 * 3600
+    os.utime(os.path.join(stale_dir, "ranges"), (old, old))
+
+    assert upload_service.purge_stale_uploads(max_age_seconds=3600) == 1
+    assert not os.path.exists(stale_dir)
+    assert client.get(stale_url).status_code == 404
+    assert client.get(fresh_url).json()["data"]["offset"] == 100
+
+
+# --- Ảnh thu nhỏ avatar ---
+def _png(width, height):
+    Image = pytest.importorskip("PIL.Image")
+    buf = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 30, 30)).save(buf, "PNG")
+    return buf.getvalue()
+
+
+def _put_avatar(order_id, body, content_type="image/png"):
+    return client.put(f"/orders/{order_id}/avatar", content=body, headers={"Content-Type": content_type})
+
+
+def test_avatar_thumbnails(db):
+    Image = pytest.importorskip("PIL.Image")
+    order = order_crud.create(db, schemas.OrderCreate(code="THUMB1"))
+    assert _put_avatar(order.id, _png(1200, 800)).status_code == 200
+
+    resp = client.get(f"/orders/{order.id}/avatar/list", follow_redirects=False)
+    assert resp.status_code == 307
+    location = resp.headers["location"]
+    assert location.startswith("/thumbs/") and location.endswith(".jpg")
+
+    thumb = client.get(location)
+    assert thumb.status_code == 200
+    assert thumb.headers["content-type"] == "image/jpeg"
+    assert "immutable" in thumb.headers["cache-control"]
+    assert Image.open(io.BytesIO(thumb.content)).size == (160, 107)
+
+    detail = client.get(f"/orders/{order.id}/avatar/detail", follow_redirects=False).headers["location"]
+    assert detail != location
+    assert Image.open(io.BytesIO(client.get(detail).content)).size == (640, 427)
+    # Gọi lại: dùng cache, cùng URL
+    assert client.get(f"/orders/{order.id}/avatar/list", follow_redirects=False).headers["location"] == location
+
+    # Đổi avatar -> key mới
+    _put_avatar(order.id, _png(300, 300))
+    new_location = client.get(f"/orders/{order.id}/avatar/list", follow_redirects=False).headers["location"]
+    assert new_location != location
+
+    assert client.get(f"/orders/{order.id}/avatar/huge").status_code == 422
+    assert client.get("/thumbs/passwd.jpg").status_code == 404
+    assert client.get(f"/thumbs/{'0' * 32}.jpg").status_code == 404
+
+
+def test_avatar_thumbnail_errors(db):
+    pytest.importorskip("PIL.Image")
+    order = order_crud.create(db, schemas.OrderCreate(code="THUMB2"))
+    assert client.get(f"/orders/{order.id}/avatar/list").status_code == 404
+    _put_avatar(order.id, b"not really a png")
+    assert client.get(f"/orders/{order.id}/avatar/list").status_code == 415
+
+
+def test_thumbnail_cache_evicts_least_recently_used(tmp_path):
+    cache = thumbnail_service.ThumbnailCache(root=str(tmp_path), max_bytes=250)
+    keys = [f"{i:032x}" for i in range(3)]
+    for i, key in enumerate(keys):
+        path = cache.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"x" * 100)
+        os.utime(path, (1000 + i, 1000 + i))
+    # Dùng lại ảnh cũ nhất -> thành mới nhất
+    assert cache.lookup(keys[0]) is not None
+
+    cache.added(100)
+    assert cache.lookup(keys[1]) is None
+    assert cache.lookup(keys[0]) is not None and cache.lookup(keys[2]) is not None
+    assert cache.usage() == 200
+
+
+# --- Quota / retention media ---
+def _order_with_file(db, tmp_path, code, size, status="closed", closed_days_ago=1):
+    path = tmp_path / f"{code}.mp4"
+    path.write_bytes(b"v" * size)
+    order = order_crud.create(db, schemas.OrderCreate(code=code, path_video=str(path)))
+    order.status = status
+    order.closed_at = utc_now() - timedelta(days=closed_days_ago) if status != "packing" else None
+    db.commit()
+    return order, path
+
+
+def test_media_index_is_incremental(db, tmp_path, monkeypatch):
+    order, path = _order_with_file(db, tmp_path, "RET1", 100)
+    assert retention_service.sync_index(db) == 1
+    assert client.get("/media/usage").json()["data"]["video_bytes"] == 100
+
+    # Đơn đã đóng, đường dẫn không đổi -> không stat lại
+    stats = []
+    real_stat = retention_service._stat
+    monkeypatch.setattr(retention_service, "_stat", lambda p: stats.append(p) or real_stat(p))
+    assert retention_service.sync_index(db) == 0 and stats == []
+
+    # Đổi đường dẫn -> chỉ stat lại đơn đó
+    new_path = tmp_path / "RET1b.mp4"
+    new_path.write_bytes(b"v" * 250)
+    order_crud.update(db, order, schemas.OrderUpdate(path_video=str(new_path)))
+    assert retention_service.sync_index(db) == 1
+    assert media_index_crud.usage(db)["video_bytes"] == 250
+
+    # Đơn bị xóa -> dòng index bị dọn khi sync (refresh=true)
+    order_crud.remove(db, id=order.id)
+    assert client.get("/media/usage", params={"refresh": "true"}).json()["data"]["total_bytes"] == 0
+
+
+def test_retention_evicts_oldest_closed_first(db, tmp_path):
+    oldest, oldest_path = _order_with_file(db, tmp_path, "RET2", 100, closed_days_ago=30)
+    middle, middle_path = _order_with_file(db, tmp_path, "RET3", 100, closed_days_ago=20)
+    newest, newest_path = _order_with_file(db, tmp_path, "RET4", 100, closed_days_ago=10)
+    packing, packing_path = _order_with_file(db, tmp_path, "RET5", 500, status="packing")
+    retention_service.sync_index(db)
+
+    # Quota: cần giải phóng 150 byte -> 2 đơn đóng sớm nhất, không đụng đơn đang đóng gói
+    result = retention_service.enforce(db, quota_bytes=650, max_age_days=0)
+    assert result == {"evicted": 2, "freed_bytes": 200, "failed": 0}
+    assert not oldest_path.exists() and not middle_path.exists()
+    assert newest_path.exists() and packing_path.exists()
+    db.expire_all()
+    assert db.get(models.Order, oldest.id).path_video is None
+    assert db.get(models.Order, newest.id).path_video == str(newest_path)
+    assert media_index_crud.usage(db)["total_bytes"] == 600
+
+    # Tuổi tối đa 5 ngày -> đơn đóng 10 ngày trước bị xóa video
+    result = retention_service.enforce(db, quota_bytes=0, max_age_days=5)
+    assert result["evicted"] == 1 and not newest_path.exists()
+    assert packing_path.exists()
+
+
+# --- Dọn file media mồ côi ---
+def test_rate_limiter_sleeps_when_over_rate():
+    clock, slept = [0.0], []
+
+    def sleep(seconds):
+        slept.append(seconds)
+        clock[0] += seconds
+
+    limiter = RateLimiter(10, clock=lambda: clock[0], sleep=sleep)
+    for _ in range(30):
+        limiter.acquire()
+    # 10 lần đầu trong burst, 20 lần sau phải chờ ~2 giây
+    assert slept and abs(sum(slept) - 2.0) < 1e-9
+
+
+def test_sweep_orphan_media(db, tmp_path, monkeypatch):
+    # MEDIA_ROOT riêng: file của các test khác (đơn đã bị dọn) đều là mồ côi
+    monkeypatch.setattr(settings, "MEDIA_ROOT", str(tmp_path / "media"))
+    kept, _ = _order_with_video(db, code="SWEEP1")
+    orphan, data = _order_with_video(db, code="SWEEP2")
+    orphan_path = data["order"]["path_video"]
+    order_crud.remove(db, id=orphan.id)  # xóa đơn nhưng file còn trên đĩa
+    stray = os.path.join(media_service.order_media_dir(kept.id), "video.mp4.dead.part")
+    with open(stray, "wb") as f:
+        f.write(b"partial")
+    # Upload đang dở (uploads/) và cache thumbs/ không thuộc phạm vi
+    _start_upload(kept.id)
+    # Đơn trong archive vẫn giữ file của nó
+    archived, _ = _order_with_video(db, code="SWEEP3")
+    db.execute(
+        models.Order.__table__.update().where(models.Order.id == archived.id).values(status="closed", closed_at=1)
+    )
+    db.commit()
+    assert sum(order_crud.archive_chunks(db, older_than=utc_now())) == 1
+
+    future = time.time() + 10 * 3600
+    # Dry run: chỉ báo cáo
+    report = media_sweeper_service.sweep(db, action="report", scan_rate=0, action_rate=0, now=future)
+    assert sorted(item["path"] for item in report["items"]) == sorted(
+        os.path.relpath(p, media_service.media_root()) for p in (orphan_path, stray)
+    )
+    assert report["orphan_bytes"] == len(VIDEO) + len(b"partial")
+    assert os.path.exists(orphan_path) and os.path.exists(stray)
+
+    # File mới hơn min_age không bị xét
+    assert media_sweeper_service.sweep(db, scan_rate=0, action_rate=0)["orphans"] == 0
+
+    report = media_sweeper_service.sweep(db, action="move", scan_rate=0, action_rate=0, now=future)
+    assert report["moved"] == 2 and not os.path.exists(orphan_path)
+    quarantined = os.path.join(media_service.media_root(), ".orphans")
+    assert os.path.isdir(quarantined)
+
+    orphan_again, data = _order_with_video(db, code="SWEEP4")
+    path = data["order"]["path_video"]
+    order_crud.remove(db, id=orphan_again.id)
+    report = media_sweeper_service.sweep(db, action="delete", scan_rate=0, action_rate=0, now=future)
+    assert report["deleted"] == 1 and report["orphans"] == 1 and not os.path.exists(path)
+    assert client.get(f"/orders/{kept.id}/video").content == VIDEO
+
+
+def test_sweep_rechecks_db_before_removing(db, tmp_path, monkeypatch):
+    # Upload nhiều phần complete giữa lúc quét: ảnh chụp tham chiếu đã cũ nhưng file không bị xóa
+    monkeypatch.setattr(settings, "MEDIA_ROOT", str(tmp_path / "media"))
+    order, data = _order_with_video(db, code="SWEEP5")
+    path = data["order"]["path_video"]
+    monkeypatch.setattr(media_sweeper_service, "referenced_paths", lambda db, root: set())
+
+    future = time.time() + 10 * 3600
+    report = media_sweeper_service.sweep(db, action="delete", scan_rate=0, action_rate=0, now=future)
+    assert report["orphans"] == 1 and report["referenced"] == 1 and report["deleted"] == 0
+    assert os.path.exists(path)
+
+
+def test_complete_upload_refreshes_mtime(db):
+    order = order_crud.create(db, schemas.OrderCreate(code="UP5"))
+    url = _start_upload(order.id)
+    _put_chunk(url, 0, len(VIDEO) - 1)
+    # Phần cuối nhận từ lâu: file gán cho đơn vẫn phải "mới" với media sweeper
+    data = os.path.join(upload_service.uploads_root(), url.rsplit("/", 1)[1], "data")
+    old = time.time() - 10 * 3600
+    os.utime(data, (old, old))
+
+    path = client.post(f"{url}/complete").json()["data"]["order"]["path_video"]
+    assert time.time() - os.stat(path).st_mtime < 60
+
+
+def test_archived_order_media_still_served(db):
+    order, _ = _order_with_video(db, code="ARCHMEDIA")
+    order_id = order.id
+    db.execute(
+        models.Order.__table__.update().where(models.Order.id == order_id).values(status="closed", closed_at=1)
+    )
+    db.commit()
+    assert sum(order_crud.archive_chunks(db, older_than=utc_now())) == 1
+
+    assert client.get(f"/orders/{order_id}/video").content == VIDEO
+    # Đơn đã lưu trữ chỉ đọc: không nhận upload mới
+    resp = client.put(f"/orders/{order_id}/video", content=VIDEO, headers={"Content-Type": "video/mp4"})
+    assert resp.status_code == 404
+
+
+def test_retention_keeps_file_of_reassigned_path(db, tmp_path, monkeypatch):
+    order, path = _order_with_file(db, tmp_path, "RET6", 100, closed_days_ago=30)
+    retention_service.sync_index(db)
+    # Đường dẫn đổi sau khi chọn ứng viên (vd. video mới ghi đè cùng tên file khác)
+    real_candidates = media_index_crud.eviction_candidates
+
+    def candidates(*args, **kwargs):
+        rows = real_candidates(*args, **kwargs)
+        if rows:
+            db.execute(
+                models.Order.__table__.update().where(models.Order.id == order.id).values(path_video="other.mp4")
+            )
+            db.commit()
+        return rows
+
+    monkeypatch.setattr(media_index_crud, "eviction_candidates", candidates)
+    result = retention_service.enforce(db, quota_bytes=0, max_age_days=5)
+    assert result["evicted"] == 0 and path.exists()
+
+
+def test_retention_indexes_and_evicts_archived_orders(db, tmp_path):
+    archived, archived_path = _order_with_file(db, tmp_path, "RET7", 100, closed_days_ago=120)
+    archived_id = archived.id
+    recent, recent_path = _order_with_file(db, tmp_path, "RET8", 100, closed_days_ago=1)
+    assert sum(order_crud.archive_chunks(db, older_than=utc_now() - timedelta(days=90))) == 1
+    retention_service.sync_index(db)
+    # Video của đơn đã lưu trữ vẫn được tính vào dung lượng
+    assert media_index_crud.usage(db)["video_bytes"] == 200
+
+    result = retention_service.enforce(db, quota_bytes=150, max_age_days=0)
+    assert result == {"evicted": 1, "freed_bytes": 100, "failed": 0}
+    assert not archived_path.exists() and recent_path.exists()
+    row = db.execute(select(archive_orders.c.path_video).where(archive_orders.c.id == archived_id)).one()
+    assert row.path_video is None
+    # Dòng index của đơn archive không bị coi là mồ côi
+    retention_service.sync_index(db)
+    assert media_index_crud.usage(db)["video_bytes"] == 100
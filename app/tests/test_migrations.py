@@ -0,0 +1,107 @@
+# Test chuỗi migration Alembic + index cho truy vấn order
+# app/tests/test_migrations.py
+import os
+import sqlite3
+from sqlalchemy import create_engine, text
+from sqlalchemy.dialects import sqlite
+
+from app.crud.order_crud import order_crud
+from alembic import command
+from app.db.migrate import alembic_config, upgrade_head, ROOT_DIR
+
+
+def _query_plan(db, stmt) -> str:
+    compiled = stmt.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True})
+    rows = db.execute(text(f"EXPLAIN QUERY PLAN {compiled}")).all()
+    return " | ".join(row[-1] for row in rows)
+
+
+def _list_query(**filters):
+    from sqlalchemy import select
+    from app.db import models
+
+    return (
+        select(models.Order)
+        .where(*order_crud._filter_conditions(**filters))
+        .order_by(models.Order.created_at.desc(), models.Order.id.desc())
+        .limit(100)
+    )
+
+
+def test_date_preset_uses_created_at_index(db):
+    plan = _query_plan(db, _list_query(date_preset="last7days"))
+    assert "USING INDEX ix_orders_created_at_id" in plan
+    assert "USE TEMP B-TREE FOR ORDER BY" not in plan
+
+
+def test_status_and_preset_use_status_created_at_index(db):
+    plan = _query_plan(db, _list_query(status="closed", date_preset="today"))
+    assert "USING INDEX ix_orders_status_created_at" in plan
+
+
+def test_status_count_uses_covering_index(db):
+    from sqlalchemy import func, select
+    from app.db import models
+
+    stmt = select(func.count()).select_from(models.Order).where(
+        *order_crud._filter_conditions(status="packing", date_preset="last15days")
+    )
+    plan = _query_plan(db, stmt)
+    assert "USING COVERING INDEX ix_orders_status_created_at" in plan
+
+
+def test_upgrade_adopts_legacy_init_sql_database(tmp_path):
+    db_file = tmp_path / "legacy.db"
+    conn = sqlite3.connect(db_file)
+    try:
+        conn.executescript(open(os.path.join(ROOT_DIR, "app/db/migrations/init.sql")).read())
+    except sqlite3.OperationalError:
+        pass  # init.sql cũ lỗi cú pháp ở bảng settings (MySQL "ON UPDATE")
+    conn.execute("INSERT INTO orders (code) VALUES ('LEGACY1')")
+    conn.commit()
+    conn.close()
+
+    upgrade_head(f"sqlite:///{db_file}")
+
+    engine = create_engine(f"sqlite:///{db_file}")
+    with engine.connect() as c:
+        indexes = {r[0] for r in c.execute(text("SELECT name FROM sqlite_master WHERE type='index'"))}
+        assert {"ix_orders_created_at_id", "ix_orders_status_created_at", "ix_orders_parent_id"} <= indexes
+        assert c.execute(text("SELECT code FROM orders")).scalar() == "LEGACY1"
+        assert c.execute(text("SELECT count(*) FROM settings")).scalar() == 0
+    engine.dispose()
+
+
+def test_upgrade_converts_order_times_to_utc_epoch(tmp_path):
+    db_file = tmp_path / "epoch.db"
+    cfg = alembic_config(f"sqlite:///{db_file}")
+    command.upgrade(cfg, "0007")
+
+    conn = sqlite3.connect(db_file)
+    # Giờ VN không offset (dữ liệu cũ) và chuỗi có offset
+    conn.execute(
+        "INSERT INTO orders (code, created_at, closed_at) "
+        "VALUES ('OLD1', '2026-01-10 08:00:00.000000', '2026-01-10T02:30:00+00:00')"
+    )
+    conn.commit()
+    conn.close()
+
+    command.upgrade(cfg, "head")
+    conn = sqlite3.connect(db_file)
+    row = conn.execute("SELECT created_at, closed_at, start_at FROM orders").fetchone()
+    stats = conn.execute("SELECT day, count FROM order_daily_stats").fetchall()
+    conn.close()
+    assert row == (1768006800, 1768012200, None)  # 2026-01-10 01:00 / 02:30 UTC
+    assert stats == [("2026-01-10", 1)]
+
+
+def test_children_lookup_uses_parent_id_index(db):
+    from sqlalchemy import select
+    from app.db import models
+
+    # Con trực tiếp (CRUDOrder.remove) và cả nhánh con cháu (_subtree_ids, CTE đệ quy)
+    children = select(models.Order.id).where(models.Order.parent_id == 1)
+    assert "INDEX ix_orders_parent_id (parent_id=?)" in _query_plan(db, children)
+    subtree = _query_plan(db, order_crud._subtree_ids(1))
+    assert "INDEX ix_orders_parent_id (parent_id=?)" in subtree
+    assert "SCAN orders" not in subtree
@@ -1,8 +1,27 @@
 # Test CRUD + filter order 
 # app/tests/test_orders.py
+import asyncio
+import csv as csv_module
+import io
+import json
+import sqlite3
+import time as time_module
+from datetime import date, datetime, timedelta, timezone
+
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import select as sa_select, text as sa_text
+from sqlalchemy.dialects import sqlite as sqlite_dialect
+
 from app.main import app
+from app.core.config import settings
+from app.core.event_bus import EventBus, event_bus, format_sse
+from app.crud.base import bump_table_version, get_table_version
+from app.crud.order_crud import _count_cache, order_crud
+from app.db import models, schemas
+from app.db.archive import archive_orders, attach_archive
+from app.utils.pagination import encode_cursor
+from app.utils.serializers import dump_orders
 
 client = TestClient(app)
 
@@ -12,3 +31,756 @@ def test_list_orders_empty():
     body = response.json()
     assert "data" in body
     assert isinstance(body["data"], list)
+
+
+# --- Keyset (cursor) pagination ---
+def _seed_orders(db, n, **fields):
+    base = datetime(2026, 1, 10, 8, 0, 0)
+    orders = []
+    for i in range(n):
+        # 2 đơn cùng created_at để kiểm tra tie-breaker theo id
+        order = models.Order(code=f"KS{i:03d}", created_at=base + timedelta(minutes=i // 2), **fields)
+        db.add(order)
+        orders.append(order)
+    db.commit()
+    return orders
+
+
+def test_cursor_pagination_walks_all_pages(db):
+    _seed_orders(db, 7)
+    expected = [o.id for o in order_crud.filter_orders(db, limit=100)[0]]
+
+    seen, cursor = [], ""
+    while cursor is not None:
+        resp = client.get("/orders", params={"limit": 3, "cursor": cursor})
+        assert resp.status_code == 200
+        data = resp.json()["data"]
+        assert data["total"] is None  # cursor mode: không đếm nếu không yêu cầu
+        seen += [item["id"] for item in data["items"]]
+        cursor = data["next_cursor"]
+
+    assert seen == expected
+
+
+def test_cursor_pagination_count_and_offset_contract(db):
+    _seed_orders(db, 5)
+    data = client.get("/orders", params={"cursor": "", "limit": 2, "count": "exact"}).json()["data"]
+    assert data["total"] == 5
+
+    # skip/limit giữ nguyên hợp đồng cũ (có total và page)
+    data = client.get("/orders", params={"skip": 2, "limit": 2}).json()["data"]
+    assert data["total"] == 5 and data["page"] == 2 and len(data["items"]) == 2
+
+    assert client.get("/orders", params={"cursor": "not-a-cursor"}).status_code == 400
+
+
+def test_list_orders_validates_skip_and_limit(db):
+    assert client.get("/orders", params={"limit": 0}).status_code == 422
+    assert client.get("/orders", params={"skip": -1}).status_code == 422
+    assert client.get("/orders", params={"limit": settings.MAX_PAGE_SIZE + 1}).status_code == 422
+    assert client.get("/orders", params={"limit": settings.MAX_PAGE_SIZE}).status_code == 200
+
+
+def test_malformed_cursor_returns_400(db):
+    _seed_orders(db, 3)
+    bad = [
+        {"s": "created_at", "d": "desc", "v": None},  # thiếu "i"
+        {"s": "created_at", "d": "desc", "v": "x", "i": 1},  # v không phải thời điểm
+        {"s": "created_at", "d": "desc", "v": {"$dt": 5}, "i": 1},
+        {"s": "created_at", "d": "desc", "v": None, "i": "1"},
+        {"s": "code", "d": "desc", "v": [1], "i": 1},
+    ]
+    for position in bad:
+        params = {"cursor": encode_cursor(position), "sort_by": position["s"]}
+        assert client.get("/orders", params=params).status_code == 400, position
+
+
+# --- Code search (FTS5 trigram) ---
+def _family(db):
+    parent = models.Order(code="SPX-VN-884201")
+    db.add(parent)
+    db.commit()
+    child = models.Order(code="GHN-552190", parent_id=parent.id)
+    other = models.Order(code="LZD-000111")
+    db.add_all([child, other])
+    db.commit()
+    return parent, child, other
+
+
+def _codes(db, **kwargs):
+    items, _ = order_crud.filter_orders(db, limit=100, **kwargs)
+    return sorted(o.code for o in items)
+
+
+def test_code_substring_search_returns_family(db):
+    parent, child, other = _family(db)
+    # Khớp cha -> lấy cả con; khớp con -> lấy cả cha
+    assert _codes(db, code="884201") == ["GHN-552190", "SPX-VN-884201"]
+    assert _codes(db, code="ghn-55") == ["GHN-552190", "SPX-VN-884201"]
+    # Mã ngắn (< 3 ký tự) vẫn tìm được qua LIKE
+    assert _codes(db, code="LZ") == ["LZD-000111"]
+
+
+def test_code_fts_index_follows_updates_and_deletes(db):
+    parent, child, other = _family(db)
+    other.code = "TIKI-777"
+    db.commit()
+    assert _codes(db, code="000111") == []
+    assert _codes(db, code="KI-77") == ["TIKI-777"]
+
+    db.delete(other)
+    db.commit()
+    assert _codes(db, code="TIKI") == []
+
+
+def test_exact_code_match(db):
+    _family(db)
+    assert _codes(db, code="LZD-000111", code_match="exact") == ["LZD-000111"]
+    assert _codes(db, code="LZD-000", code_match="exact") == []
+    resp = client.get("/orders", params={"code": "LZD-000111", "code_match": "exact"})
+    assert [i["code"] for i in resp.json()["data"]["items"]] == ["LZD-000111"]
+
+
+def test_exact_code_count_is_case_sensitive(db):
+    _family(db)
+    params = {"limit": 5, "count": "exact", "code_match": "exact"}
+    assert client.get("/orders", params={**params, "code": "LZD-000111"}).json()["data"]["total"] == 1
+    # Cùng mã khác hoa thường không được dùng lại tổng đã cache
+    assert client.get("/orders", params={**params, "code": "lzd-000111"}).json()["data"]["total"] == 0
+    assert client.get("/orders", params={"limit": 5, "count": "exact", "code": "lzd-000111"}).json()["data"]["total"] == 1
+
+
+def test_code_search_plan_uses_fts_and_indexes(db):
+    stmt = sa_select(models.Order).where(*order_crud._filter_conditions(code="884201"))
+    compiled = stmt.compile(dialect=sqlite_dialect.dialect(), compile_kwargs={"literal_binds": True})
+    plan = " | ".join(r[-1] for r in db.execute(sa_text(f"EXPLAIN QUERY PLAN {compiled}")))
+    assert "orders_code_fts VIRTUAL TABLE" in plan
+    assert "ix_orders_root_id" in plan
+    assert "SCAN orders" not in plan.replace("SCAN orders_code_fts", "")
+
+
+# --- Family index (root_id) ---
+def _tree(db):
+    root = models.Order(code="ROOT-1")
+    db.add(root)
+    db.commit()
+    child = models.Order(code="CHILD-1", parent_id=root.id)
+    db.add(child)
+    db.commit()
+    grandchild = models.Order(code="GRAND-1", parent_id=child.id)
+    db.add(grandchild)
+    db.commit()
+    return root, child, grandchild
+
+
+def test_family_any_depth(db):
+    root, child, grandchild = _tree(db)
+    assert {root.root_id, child.root_id, grandchild.root_id} == {root.id}
+    for node in (root, child, grandchild):
+        assert [o.id for o in order_crud.get_family(db, node.id)] == [root.id, child.id, grandchild.id]
+    # Tìm theo mã cháu vẫn lấy được cả ông
+    assert _codes(db, code="GRAND") == ["CHILD-1", "GRAND-1", "ROOT-1"]
+
+
+def test_family_reparent_and_delete(db):
+    root, child, grandchild = _tree(db)
+    other = models.Order(code="OTHER-1")
+    db.add(other)
+    db.commit()
+
+    # Chuyển nhánh child sang other: cả cháu cũng đổi gốc
+    order_crud.update(db, child, schemas.OrderUpdate(parent_id=other.id))
+    db.refresh(grandchild)
+    assert grandchild.root_id == other.id
+    assert [o.id for o in order_crud.get_family(db, root.id)] == [root.id]
+
+    with pytest.raises(ValueError):
+        order_crud.update(db, other, schemas.OrderUpdate(parent_id=grandchild.id))
+
+    # Xoá child: grandchild thành gốc mới
+    order_crud.remove(db, id=child.id)
+    db.refresh(grandchild)
+    assert (grandchild.parent_id, grandchild.root_id) == (None, grandchild.id)
+
+
+def test_family_endpoint(db):
+    root, child, grandchild = _tree(db)
+    resp = client.get(f"/orders/{grandchild.id}/family")
+    assert resp.status_code == 200
+    data = resp.json()["data"]
+    assert data["root_id"] == root.id
+    assert [i["code"] for i in data["items"]] == ["ROOT-1", "CHILD-1", "GRAND-1"]
+    assert data["tree"]["children"][0]["children"][0]["code"] == "GRAND-1"
+    assert client.get("/orders/999999/family").status_code == 404
+
+
+# --- Streaming export ---
+def test_export_ndjson_streams_filtered_rows(db):
+    _seed_orders(db, 7, status="closed")
+    _seed_orders(db, 3, status="packing")
+    resp = client.get("/orders/export", params={"status": "closed", "sort_dir": "asc"})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in resp.text.splitlines()]
+    assert len(rows) == 7
+    assert {r["status"] for r in rows} == {"closed"}
+    assert [r["id"] for r in rows] == sorted(r["id"] for r in rows)
+    assert rows[0]["created_at"] == "2026-01-10T08:00:00"
+    assert "parent" not in rows[0]
+
+
+def test_export_csv(db):
+    _family(db)
+    resp = client.get("/orders/export", params={"format": "csv", "code": "884201"})
+    assert resp.status_code == 200
+    rows = list(csv_module.DictReader(io.StringIO(resp.text)))
+    assert sorted(r["code"] for r in rows) == ["GHN-552190", "SPX-VN-884201"]
+
+
+def test_export_fetches_in_batches(db):
+    _seed_orders(db, 25)
+    batches = list(order_crud.iter_export_batches(db, batch_size=10))
+    assert [len(b) for b in batches] == [10, 10, 5]
+
+
+# --- Bulk APIs ---
+def test_create_order_single(db):
+    resp = client.post("/orders", json={"code": "SINGLE-1"})
+    assert resp.status_code == 200
+    assert resp.json()["data"]["code"] == "SINGLE-1"
+
+
+def test_bulk_create_per_item_results(db):
+    parent = models.Order(code="BULK-PARENT")
+    db.add(parent)
+    db.commit()
+    payload = {"items": [
+        {"code": "BULK-1"},
+        {"code": "BULK-2", "parent_id": parent.id},
+        {"code": "BULK-3", "parent_id": 999999},
+    ]}
+    resp = client.post("/orders/bulk", json=payload)
+    assert resp.status_code == 200
+    data = resp.json()["data"]
+    assert (data["succeeded"], data["failed"]) == (2, 1)
+    assert [r["ok"] for r in data["items"]] == [True, True, False]
+
+    child = db.get(models.Order, data["items"][1]["id"])
+    assert (child.code, child.root_id, child.status) == ("BULK-2", parent.id, "packing")
+    assert child.created_at is not None
+    assert _codes(db, code="BULK-1") == ["BULK-1"]  # FTS trigger vẫn chạy
+
+
+def test_bulk_transitions(db):
+    a, b = _seed_orders(db, 2)
+    payload = {"items": [
+        {"id": a.id, "action": "start"},
+        {"id": a.id, "action": "close"},
+        {"id": b.id, "action": "close", "status": "error"},
+        {"id": 999999, "action": "start"},
+    ]}
+    resp = client.post("/orders/bulk/transitions", json=payload)
+    data = resp.json()["data"]
+    assert [r["status"] for r in data["items"]] == ["processing", "closed", "error", None]
+    assert data["items"][3]["error"] == "Order not found"
+
+    db.expire_all()
+    a, b = db.get(models.Order, a.id), db.get(models.Order, b.id)
+    assert (a.status, b.status) == ("closed", "error")
+    assert a.start_at is not None and a.closed_at is not None
+
+
+def test_bulk_size_limit(monkeypatch):
+    monkeypatch.setattr(settings, "BULK_MAX_ITEMS", 1)
+    resp = client.post("/orders/bulk", json={"items": [{"code": "X"}, {"code": "Y"}]})
+    assert resp.status_code == 413
+
+
+# --- Background purge (DELETE /orders/all) ---
+def _wait_purge_job(job_id, timeout=10):
+    deadline = time_module.monotonic() + timeout
+    while time_module.monotonic() < deadline:
+        data = client.get(f"/orders/purge-jobs/{job_id}").json()["data"]
+        if data["status"] != "running":
+            return data
+        time_module.sleep(0.05)
+    raise AssertionError("purge job did not finish")
+
+
+def test_purge_chunks_deletes_rows_and_files(db, tmp_path):
+    orders = _seed_orders(db, 5)
+    for order in orders[:3]:
+        media = tmp_path / f"{order.code}.mp4"
+        media.write_bytes(b"x")
+        order.path_video = str(media)
+    orders[3].path_avatar = str(tmp_path / "missing.jpg")
+    db.commit()
+    keep = models.Order(code="AFTER-CUTOFF")
+    db.add(keep)
+    db.commit()
+
+    chunks = list(order_crud.purge_chunks(db, max_id=orders[-1].id, batch_size=2))
+    assert [c["rows"] for c in chunks] == [2, 2, 1]
+    assert sum(c["files_deleted"] for c in chunks) == 3
+    assert sum(c["files_failed"] for c in chunks) == 0
+    assert list(tmp_path.iterdir()) == []
+    assert [o.code for o in db.execute(sa_select(models.Order)).scalars()] == ["AFTER-CUTOFF"]
+
+
+def test_delete_all_runs_as_background_job(db):
+    _seed_orders(db, 4)
+    resp = client.delete("/orders/all")
+    assert resp.status_code == 202
+    job = resp.json()["data"]
+    assert job["total"] == 4
+    done = _wait_purge_job(job["id"])
+    assert (done["status"], done["deleted_rows"]) == ("done", 4)
+    assert done["finished_at"] is not None
+    assert client.get("/orders/purge-jobs/999999").status_code == 404
+
+
+# --- Daily stats rollup ---
+def _rollup(db):
+    stat = models.OrderDailyStat
+    return sorted(
+        (str(r.day), r.camera_id, r.user_id, r.status, r.count)
+        for r in db.execute(sa_select(stat)).scalars()
+    )
+
+
+def test_daily_stats_follow_order_writes(db):
+    a, b, c = _seed_orders(db, 3, camera_id=2)
+    old = models.Order(code="OLD", created_at=datetime(2026, 1, 1, 23, 59))
+    db.add(old)
+    db.commit()
+    assert _rollup(db) == [("2026-01-01", 0, 0, "packing", 1), ("2026-01-10", 2, 0, "packing", 3)]
+
+    order_crud.close_order(db, order_id=a.id)
+    order_crud.bulk_transition(db, [schemas.OrderTransition(id=b.id, action="start")])
+    order_crud.remove(db, id=old.id)
+    assert _rollup(db) == [
+        ("2026-01-10", 2, 0, "closed", 1),
+        ("2026-01-10", 2, 0, "packing", 1),
+        ("2026-01-10", 2, 0, "processing", 1),
+    ]
+
+    stats = order_crud.daily_stats(db, date(2026, 1, 1), date(2026, 1, 31), camera_id=2)
+    assert stats["total"] == 3
+    assert stats["by_status"] == {"closed": 1, "packing": 1, "processing": 1}
+    assert order_crud.daily_stats(db, date(2026, 1, 1), date(2026, 1, 31), camera_id=9)["total"] == 0
+
+
+def test_stats_endpoint(db):
+    resp = client.post("/orders", json={"code": "TODAY-1"})
+    order_id = resp.json()["data"]["id"]
+    client.post(f"/orders/{order_id}/close")
+
+    data = client.get("/orders/stats").json()["data"]
+    assert (data["total"], data["by_status"]) == (1, {"closed": 1})
+    assert data["by_day"][0]["day"] == data["start_day"] == data["end_day"]
+
+    _seed_orders(db, 2)
+    data = client.get(
+        "/orders/stats",
+        params={"date_preset": "custom", "start_day": "2026-01-10", "end_day": "2026-01-10"},
+    ).json()["data"]
+    assert data["by_status"] == {"packing": 2}
+    assert client.get("/orders/stats", params={"date_preset": "custom"}).status_code == 400
+
+
+# --- Hot/cold archive ---
+def _archive_setup(db):
+    old = models.Order(
+        code="ARCH-OLD", status="closed",
+        created_at=datetime(2025, 1, 5, 9, 0), closed_at=datetime(2025, 1, 5, 10, 0),
+    )
+    db.add(old)
+    db.commit()
+    child = models.Order(code="HOT-CHILD", parent_id=old.id)
+    recent = models.Order(code="HOT-CLOSED", status="closed", closed_at=datetime.now())
+    db.add_all([child, recent])
+    db.commit()
+    old_id = old.id
+    moved = sum(order_crud.archive_chunks(db, older_than=datetime(2025, 6, 1)))
+    return old_id, moved
+
+
+def test_archive_moves_old_closed_orders(db):
+    old_id, moved = _archive_setup(db)
+    assert moved == 1
+    db.expunge_all()
+    assert db.get(models.Order, old_id) is None
+    assert db.execute(sa_select(archive_orders.c.code)).scalars().all() == ["ARCH-OLD"]
+    # Thống kê vẫn gồm đơn đã lưu trữ
+    assert order_crud.daily_stats(db, date(2025, 1, 5), date(2025, 1, 5))["total"] == 1
+
+
+def test_archive_is_unioned_only_for_code_and_date_range(db):
+    _archive_setup(db)
+    # Tìm theo code: gồm cả đơn archive và gia phả của nó ở bảng hot
+    assert _codes(db, code="ARCH") == ["ARCH-OLD", "HOT-CHILD"]
+    assert _codes(db, code="HOT-CHILD") == ["ARCH-OLD", "HOT-CHILD"]
+    assert _codes(db, code="ARCH-OLD", code_match="exact") == ["ARCH-OLD", "HOT-CHILD"]
+    # Khoảng ngày cụ thể: gồm archive
+    assert _codes(db, status="closed", start_date=datetime(2025, 1, 1), end_date=datetime(2025, 2, 1)) == ["ARCH-OLD"]
+    # date_preset / không lọc: chỉ bảng hot
+    assert "ARCH-OLD" not in _codes(db)
+    assert "ARCH-OLD" not in _codes(db, date_preset="last15days")
+
+    page = order_crud.filter_orders_page(db, limit=1, code="ARCH,HOT", cursor="", count="exact")
+    assert page.total == 3 and page.next_cursor
+    rest = order_crud.filter_orders_page(db, limit=5, code="ARCH,HOT", cursor=page.next_cursor, count="none")
+    assert len(page.items) + len(rest.items) == 3
+
+
+def test_archived_order_detail_and_family(db):
+    old_id, _ = _archive_setup(db)
+    resp = client.get(f"/orders/{old_id}")
+    assert resp.status_code == 200 and resp.json()["data"]["code"] == "ARCH-OLD"
+    child_id = db.execute(sa_select(models.Order.id).where(models.Order.code == "HOT-CHILD")).scalar()
+    # Gia phả nằm ở cả 2 bảng: tra từ đơn hot hay đơn archive đều ra đủ
+    for order_id in (old_id, child_id):
+        data = client.get(f"/orders/{order_id}/family").json()["data"]
+        assert [i["code"] for i in data["items"]] == ["ARCH-OLD", "HOT-CHILD"]
+        assert data["tree"]["id"] == old_id
+    assert client.get("/orders/999999").status_code == 404
+
+
+def test_create_with_archived_parent(db):
+    old_id, _ = _archive_setup(db)
+    single = order_crud.create(db, schemas.OrderCreate(code="ARCH-KID1", parent_id=old_id))
+    assert single.root_id == old_id
+    resp = client.post("/orders/bulk", json={"items": [
+        {"code": "ARCH-KID2", "parent_id": old_id},
+        {"code": "ARCH-KID3"},
+    ]})
+    items = resp.json()["data"]["items"]
+    assert [i["ok"] for i in items] == [True, True]
+    roots = dict(db.execute(
+        sa_select(models.Order.id, models.Order.root_id).where(models.Order.id.in_([i["id"] for i in items]))
+    ).all())
+    assert roots == {items[0]["id"]: old_id, items[1]["id"]: items[1]["id"]}
+    # Gia phả gồm đơn cha đã lưu trữ và các con mới
+    codes = [i["code"] for i in client.get(f"/orders/{old_id}/family").json()["data"]["items"]]
+    assert codes == ["ARCH-OLD", "HOT-CHILD", "ARCH-KID1", "ARCH-KID2"]
+
+def test_purge_includes_archived_orders_and_media(db, tmp_path):
+    media = tmp_path / "archived.mp4"
+    media.write_bytes(b"x")
+    old = models.Order(
+        code="ARCH-PURGE", status="closed", path_video=str(media),
+        created_at=datetime(2025, 1, 5, 9, 0), closed_at=datetime(2025, 1, 5, 10, 0),
+    )
+    db.add(old)
+    db.commit()
+    assert sum(order_crud.archive_chunks(db, older_than=datetime(2025, 6, 1))) == 1
+    _seed_orders(db, 2)
+
+    resp = client.delete("/orders/all")
+    assert resp.json()["data"]["total"] == 3
+    done = _wait_purge_job(resp.json()["data"]["id"])
+    assert (done["status"], done["deleted_rows"]) == ("done", 3)
+    assert db.execute(sa_select(archive_orders.c.id)).all() == []
+    assert not media.exists()
+    # Phần thống kê archive_chunks đã cộng bù cũng bị trừ đi
+    assert order_crud.daily_stats(db, date(2025, 1, 5), date(2025, 1, 5))["total"] == 0
+
+
+# --- orjson / TypeAdapter serializers ---
+def test_list_response_matches_order_schema(db):
+    parent, child, other = _family(db)
+    order_crud.start_order(db, order_id=other.id)  # status ngoài pattern của OrderCreate
+    items = client.get("/orders", params={"sort_dir": "asc"}).json()["data"]["items"]
+    by_code = {i["code"]: i for i in items}
+    assert by_code["GHN-552190"]["parent"]["code"] == "SPX-VN-884201"
+    assert by_code["SPX-VN-884201"]["parent"] is None
+    assert by_code["LZD-000111"]["status"] == "processing"
+    assert by_code["LZD-000111"]["start_at"].startswith(str(datetime.now().year))
+    # Mọi cột lưu trữ (cột ảo meta_* chỉ để lọc, đã có trong order_metadata)
+    assert set(by_code["LZD-000111"]) >= {c.key for c in models.Order.__table__.columns if c.computed is None}
+
+
+def test_dump_orders_without_parent_does_not_lazy_load(db):
+    parent, child, other = _family(db)
+    db.expire_all()
+    rows = db.execute(sa_select(models.Order).order_by(models.Order.id)).scalars().all()
+    dumped = dump_orders(rows)
+    assert "parent" not in dumped[0]
+    assert "parent" not in child.__dict__
+
+
+# --- Sparse fields ---
+def test_orders_fields_projection(db):
+    parent, child, other = _family(db)
+    resp = client.get("/orders", params={"fields": "id,code,status", "sort_dir": "asc"})
+    assert resp.status_code == 200
+    items = resp.json()["data"]["items"]
+    assert items[0] == {"id": parent.id, "code": "SPX-VN-884201", "status": "packing"}
+
+    items = client.get("/orders", params={"fields": "code,parent", "code": "GHN"}).json()["data"]["items"]
+    by_code = {i["code"]: i for i in items}
+    assert by_code["GHN-552190"]["parent"] == {"code": "SPX-VN-884201", "id": parent.id}
+    assert by_code["SPX-VN-884201"]["parent"] is None
+
+    assert client.get("/orders", params={"fields": "code,password"}).status_code == 400
+
+
+def test_orders_fields_with_cursor(db):
+    _seed_orders(db, 5)
+    page = order_crud.filter_orders_page(db, limit=2, cursor="", count="none", fields=["code"])
+    assert page.items == [{"code": "KS004"}, {"code": "KS003"}]
+    rest = order_crud.filter_orders_page(db, limit=5, cursor=page.next_cursor, count="none", fields=["code"])
+    assert [i["code"] for i in rest.items] == ["KS002", "KS001", "KS000"]
+
+
+def test_orders_fields_query_has_no_entity_columns(db):
+    query, _ = order_crud._projection_query(models.Order, ["id", "code"], models.Order.created_at)
+    sql = str(query)
+    assert "order_metadata" not in sql and "note" not in sql and "JOIN" not in sql
+
+
+# --- Count cache / count=estimate ---
+def test_count_cache_invalidated_by_crud_writes(db):
+    _seed_orders(db, 3)
+    assert client.get("/orders", params={"limit": 1}).json()["data"]["total"] == 3
+
+    # Lần gọi thứ 2 đọc cache, không chạy lại count(*)
+    hits = _count_cache.stats()["hits"]
+    assert client.get("/orders", params={"limit": 1}).json()["data"]["total"] == 3
+    assert _count_cache.stats()["hits"] == hits + 1
+
+    # Ghi qua CRUD tăng phiên bản bảng -> cache cũ không còn được dùng
+    order = order_crud.create(db, schemas.OrderCreate(code="NEW-1"))
+    assert client.get("/orders", params={"limit": 1}).json()["data"]["total"] == 4
+    order_crud.close_order(db, order_id=order.id, status="error")
+    assert client.get("/orders", params={"status": "error"}).json()["data"]["total"] == 1
+    order_crud.remove(db, id=order.id)
+    assert client.get("/orders", params={"limit": 1}).json()["data"]["total"] == 3
+    assert client.get("/orders", params={"status": "error"}).json()["data"]["total"] == 0
+
+
+def test_count_estimate_and_none(db, monkeypatch):
+    monkeypatch.setattr(settings, "ORDER_COUNT_ESTIMATE_CAP", 4)
+    _seed_orders(db, 6)
+
+    data = client.get("/orders", params={"limit": 2, "count": "estimate"}).json()["data"]
+    assert (data["total"], data["total_estimated"]) == (4, True)
+
+    data = client.get("/orders", params={"limit": 2, "count": "none"}).json()["data"]
+    assert data["total"] is None
+
+    # Sau khi đã có count exact, estimate dùng luôn kết quả chính xác
+    client.get("/orders", params={"limit": 2, "count": "exact"})
+    data = client.get("/orders", params={"limit": 2, "count": "estimate"}).json()["data"]
+    assert (data["total"], data["total_estimated"]) == (6, False)
+
+
+# --- GET /events (SSE) ---
+def test_event_bus_resume_reset_and_overflow():
+    async def scenario():
+        bus = EventBus(buffer_size=3, subscriber_queue=2)
+        bus.publish("order.created", {"id": 1})
+        token = bus.make_token(1)
+        bus.publish("order.started", {"id": 1})
+
+        sub, backlog, reset = bus.subscribe(token)
+        assert not reset and [item[1] for item in backlog] == ["order.started"]
+        bus.unsubscribe(sub)
+        # Token của process khác -> reset
+        assert bus.subscribe("deadbeef-1")[2] is True
+        # Token đã trôi khỏi ring buffer -> reset
+        for i in range(5):
+            bus.publish("order.closed", {"id": i})
+        assert bus.subscribe(token)[2] is True
+
+        sub, _, _ = bus.subscribe()
+        for i in range(3):
+            bus.publish("order.created", {"id": i})
+        await asyncio.sleep(0)
+        # Hàng đợi đầy -> bị ngắt bằng sentinel None
+        assert sub.queue.get_nowait() is None
+
+    asyncio.run(scenario())
+
+
+def test_event_bus_remote_change_dedup():
+    bus = EventBus(buffer_size=10, subscriber_queue=10)
+    bus.note_local_version("orders", 5)
+    assert bus.consume_remote_change("orders", 4, 5) is False
+    assert bus.consume_remote_change("orders", 5, 7) is True
+
+
+def test_order_writes_publish_events(db):
+    async def scenario():
+        sub, _, _ = event_bus.subscribe()
+        try:
+            order = order_crud.create(db, schemas.OrderCreate(code="EVT1"))
+            order_crud.start_order(db, order.id)
+            order_crud.close_order(db, order.id)
+            order_crud.remove(db, id=order.id)
+            await asyncio.sleep(0)
+            items = []
+            while not sub.queue.empty():
+                items.append(sub.queue.get_nowait())
+        finally:
+            event_bus.unsubscribe(sub)
+        return order.id, items
+
+    order_id, items = asyncio.run(scenario())
+    assert [item[1] for item in items] == ["order.created", "order.started", "order.closed", "order.deleted"]
+    frame = format_sse(items[0])
+    assert frame.startswith(b"id: ") and b"event: order.created\n" in frame
+    assert f'"id":{order_id}'.encode() in frame
+
+
+def test_bulk_writes_publish_one_event_per_batch(db):
+    async def scenario():
+        sub, _, _ = event_bus.subscribe()
+        try:
+            created = order_crud.bulk_create(db, [schemas.OrderCreate(code=f"EVTB{i}") for i in range(300)])
+            ids = [r["id"] for r in created]
+            order_crud.bulk_transition(
+                db,
+                [schemas.OrderTransition(id=i, action="start") for i in ids]
+                + [schemas.OrderTransition(id=i, action="close") for i in ids[:5]],
+            )
+            await asyncio.sleep(0)
+            items = []
+            while not sub.queue.empty():
+                items.append(sub.queue.get_nowait())
+        finally:
+            event_bus.unsubscribe(sub)
+        return ids, items
+
+    # 300 đơn > EVENTS_SUBSCRIBER_QUEUE: subscriber không bị ngắt (không có sentinel None)
+    ids, items = asyncio.run(scenario())
+    assert [item[1] for item in items] == ["order.created", "order.started", "order.closed"]
+    assert b'"ids":[' in format_sse(items[0])
+
+
+def test_local_version_noted_only_after_commit(db):
+    # Bảng riêng: bảng thật bị dựng lại giữa các test nên số phiên bản lặp lại
+    version = get_table_version(db, "version_probe")
+    bump_table_version(db, "version_probe")
+    db.rollback()
+    # Phiên bản bị rollback -> ghi từ worker khác cùng số phiên bản vẫn được coi là remote
+    assert event_bus.consume_remote_change("version_probe", version, version + 1) is True
+
+    bump_table_version(db, "version_probe")
+    db.commit()
+    assert event_bus.consume_remote_change("version_probe", version, version + 1) is False
+
+
+# --- ETag / If-None-Match ---
+def test_orders_etag_not_modified_until_write(db):
+    order = order_crud.create(db, schemas.OrderCreate(code="ETAG1"))
+    first = client.get("/orders?limit=5")
+    etag = first.headers["ETag"]
+
+    again = client.get("/orders?limit=5", headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.content == b""
+    assert again.headers["ETag"] == etag
+    # Query khác -> ETag khác
+    assert client.get("/orders?limit=6").headers["ETag"] != etag
+
+    detail = client.get(f"/orders/{order.id}")
+    assert client.get(f"/orders/{order.id}", headers={"If-None-Match": detail.headers["ETag"]}).status_code == 304
+
+    order_crud.start_order(db, order.id)
+    assert client.get("/orders?limit=5", headers={"If-None-Match": etag}).status_code == 200
+    assert client.get(f"/orders/{order.id}", headers={"If-None-Match": detail.headers["ETag"]}).status_code == 200
+
+
+# --- Thời điểm epoch UTC, giờ VN ở tầng API ---
+def test_order_times_stored_as_utc_epoch(db):
+    order = models.Order(code="EPOCH1", created_at=datetime(2026, 1, 10, 8, 0))  # naive = giờ VN
+    db.add(order)
+    db.commit()
+    raw = db.execute(sa_text("SELECT created_at, typeof(created_at) FROM orders WHERE id = :id"), {"id": order.id}).one()
+    assert tuple(raw) == (1768006800, "integer")
+    assert order.created_at == datetime(2026, 1, 10, 1, 0, tzinfo=timezone.utc)
+
+    body = client.get(f"/orders/{order.id}").json()["data"]
+    assert body["created_at"] == "2026-01-10T08:00:00"
+    rows = client.get("/orders?fields=id,created_at&code=EPOCH1").json()["data"]["items"]
+    assert rows == [{"id": order.id, "created_at": "2026-01-10T08:00:00"}]
+    # start_date / end_date (giờ VN) so sánh trên số nguyên
+    in_range = client.get("/orders?start_date=2026-01-10T08:00:00&end_date=2026-01-10T09:00:00").json()
+    assert [o["id"] for o in in_range["data"]["items"]] == [order.id]
+    assert client.get("/orders?start_date=2026-01-10T08:00:01&end_date=2026-01-10T09:00:00").json()["data"]["items"] == []
+
+
+def test_today_preset_uses_vn_day(db):
+    order = order_crud.create(db, schemas.OrderCreate(code="TODAY1"))
+    assert order.created_at.tzinfo is not None
+    ids = [o.id for o in order_crud.filter_orders(db, date_preset="today")[0]]
+    assert ids == [order.id]
+    assert order_crud.filter_orders(db, date_preset="yesterday")[0] == []
+
+
+def test_attach_archive_converts_legacy_text_times(tmp_path):
+    path = str(tmp_path / "legacy_archive.db")
+    legacy = sqlite3.connect(path)
+    legacy.execute("CREATE TABLE orders (id INTEGER PRIMARY KEY, code TEXT, created_at DATETIME, start_at DATETIME, closed_at DATETIME)")
+    legacy.execute("INSERT INTO orders (id, code, created_at) VALUES (1, 'A1', '2025-01-05 09:00:00.000000')")
+    legacy.commit()
+    legacy.close()
+
+    conn = sqlite3.connect(":memory:")
+    attach_archive(conn, path)
+    assert conn.execute("SELECT created_at FROM archive.orders").fetchone()[0] == 1736042400
+    assert conn.execute("PRAGMA archive.user_version").fetchone()[0] == 1
+    conn.close()
+
+
+# --- order_metadata: cột ảo meta_* + ?meta.<key>= ---
+def _meta_orders(db):
+    rows = [
+        ("M1", {"carrier": "GHN", "sku_count": 2, "station": "S1"}),
+        ("M2", {"carrier": "GHTK", "sku_count": 5}),
+        ("M3", {"carrier": "GHN", "sku_count": 5, "station": "S2"}),
+    ]
+    return [order_crud.create(db, schemas.OrderCreate(code=c, order_metadata=m)) for c, m in rows]
+
+
+def test_meta_filters_use_virtual_columns(db):
+    m1, m2, m3 = _meta_orders(db)
+    # Dữ liệu cũ không phải JSON không làm hỏng truy vấn
+    db.add(models.Order(code="LEGACY-META", order_metadata="not json"))
+    db.commit()
+
+    def codes(params):
+        resp = client.get("/orders", params=params)
+        assert resp.status_code == 200, resp.text
+        return sorted(o["code"] for o in resp.json()["data"]["items"])
+
+    assert codes({"meta.carrier": "GHN"}) == ["M1", "M3"]
+    assert codes({"meta.carrier": "GHN", "meta.sku_count": "5"}) == ["M3"]
+    assert codes({"meta.station": "S1,S2"}) == ["M1", "M3"]
+    assert client.get("/orders", params={"meta.sku_count": "5"}).json()["data"]["total"] == 2
+    assert client.get("/orders", params={"meta.color": "red"}).status_code == 400
+    assert client.get("/orders", params={"meta.sku_count": "many"}).status_code == 400
+
+    stmt = sa_select(models.Order.id).where(*order_crud._filter_conditions(meta={"carrier": ["GHN"]}))
+    plan = " | ".join(r[-1] for r in db.execute(sa_text(f"EXPLAIN QUERY PLAN {stmt.compile(dialect=sqlite_dialect.dialect(), compile_kwargs={'literal_binds': True})}")))
+    assert "ix_orders_meta_carrier" in plan
+
+
+def test_meta_columns_survive_archive(db):
+    m1, _, _ = _meta_orders(db)
+    order_crud.close_order(db, m1.id)
+    db.execute(sa_text("UPDATE orders SET closed_at = 0 WHERE id = :id"), {"id": m1.id})
+    db.commit()
+    assert sum(order_crud.archive_chunks(db, older_than=datetime(2020, 1, 1))) == 1
+    items, _ = order_crud.filter_orders(db, code="M1", code_match="exact")
+    assert [(o.code, o.meta_carrier) for o in items] == [("M1", "GHN")]
+
+
+def test_order_metadata_validated_on_write():
+    with pytest.raises(ValueError):
+        schemas.OrderCreate(code="X", order_metadata="{broken")
+    with pytest.raises(ValueError):
+        schemas.OrderUpdate(order_metadata="[1, 2]")
+    assert schemas.OrderCreate(code="X", order_metadata={"carrier": "GHN"}).order_metadata == '{"carrier": "GHN"}'
+    resp = client.post("/orders", json={"code": "BAD-META", "order_metadata": "nope"})
+    assert resp.status_code == 422
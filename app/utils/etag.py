@@ -0,0 +1,46 @@
+# ETag / If-None-Match cho các API GET hay bị polling
+# app/utils/etag.py
+"""
+ETag suy ra từ phiên bản bảng (change_counters) + URL của request: không cần
+chạy truy vấn / serialize, chỉ 1 lần đọc change_counters. Dữ liệu chưa đổi
+-> 304 Not Modified, body rỗng.
+"""
+import hashlib
+from typing import Dict
+
+from fastapi import Request, Response
+
+from app.db.models import get_vn_time
+
+
+def make_etag(request: Request, versions: Dict[str, int]) -> str:
+    """
+    Weak ETag theo (path, query string, phiên bản các bảng, ngày hiện tại giờ VN).
+    Ngày hiện tại: date_preset=today... đổi kết quả khi qua ngày dù không ghi gì.
+    """
+    query = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+    tables = ",".join(f"{name}:{versions[name]}" for name in sorted(versions))
+    raw = f"{request.url.path}?{query}|{tables}|{get_vn_time().date().isoformat()}"
+    return f'W/"{hashlib.blake2b(raw.encode(), digest_size=12).hexdigest()}"'
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """So sánh If-None-Match với etag (so sánh yếu: bỏ tiền tố W/)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tag = etag.removeprefix("W/")
+    return any(t.strip().removeprefix("W/") == tag for t in header.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    return with_etag(Response(status_code=304), etag)
+
+
+def with_etag(response: Response, etag: str) -> Response:
+    """Gắn ETag; no-cache: client vẫn phải hỏi lại server (If-None-Match) mỗi lần."""
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return response
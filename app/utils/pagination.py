@@ -1,5 +1,8 @@
 # app/utils/pagination.py
-from typing import Tuple
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, Tuple
 
 def paginate(page: int, page_size: int, max_page_size: int = 500) -> Tuple[int, int]:
     """
@@ -17,3 +20,64 @@ def paginate(page: int, page_size: int, max_page_size: int = 500) -> Tuple[int,
     skip = page * page_size
     limit = page_size
     return skip, limit
+
+
+def encode_cursor(data: Dict[str, Any]) -> str:
+    """
+    Đóng gói vị trí keyset thành cursor opaque (base64url của JSON).
+    datetime được đánh dấu để decode_cursor khôi phục đúng kiểu.
+    """
+    payload = {
+        k: {"$dt": v.isoformat()} if isinstance(v, datetime) else v
+        for k, v in data.items()
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """
+    Giải mã cursor do encode_cursor tạo ra.
+    Ném ValueError nếu cursor hỏng/không hợp lệ.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(payload, dict):
+        raise ValueError("Invalid cursor")
+    data = {}
+    for k, v in payload.items():
+        if isinstance(v, dict) and "$dt" in v:
+            if not isinstance(v["$dt"], str):
+                raise ValueError("Invalid cursor")
+            v = datetime.fromisoformat(v["$dt"])  # ValueError nếu sai định dạng
+        data[k] = v
+    return data
+
+
+def decode_keyset_cursor(
+    cursor: str, sort_key: str, sort_dir: str, datetime_value: bool = False
+) -> Tuple[Any, int]:
+    """
+    Giải mã cursor keyset {"s": cột sort, "d": chiều sort, "v": giá trị cột sort, "i": id}
+    của dòng cuối trang trước. Trả về (v, i).
+    - s/d phải khớp sort_by/sort_dir của request; i là số nguyên.
+    - v: None hoặc giá trị đơn (str/int/float); datetime_value=True (cột thời gian
+      UTCEpoch) thì v phải là datetime.
+    Ném ValueError nếu thiếu khóa / sai kiểu (router trả 400 thay vì lỗi khi chạy SQL).
+    """
+    position = decode_cursor(cursor)
+    if not {"s", "d", "v", "i"} <= position.keys():
+        raise ValueError("Invalid cursor")
+    if position["s"] != sort_key or position["d"] != sort_dir:
+        raise ValueError("Cursor does not match sort_by/sort_dir")
+    last_id, value = position["i"], position["v"]
+    if not isinstance(last_id, int) or isinstance(last_id, bool):
+        raise ValueError("Invalid cursor")
+    if value is not None:
+        expected = (datetime,) if datetime_value else (str, int, float)
+        if not isinstance(value, expected) or isinstance(value, bool):
+            raise ValueError("Invalid cursor")
+    return value, last_id
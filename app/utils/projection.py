@@ -0,0 +1,25 @@
+# Tham số fields= (sparse projection) cho các API danh sách
+# app/utils/projection.py
+from typing import Iterable, List, Optional
+
+
+def parse_fields(raw: Optional[str]) -> Optional[List[str]]:
+    """
+    "id, code,status" -> ["id", "code", "status"] (giữ thứ tự, bỏ trùng).
+    None / chuỗi rỗng -> None (trả về đầy đủ như cũ).
+    """
+    if not raw:
+        return None
+    fields = []
+    for name in raw.split(","):
+        name = name.strip()
+        if name and name not in fields:
+            fields.append(name)
+    return fields or None
+
+
+def check_fields(fields: List[str], allowed: Iterable[str]) -> None:
+    """ValueError nếu có trường không hợp lệ (router trả 400)."""
+    unknown = [f for f in fields if f not in set(allowed)]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
@@ -0,0 +1,143 @@
+# Trả file media hỗ trợ Range / 206 (tua video) và zero-copy khi server hỗ trợ
+# app/utils/range_response.py
+"""
+- Range: "bytes=a-b", "bytes=a-", "bytes=-n" (1 khoảng). Nhiều khoảng / sai cú pháp
+  -> bỏ qua Range, trả cả file (RFC 9110). Khoảng nằm ngoài file -> 416.
+- If-Range (ETag hoặc Last-Modified) không khớp -> trả cả file.
+- Body gửi theo thứ tự ưu tiên:
+  1. ASGI extension "http.response.zerocopysend": server gọi sendfile() trên fd
+  2. "http.response.pathsend" (chỉ khi trả cả file)
+  3. os.pread từng khối MEDIA_IO_CHUNK_BYTES trong threadpool: bộ nhớ không
+     phụ thuộc kích thước file hay độ dài khoảng.
+"""
+import os
+from email.utils import formatdate
+from typing import Mapping, Optional, Tuple
+
+from anyio import to_thread
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from app.core.config import settings
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    (start, end) (end tính cả) của header Range; None = trả cả file.
+    Ném RangeNotSatisfiable nếu khoảng không giao với file.
+    """
+    if not header:
+        return None
+    unit, _, spec = header.strip().partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec or "-" not in spec:
+        return None
+    start_s, _, end_s = spec.strip().partition("-")
+    try:
+        if not start_s:
+            suffix = int(end_s)
+            if suffix <= 0 or size == 0:
+                raise RangeNotSatisfiable()
+            return max(size - suffix, 0), size - 1
+        start = int(start_s)
+        end = int(end_s) if end_s else None
+    except ValueError:
+        return None
+    if start < 0 or (end is not None and end < start):
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    return start, size - 1 if end is None else min(end, size - 1)
+
+
+class RangeFileResponse(Response):
+    """FileResponse của Starlette + Range/If-Range/If-None-Match và zero-copy."""
+
+    def __init__(
+        self,
+        request: Request,
+        path: str,
+        media_type: Optional[str] = None,
+        headers: Optional[Mapping[str, str]] = None,
+        stat_result: Optional[os.stat_result] = None,
+    ):
+        self.path = path
+        self.media_type = media_type or "application/octet-stream"
+        self.background = None
+        st = stat_result or os.stat(path)
+        size = st.st_size
+        etag = f'"{st.st_mtime_ns:x}-{size:x}"'
+        last_modified = formatdate(st.st_mtime, usegmt=True)
+
+        self.offset, self.count = 0, size
+        self.send_body = request.method != "HEAD"
+        self.status_code = 200
+        extra = {"accept-ranges": "bytes", "etag": etag, "last-modified": last_modified}
+
+        range_header = request.headers.get("range")
+        if_range = request.headers.get("if-range")
+        if range_header and if_range and if_range.strip() not in (etag, last_modified):
+            range_header = None
+
+        if not range_header and request.headers.get("if-none-match", "").strip() == etag:
+            self.status_code, self.count = 304, 0
+        else:
+            try:
+                byte_range = parse_range(range_header, size)
+            except RangeNotSatisfiable:
+                self.status_code, self.count = 416, 0
+                extra["content-range"] = f"bytes */{size}"
+            else:
+                if byte_range is not None:
+                    start, end = byte_range
+                    self.status_code = 206
+                    self.offset, self.count = start, end - start + 1
+                    extra["content-range"] = f"bytes {start}-{end}/{size}"
+        if self.status_code != 304:
+            extra["content-length"] = str(self.count)
+        self.full_file = self.status_code == 200
+
+        self.init_headers({**extra, **(headers or {})})
+        if self.status_code in (304, 416):
+            del self.headers["content-type"]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self.send_body or self.count == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        extensions = scope.get("extensions") or {}
+        if "http.response.zerocopysend" in extensions:
+            with open(self.path, "rb") as file:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file,
+                    "offset": self.offset,
+                    "count": self.count,
+                })
+            return
+        if self.full_file and "http.response.pathsend" in extensions:
+            await send({"type": "http.response.pathsend", "path": os.fspath(self.path)})
+            return
+
+        fd = await to_thread.run_sync(os.open, self.path, os.O_RDONLY)
+        try:
+            offset, remaining = self.offset, self.count
+            while remaining > 0:
+                chunk = await to_thread.run_sync(
+                    os.pread, fd, min(settings.MEDIA_IO_CHUNK_BYTES, remaining), offset
+                )
+                if not chunk:
+                    break  # file bị cắt ngắn trong lúc gửi
+                offset += len(chunk)
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            os.close(fd)
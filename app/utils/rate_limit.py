@@ -0,0 +1,37 @@
+# Giới hạn tốc độ cho job nền (quét / xóa file) để không tranh I/O với request thật
+# app/utils/rate_limit.py
+import time
+from typing import Callable
+
+
+class RateLimiter:
+    """
+    Token bucket đơn giản, dùng trong 1 thread: acquire() ngủ khi vượt `rate` lần / giây.
+    - rate <= 0: không giới hạn.
+    - burst: số lần được dùng liền không chờ (mặc định = rate, tức 1 giây).
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1)
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.burst
+        self._last = clock()
+
+    def acquire(self, n: float = 1) -> None:
+        if self.rate <= 0:
+            return
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+        self._tokens -= n
+        if self._tokens < 0:
+            # Nợ token -> ngủ đủ thời gian để trả nợ
+            self._sleep(-self._tokens / self.rate)
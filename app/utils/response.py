@@ -1,6 +1,7 @@
 # Chuẩn hóa JSON envelope 
 # app/utils/response.py
 from typing import Any, Optional
+from fastapi.responses import ORJSONResponse
 
 def response_success(
     data: Any = None,
@@ -27,6 +28,24 @@ def response_success(
     return resp
 
 
+def response_json(
+    data: Any = None,
+    mes: str = "success",
+    code: int = 200,
+    status_code: int = 200,
+    **kwargs,
+) -> ORJSONResponse:
+    """
+    Envelope giống response_success nhưng trả thẳng ORJSONResponse: bỏ qua
+    jsonable_encoder của FastAPI, orjson encode 1 lượt (datetime, date... native).
+    Dùng với dữ liệu từ app/utils/serializers.py.
+    """
+    return ORJSONResponse(
+        content=response_success(data=data, mes=mes, code=code, **kwargs),
+        status_code=status_code,
+    )
+
+
 def response_error(
     mes: str = "error",
     code: int = 400,
@@ -0,0 +1,59 @@
+# Serializer ORM -> dict dùng TypeAdapter (pydantic-core) biên dịch sẵn
+# app/utils/serializers.py
+"""
+Thay cho jsonable_encoder trên các đường nóng: validate from_attributes + dump
+chạy trong pydantic-core (Rust), giữ nguyên datetime để ORJSONResponse encode
+trong 1 lượt (xem app/utils/response.py: response_json).
+"""
+from datetime import datetime
+from typing import Iterable, List, Optional
+from pydantic import TypeAdapter
+from app.db import schemas
+from app.utils.time_utils import to_vn
+
+_order_list = TypeAdapter(List[schemas.OrderOut])
+_order_with_parent_list = TypeAdapter(List[schemas.OrderWithParentOut])
+_camera_list = TypeAdapter(List[schemas.CameraOut])
+_user_list = TypeAdapter(List[schemas.UserOut])
+
+
+def _dump_list(adapter: TypeAdapter, items: Iterable) -> list:
+    return adapter.dump_python(adapter.validate_python(list(items), from_attributes=True))
+
+
+def dump_orders(items: Iterable, with_parent: bool = False) -> list:
+    """with_parent=True: kèm đơn cha (chỉ dùng khi query đã joinedload(parent))."""
+    return _dump_list(_order_with_parent_list if with_parent else _order_list, items)
+
+
+def dump_order(obj) -> Optional[dict]:
+    return dump_orders([obj])[0] if obj is not None else None
+
+
+def _vn_row(row: dict) -> dict:
+    return {
+        k: _vn_row(v) if isinstance(v, dict) else to_vn(v) if isinstance(v, datetime) else v
+        for k, v in row.items()
+    }
+
+
+def dump_order_rows(items: Iterable[dict]) -> list:
+    """Item dict của fields= (CRUDOrder._projection_query): thời điểm UTC -> giờ VN như OrderOut."""
+    return [_vn_row(item) for item in items]
+
+
+def dump_cameras(items: Iterable) -> list:
+    return _dump_list(_camera_list, items)
+
+
+def dump_camera(obj) -> Optional[dict]:
+    return dump_cameras([obj])[0] if obj is not None else None
+
+
+def dump_users(items: Iterable) -> list:
+    return _dump_list(_user_list, items)
+
+
+def dump_user(obj) -> Optional[dict]:
+    """Không bao giờ có password_hash (UserOut không khai báo trường này)."""
+    return dump_users([obj])[0] if obj is not None else None
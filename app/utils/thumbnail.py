@@ -0,0 +1,36 @@
+# Thu nhỏ ảnh (chạy trong process pool, xem app/services/thumbnail_service.py)
+# app/utils/thumbnail.py
+"""
+Module nhẹ, không import app.*: worker của process pool (spawn) chỉ cần nạp
+Pillow + module này.
+"""
+import os
+import uuid
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+def render_thumbnail(src: str, dest: str, max_side: int, quality: int) -> int:
+    """
+    Thu nhỏ src để cạnh dài nhất <= max_side, lưu JPEG vào dest (ghi file tạm rồi
+    os.replace). Trả về dung lượng file dest.
+    """
+    with Image.open(src) as img:
+        # JPEG: giải mã luôn ở tỉ lệ nhỏ (1/2, 1/4, 1/8) thay vì giải mã cả ảnh gốc
+        img.draft("RGB", (max_side, max_side))
+        img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        part = f"{dest}.{uuid.uuid4().hex}.part"
+        try:
+            img.save(part, "JPEG", quality=quality, optimize=True)
+            os.replace(part, dest)
+        except BaseException:
+            if os.path.exists(part):
+                os.remove(part)
+            raise
+    return os.path.getsize(dest)
@@ -1,26 +1,54 @@
-# Hàm xử lý ngày 
+# Hàm xử lý ngày
 # app/utils/time_utils.py
-from datetime import datetime, timedelta
-from typing import Tuple
+"""
+Thời điểm trong DB là epoch UTC (xem models.UTCEpoch); giờ Việt Nam chỉ dùng ở
+tầng API (hiển thị, ranh giới ngày của date_preset).
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+import pytz
+
+VN_TZ = pytz.timezone('Asia/Ho_Chi_Minh')
+
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def vn_now() -> datetime:
+    return datetime.now(VN_TZ)
+
+
+def vn_day_start(now: Optional[datetime] = None) -> datetime:
+    """0h hôm nay theo giờ VN (aware)."""
+    now = now or vn_now()
+    return VN_TZ.localize(datetime(now.year, now.month, now.day))
+
+
+def to_vn(value: Optional[datetime]) -> Optional[datetime]:
+    """datetime aware -> giờ VN không kèm tzinfo (định dạng API trả về từ trước tới nay)."""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(VN_TZ).replace(tzinfo=None)
+
 
 def today() -> Tuple[datetime, datetime]:
-    now = datetime.now()
-    start = datetime(now.year, now.month, now.day)
+    start = vn_day_start()
     end = start + timedelta(days=1)
     return start, end
 
 def yesterday() -> Tuple[datetime, datetime]:
-    now = datetime.now()
-    end = datetime(now.year, now.month, now.day)
+    end = vn_day_start()
     start = end - timedelta(days=1)
     return start, end
 
 def last7days() -> Tuple[datetime, datetime]:
-    now = datetime.now()
+    now = vn_now()
     start = now - timedelta(days=7)
     return start, now
 
 def last15days() -> Tuple[datetime, datetime]:
-    now = datetime.now()
+    now = vn_now()
     start = now - timedelta(days=15)
     return start, now
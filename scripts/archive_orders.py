@@ -0,0 +1,60 @@
+# scripts/archive_orders.py
+"""
+Chuyển đơn hàng đã đóng lâu ngày từ bảng orders (hot) sang DB lưu trữ (archive).
+
+Chạy: python scripts/archive_orders.py [--days 90] [--batch-size 500] [--dry-run]
+Mặc định lấy ARCHIVE_AFTER_DAYS / ARCHIVE_BATCH_SIZE trong cấu hình. Có thể chạy
+khi server đang hoạt động: mỗi lô là 1 transaction ngắn.
+"""
+import argparse
+import os
+import sys
+from datetime import timedelta
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.insert(0, root_dir)
+
+from sqlalchemy import select, func  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from app.crud.order_crud import order_crud  # noqa: E402
+from app.db import models  # noqa: E402
+from app.db.archive import archive_db_path, archive_orders  # noqa: E402
+from app.db.session import SessionLocal  # noqa: E402
+from app.utils.time_utils import to_vn, utc_now  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=settings.ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch-size", type=int, default=settings.ARCHIVE_BATCH_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="chỉ đếm, không chuyển")
+    args = parser.parse_args()
+
+    cutoff = utc_now() - timedelta(days=args.days)
+    print(f"⏳ Archive: {archive_db_path()}")
+    print(f"   Đơn closed/error đóng trước {to_vn(cutoff):%Y-%m-%d %H:%M} (giờ VN)")
+
+    db = SessionLocal()
+    try:
+        if args.dry_run:
+            pending = db.execute(
+                select(func.count()).select_from(models.Order).where(
+                    models.Order.status.in_(("closed", "error")), models.Order.closed_at < cutoff
+                )
+            ).scalar()
+            print(f"🔎 Dry run: {pending} đơn sẽ được chuyển")
+            return
+
+        moved = 0
+        for count in order_crud.archive_chunks(db, older_than=cutoff, batch_size=args.batch_size):
+            moved += count
+            print(f"   📦 Đã chuyển {moved} đơn...")
+        archived = db.execute(select(func.count()).select_from(archive_orders)).scalar()
+        print(f"✅ Hoàn tất: chuyển {moved} đơn, archive hiện có {archived} đơn")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
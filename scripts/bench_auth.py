@@ -0,0 +1,87 @@
+# scripts/bench_auth.py
+"""
+Đo độ trễ của AuthMiddleware dưới tải đồng thời.
+
+Chạy: python scripts/bench_auth.py [--concurrency 50] [--requests 2000]
+Dùng DB SQLite tạm (không đụng tới DB thật), gọi GET /cameras với Bearer token
+qua ASGI transport trong cùng process. Đặt PRINCIPAL_CACHE_SIZE=0 để đo
+trường hợp mỗi request đều phải truy vấn bảng users.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.insert(0, root_dir)
+
+_tmp_dir = tempfile.mkdtemp(prefix="adocv1-bench-")
+os.environ.setdefault("DB_URL", f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}")
+os.environ.setdefault("JWT_SECRET", "bench-secret")
+
+import httpx  # noqa: E402
+from app.main import app  # noqa: E402
+from app.core.security import create_access_token  # noqa: E402
+from app.crud.user_crud import user_crud  # noqa: E402
+from app.db import schemas  # noqa: E402
+from app.db.base import Base  # noqa: E402
+from app.db.session import SessionLocal, engine  # noqa: E402
+
+
+def _prepare() -> str:
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if not user_crud.get_by_username(db, "bench"):
+            user_crud.create(db, schemas.UserCreate(username="bench", password="bench123"))
+    finally:
+        db.close()
+    return create_access_token(subject="bench")
+
+
+async def _run(concurrency: int, total: int, token: str):
+    headers = {"Authorization": f"Bearer {token}"}
+    latencies = []
+    queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait(None)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker():
+            while not queue.empty():
+                queue.get_nowait()
+                t0 = time.perf_counter()
+                resp = await client.get("/cameras?limit=1", headers=headers)
+                latencies.append(time.perf_counter() - t0)
+                assert resp.status_code == 200, resp.text
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return latencies, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    token = _prepare()
+    asyncio.run(_run(args.concurrency, 100, token))  # warm-up
+    latencies, elapsed = asyncio.run(_run(args.concurrency, args.requests, token))
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"📊 {args.requests} requests, concurrency={args.concurrency}")
+    print(f"   p50 = {statistics.median(latencies) * 1000:.2f} ms")
+    print(f"   p95 = {p95 * 1000:.2f} ms")
+    print(f"   throughput = {args.requests / elapsed:.0f} req/s")
+
+
+if __name__ == "__main__":
+    main()
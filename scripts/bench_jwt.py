@@ -0,0 +1,52 @@
+# scripts/bench_jwt.py
+"""
+Microbenchmark chi phí decode_access_token cho mỗi request.
+
+Chạy: python scripts/bench_jwt.py [--iterations 20000]
+So sánh verify đầy đủ (cache tắt) với verified-token cache (token lặp lại
+giống các trạm đóng gói polling liên tục với cùng một token).
+"""
+import argparse
+import os
+import sys
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.insert(0, root_dir)
+
+os.environ.setdefault("DB_URL", "sqlite:///:memory:")
+os.environ.setdefault("JWT_SECRET", "bench-secret")
+
+from app.core import security  # noqa: E402
+from app.utils.lru_cache import TTLCache  # noqa: E402
+
+
+def _measure(tokens, iterations: int) -> float:
+    started = time.perf_counter()
+    for i in range(iterations):
+        assert security.decode_access_token(tokens[i % len(tokens)]) is not None
+    return (time.perf_counter() - started) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--tokens", type=int, default=50, help="số token khác nhau (số trạm)")
+    args = parser.parse_args()
+
+    tokens = [security.create_access_token(subject=f"station{i}") for i in range(args.tokens)]
+
+    security._verified_tokens = TTLCache(maxsize=0)
+    uncached = _measure(tokens, args.iterations)
+
+    security._verified_tokens = TTLCache(maxsize=2048)
+    cached = _measure(tokens, args.iterations)
+
+    print(f"📊 decode_access_token, {args.iterations} lần, {args.tokens} token")
+    print(f"   cache tắt : {uncached * 1e6:.1f} µs/request")
+    print(f"   cache bật : {cached * 1e6:.1f} µs/request ({uncached / cached:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
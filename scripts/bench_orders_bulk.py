@@ -0,0 +1,85 @@
+# scripts/bench_orders_bulk.py
+"""
+So sánh throughput replay đơn hàng: từng đơn (POST /orders + /start + /close)
+với bulk (POST /orders/bulk + POST /orders/bulk/transitions).
+
+Chạy: python scripts/bench_orders_bulk.py [--orders 500]
+Dùng DB SQLite tạm (không đụng tới DB thật), gọi API qua TestClient trong cùng process.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.insert(0, root_dir)
+
+_tmp_dir = tempfile.mkdtemp(prefix="adocv1-bench-")
+os.environ.setdefault("DB_URL", f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}")
+os.environ.setdefault("JWT_SECRET", "bench-secret")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from app.main import app  # noqa: E402
+from app.core.security import create_access_token  # noqa: E402
+from app.crud.user_crud import user_crud  # noqa: E402
+from app.db import schemas  # noqa: E402
+from app.db.migrate import upgrade_head  # noqa: E402
+from app.db.session import SessionLocal  # noqa: E402
+
+
+def _prepare() -> dict:
+    upgrade_head()
+    db = SessionLocal()
+    try:
+        if not user_crud.get_by_username(db, "bench"):
+            user_crud.create(db, schemas.UserCreate(username="bench", password="bench123"))
+    finally:
+        db.close()
+    return {"Authorization": f"Bearer {create_access_token(subject='bench')}"}
+
+
+def _single(client: TestClient, headers: dict, n: int, prefix: str) -> float:
+    started = time.perf_counter()
+    for i in range(n):
+        resp = client.post("/orders", json={"code": f"{prefix}-{i}"}, headers=headers)
+        order_id = resp.json()["data"]["id"]
+        client.post(f"/orders/{order_id}/start", headers=headers)
+        client.post(f"/orders/{order_id}/close", headers=headers)
+    return time.perf_counter() - started
+
+
+def _bulk(client: TestClient, headers: dict, n: int, prefix: str) -> float:
+    started = time.perf_counter()
+    resp = client.post(
+        "/orders/bulk",
+        json={"items": [{"code": f"{prefix}-{i}"} for i in range(n)]},
+        headers=headers,
+    )
+    ids = [r["id"] for r in resp.json()["data"]["items"]]
+    transitions = [{"id": i, "action": "start"} for i in ids] + [{"id": i, "action": "close"} for i in ids]
+    resp = client.post("/orders/bulk/transitions", json={"items": transitions}, headers=headers)
+    assert resp.json()["data"]["failed"] == 0
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=500)
+    args = parser.parse_args()
+
+    headers = _prepare()
+    client = TestClient(app)  # không chạy startup (camera loop, check_db)
+    _single(client, headers, 20, "WARM")  # warm-up
+    single = _single(client, headers, args.orders, "SINGLE")
+    bulk = _bulk(client, headers, args.orders, "BULK")
+
+    print(f"📊 {args.orders} đơn (tạo + start + close)")
+    print(f"   Từng đơn: {single:.2f}s ({args.orders / single:.0f} đơn/s, {args.orders * 3} requests)")
+    print(f"   Bulk:     {bulk:.2f}s ({args.orders / bulk:.0f} đơn/s, 2 requests)")
+    print(f"🚀 Nhanh hơn {single / bulk:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# scripts/bench_serialize.py
+"""
+So sánh chi phí serialize 1 trang đơn hàng (mặc định 1500 dòng = MAX_PAGE_SIZE):
+- cũ: jsonable_encoder(items) -> response_success -> FastAPI jsonable_encoder lần 2 -> JSONResponse (json)
+- mới: TypeAdapter (app/utils/serializers.py) -> response_json (ORJSONResponse)
+
+Chạy: python scripts/bench_serialize.py [--rows 1500] [--iterations 20]
+Dùng DB SQLite tạm, đơn được load bằng filter_orders (joinedload parent) như API thật.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.insert(0, root_dir)
+
+_tmp_dir = tempfile.mkdtemp(prefix="adocv1-bench-")
+os.environ.setdefault("DB_URL", f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}")
+os.environ.setdefault("JWT_SECRET", "bench-secret")
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from app.crud.order_crud import order_crud  # noqa: E402
+from app.db import models  # noqa: E402
+from app.db.migrate import upgrade_head  # noqa: E402
+from app.db.session import SessionLocal  # noqa: E402
+from app.utils.response import response_json, response_success  # noqa: E402
+from app.utils.serializers import dump_orders  # noqa: E402
+
+
+def _seed(db, rows: int):
+    base = datetime(2026, 1, 1, 8, 0, 0)
+    parents = [models.Order(code=f"P{i:05d}", status="closed", created_at=base) for i in range(rows // 10)]
+    db.add_all(parents)
+    db.flush()
+    for i in range(rows - len(parents)):
+        db.add(models.Order(
+            code=f"SPX-VN-{i:08d}",
+            parent_id=parents[i % len(parents)].id,
+            session_id=f"S{i % 37}",
+            status="closed",
+            created_at=base + timedelta(seconds=i),
+            closed_at=base + timedelta(seconds=i + 30),
+            path_video=f"videos/{i}.mp4",
+            path_avatar=f"avatars/{i}.jpg",
+            order_metadata='{"weight": 1.5}',
+        ))
+    db.commit()
+
+
+def _old(items) -> bytes:
+    content = response_success(data={"items": jsonable_encoder(items), "total": len(items)})
+    return JSONResponse(content=jsonable_encoder(content)).body
+
+
+def _new(items) -> bytes:
+    return response_json(data={"items": dump_orders(items, with_parent=True), "total": len(items)}).body
+
+
+def _measure(fn, items, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn(items)
+    return (time.perf_counter() - started) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1500)
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    upgrade_head()
+    db = SessionLocal()
+    try:
+        _seed(db, args.rows)
+        items, _ = order_crud.filter_orders(db, limit=args.rows)
+        _old(items), _new(items)  # warm-up
+
+        old = _measure(_old, items, args.iterations)
+        new = _measure(_new, items, args.iterations)
+    finally:
+        db.close()
+
+    print(f"📊 {len(items)} đơn / trang, {args.iterations} lần")
+    print(f"   jsonable_encoder + JSONResponse:  {old * 1000:.1f} ms / trang")
+    print(f"   TypeAdapter + ORJSONResponse:     {new * 1000:.1f} ms / trang")
+    print(f"🚀 Nhanh hơn {old / new:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,7 @@ root_dir = os.path.dirname(current_dir)
 sys.path.append(root_dir)
 
 from app.core.config import settings
+from app.db.migrate import upgrade_head
 # --------------------------------------------------
 
 # Tự động lấy đường dẫn file DB từ cấu hình
@@ -25,31 +26,21 @@ else:
     print(f"❌ Script này chỉ hỗ trợ SQLite. DB hiện tại là: {settings.DB_URL}")
     sys.exit(1)
 
-INIT_SQL = os.path.join(root_dir, "app/db/migrations/init.sql")
-
 def init_db_tables():
     print(f"⏳ Đang làm việc với Database: {DB_FILE}")
     
     # Tạo thư mục chứa db nếu chưa có
     db_dir = os.path.dirname(DB_FILE)
-    if not os.path.exists(db_dir):
+    if db_dir and not os.path.exists(db_dir):
         os.makedirs(db_dir)
 
-    conn = sqlite3.connect(DB_FILE)
+    # Schema do Alembic quản lý (app/db/migrations/versions).
+    # DB cũ tạo bằng init.sql vẫn nâng cấp được: migration 0001 chỉ tạo bảng còn thiếu.
     try:
-        if not os.path.exists(INIT_SQL):
-            print(f"❌ Không tìm thấy file SQL tại: {INIT_SQL}")
-            return
-
-        with open(INIT_SQL, "r", encoding="utf-8") as f:
-            init_sql = f.read()
-        conn.executescript(init_sql)
-        conn.commit()
-        print("✅ Cấu trúc bảng đã được cập nhật.")
+        upgrade_head()
+        print("✅ Cấu trúc bảng đã được cập nhật (alembic upgrade head).")
     except Exception as e:
-        print(f"❌ Lỗi khi khởi tạo bảng: {e}")
-    finally:
-        conn.close()
+        print(f"❌ Lỗi khi chạy migration: {e}")
 
 def ensure_admin_user():
     conn = sqlite3.connect(DB_FILE)
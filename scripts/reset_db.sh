@@ -1,11 +1,10 @@
-# Reset DB bằng init.sql 
+# Reset DB bằng Alembic 
 #!/bin/bash
-# Reset database: drop file SQLite và chạy init.sql
+# Reset database: xóa file SQLite và chạy lại toàn bộ migration
 
 DB_FILE="./app/db/adocv1.db"
-INIT_SQL="./app/db/migrations/init.sql"
 
 echo "Resetting database..."
 rm -f $DB_FILE
-sqlite3 $DB_FILE < $INIT_SQL
+alembic upgrade head
 echo "Database reset complete."
@@ -0,0 +1,65 @@
+# scripts/sweep_media.py
+"""
+Dọn file media mồ côi dưới MEDIA_ROOT (không còn đơn nào trong orders / archive trỏ tới):
+file của đơn đã bị xóa, file tạm của upload bị đứt giữa chừng...
+
+Chạy: python scripts/sweep_media.py [--move | --delete] [--min-age 3600]
+                                    [--scan-rate 2000] [--action-rate 20] [--limit 50]
+Mặc định là dry run: chỉ liệt kê, không đụng vào file. --move chuyển file vào
+MEDIA_ROOT/.orphans/<thời điểm>/ (xóa tay sau khi kiểm tra), --delete xóa luôn.
+Có thể chạy khi server đang hoạt động: tốc độ quét / xử lý bị giới hạn.
+"""
+import argparse
+import os
+import sys
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.insert(0, root_dir)
+
+from app.core.config import settings  # noqa: E402
+from app.db.session import SessionLocal  # noqa: E402
+from app.services.media_service import media_root  # noqa: E402
+from app.services.media_sweeper_service import sweep  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--move", action="store_true", help="chuyển file mồ côi vào .orphans/")
+    mode.add_argument("--delete", action="store_true", help="xóa file mồ côi")
+    parser.add_argument("--min-age", type=int, default=settings.SWEEP_MIN_AGE_SECONDS)
+    parser.add_argument("--scan-rate", type=float, default=settings.SWEEP_SCAN_RATE)
+    parser.add_argument("--action-rate", type=float, default=settings.SWEEP_ACTION_RATE)
+    parser.add_argument("--limit", type=int, default=50, help="số file liệt kê trong báo cáo")
+    args = parser.parse_args()
+
+    action = "move" if args.move else "delete" if args.delete else "report"
+    print(f"⏳ Quét {media_root()} (file cũ hơn {args.min_age}s, chế độ: {action})")
+
+    db = SessionLocal()
+    try:
+        report = sweep(
+            db,
+            action=action,
+            min_age_seconds=args.min_age,
+            scan_rate=args.scan_rate,
+            action_rate=args.action_rate,
+            report_limit=args.limit,
+        )
+    finally:
+        db.close()
+
+    for item in report["items"]:
+        print(f"   🗑️  {item['path']} ({item['bytes']} bytes)")
+    if report["orphans"] > len(report["items"]):
+        print(f"   ... và {report['orphans'] - len(report['items'])} file khác")
+    print(
+        f"✅ Đã quét {report['scanned']} file: {report['orphans']} file mồ côi "
+        f"({report['orphan_bytes']} bytes), chuyển {report['moved']}, xóa {report['deleted']}, "
+        f"bỏ qua (vừa được gán) {report['referenced']}, lỗi {report['failed']}"
+    )
+
+
+if __name__ == "__main__":
+    main()